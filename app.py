@@ -4,32 +4,27 @@ LazzyBioIntel v6.2 PRO
 Enterprise Face Verification Dashboard (Streamlit UI)
 
 Core verification logic is in verify_v6.py (UltimateVerifier v6.2+).
-This UI calls verifier.verify() and visualizes the result only.
+This UI queues verifier.verify() as background jobs (jobs.py) and
+visualizes the results only.
 """
 
 import streamlit as st
 import time
 import tempfile
-import os
 import json
 from typing import Optional
 from datetime import datetime
+from functools import partial
 import pandas as pd
 
 import recovery
-recovery.restore_session_state()
-recovery.cleanup_old_sessions()
+from verify_v6 import VerificationResult
+from audit_store import sha256_bytes
+from batch import run_audited
+from history import VerificationHistory
+from ui_resources import get_audit_store, get_job_manager, get_verifier, init_session
 
-from verify_v6 import UltimateVerifier, VerificationResult
-from occlusion_engine import OcclusionEngine, cosine_sim
-
-@st.cache_resource
-def get_verifier():
-    return UltimateVerifier()
-
-@st.cache_resource
-def get_occlusion_engine():
-    return OcclusionEngine()
+JOB_POLL_INTERVAL = 1.0  # seconds between reruns while this session has jobs in flight
 
 # =============================================================================
 # Page Configuration
@@ -44,12 +39,9 @@ st.set_page_config(
 # =============================================================================
 # Session State Management
 # =============================================================================
-if "verification_history" not in st.session_state:
-    st.session_state.verification_history = []
-if "session_id" not in st.session_state:
-    st.session_state.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-if "audit_log" not in st.session_state:
-    st.session_state.audit_log = []
+init_session()
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 1
 
 # =============================================================================
 # Professional Dark Theme CSS
@@ -361,14 +353,31 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
     
+    st.text_input("Operator", key="operator")
+    
+    evictor = get_verifier().evictor
+    if evictor is not None:
+        mem = evictor.report()
+        geometry = mem["models"]["geometry"]
+        st.markdown(f"""
+        <div style="margin: 1rem 0;">
+            <div class="metric-label">Memory (RSS)</div>
+            <div style="color: #e6f1ff;">{mem['rss_mb'] or '-'} MB</div>
+            <div class="metric-label">Geometry model</div>
+            <div style="color: #e6f1ff;">{'loaded' if geometry['loaded'] else 'unloaded'}
+                · {geometry['evictions']} evictions · last load {geometry['last_load_seconds'] or 0:.2f}s</div>
+        </div>
+        """, unsafe_allow_html=True)
+    
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
     
     # Quick Stats
     st.markdown("### Session Statistics")
-    total_verifications = len(st.session_state.verification_history)
+    history = st.session_state.history
+    total_verifications = history.total
     if total_verifications > 0:
-        same_count = sum(1 for v in st.session_state.verification_history if v['verdict'].startswith('SAME'))
-        different_count = sum(1 for v in st.session_state.verification_history if v['verdict'] == 'DIFFERENT')
+        same_count = history.same
+        different_count = history.different
         
         st.markdown(f"""
         <div style="margin: 1rem 0;">
@@ -394,9 +403,8 @@ with st.sidebar:
     # Export & Controls
     st.markdown("### Data Management")
     if st.button("📊 Export Session Data", use_container_width=True):
-        if st.session_state.verification_history:
-            df = pd.DataFrame(st.session_state.verification_history)
-            csv = df.to_csv(index=False)
+        if st.session_state.history.total:
+            csv = st.session_state.history.to_csv()
             st.download_button(
                 label="Download CSV",
                 data=csv,
@@ -408,7 +416,9 @@ with st.sidebar:
     
     if st.button("🔄 New Session", use_container_width=True):
         st.session_state.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        st.session_state.verification_history = []
+        st.session_state.history = VerificationHistory(st.session_state.session_id)
+        st.session_state.history_page = 1
+        recovery.save_session_state(st.session_state.resume_token, {"session_id": st.session_state.session_id})
         st.rerun()
 
 # =============================================================================
@@ -515,211 +525,231 @@ col1, col2, col3 = st.columns([2, 1, 2])
 with col2:
     run_verification = st.button("🚀 VERIFY IDENTITY", use_container_width=True)
 
+def record_job(job):
+    """Add a finished job, or its failure, to this session's history (the job audited itself)."""
+    result: Optional[VerificationResult] = job.result
+    if result is not None:
+        record = {
+            "verdict": result.verdict,
+            "confidence": result.confidence,
+            "similarity": result.similarity,
+            "quality": result.quality_avg,
+            "execution_time": result.execution_time
+        }
+    else:
+        record = {"verdict": "ERROR", "confidence": 0.0, "similarity": 0.0, "quality": 0.0,
+                  "execution_time": job.elapsed}
+    st.session_state.history.add({
+        "timestamp": datetime.fromtimestamp(job.finished or time.time()).isoformat(), **record})
+    recovery.save_session_state(st.session_state.resume_token, {"session_id": st.session_state.session_id})
+
+
+def render_result(result: VerificationResult, job):
+    occsim = result.upper_similarity
+    
+    # Verdict Display - using beginning code format
+    if result.error:
+        vclass = "verdict-different"
+        vtext = f"ERROR: {result.error}"
+        explanation = "Engine could not complete verification. Check image quality / face visibility."
+    elif result.verdict.startswith("SAME"):
+        vclass = "verdict-same"
+        vtext = "SEEMS TO BE SAME PERSON"
+        explanation = "Neural similarity + quality support a same-person match."
+    elif result.verdict == "UNCERTAIN":
+        vclass = "verdict-uncertain"
+        vtext = "UNCERTAIN MATCH — TRY MORE PICTURES"
+        explanation = "Signals are borderline/mixed. Capture better images and retry."
+    else:
+        vclass = "verdict-different"
+        vtext = "SEEMS DIFFERENT"
+        explanation = "Embeddings show clear differences."
+    
+    st.markdown(f"<div class='verdict-container {vclass}'><div class='verdict-text'>{vtext}</div><div style='color: #8892b0; margin-bottom: 1rem;'>{explanation}</div>", unsafe_allow_html=True)
+    
+    # Add the confidence and similarity display
+    st.markdown(f"""
+    <div style="display: flex; justify-content: center; gap: 2rem; margin-top: 1rem;">
+        <div>
+            <div class="metric-label">Confidence</div>
+            <div style="font-size: 1.5rem; color: #e6f1ff;">{result.confidence:.1f}%</div>
+        </div>
+        <div>
+            <div class="metric-label">Similarity</div>
+            <div style="font-size: 1.5rem; color: #e6f1ff;">{result.similarity:.3f}</div>
+        </div>
+    </div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Metrics Grid
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.markdown("""
+        <div class="metric-card">
+            <div class="metric-label">Neural Similarity</div>
+            <div class="metric-value">{:.3f}</div>
+        </div>
+        """.format(result.similarity), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown("""
+        <div class="metric-card">
+            <div class="metric-label">Quality Score</div>
+            <div class="metric-value">{:.1f}/100</div>
+        </div>
+        """.format(result.quality_avg), unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown("""
+        <div class="metric-card">
+            <div class="metric-label">Processing Time</div>
+            <div class="metric-value">{:.2f}s</div>
+        </div>
+        """.format(result.execution_time), unsafe_allow_html=True)
+    
+    with col4:
+        if occsim:
+            st.markdown("""
+            <div class="metric-card">
+                <div class="metric-label">Upper Face Match</div>
+                <div class="metric-value">{:.3f}</div>
+            </div>
+            """.format(occsim), unsafe_allow_html=True)
+    
+    # Detailed Analysis
+    with st.expander("🔬 Detailed Analysis Report", expanded=False):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("#### Reference Image Analysis")
+            st.metric("Quality Score", f"{result.q1.score:.1f}")
+            if hasattr(result.q1, 'details'):
+                st.json(result.q1.details)
+        
+        with col2:
+            st.markdown("#### Probe Image Analysis")
+            st.metric("Quality Score", f"{result.q2.score:.1f}")
+            if hasattr(result.q2, 'details'):
+                st.json(result.q2.details)
+        
+        st.markdown("#### Geometric Analysis")
+        if result.geometry_skipped:
+            st.metric("Geometric Similarity", "skipped")
+            st.caption("Embedding similarity was decisive; geometry could not change the verdict.")
+        else:
+            st.metric("Geometric Similarity", f"{result.geometry_sim:.1f}%")
+        
+        st.markdown("#### Raw Data Export")
+        export_data = {
+            "timestamp": datetime.now().isoformat(),
+            "session_id": st.session_state.session_id,
+            "verdict": result.verdict,
+            "confidence": result.confidence,
+            "similarity": round(result.similarity, 4),
+            "quality_average": round(result.quality_avg, 2),
+            "execution_time": round(result.execution_time, 3),
+            "reference_quality": result.q1.score,
+            "probe_quality": result.q2.score,
+            "geometric_similarity": round(result.geometry_sim, 2),
+            "geometry_skipped": result.geometry_skipped,
+            "upper_face_similarity": round(occsim, 4) if occsim else None,
+            "error": result.error,
+            "job_id": job.id
+        }
+        st.json(export_data)
+        
+        # Download button for this verification
+        st.download_button(
+            label="📥 Download Report (JSON)",
+            data=json.dumps(export_data, indent=2),
+            file_name=f"verification_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+            key=f"report_{job.id}"
+        )
+
+
+jobs = get_job_manager()
+
 if run_verification:
     if not imgref or not imgprobe:
         st.error("⚠️ Please upload both reference and probe images")
     else:
-        # Save temporary files
+        # The job owns these temp files and deletes them when it finishes
         with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as f1, \
              tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as f2:
-            f1.write(imgref.read())
-            f2.write(imgprobe.read())
+            ref_bytes, probe_bytes = imgref.getvalue(), imgprobe.getvalue()
+            f1.write(ref_bytes)
+            f2.write(probe_bytes)
             ref_path, probe_path = f1.name, f2.name
         
-        try:
-            # Verification Progress
-            progress_placeholder = st.empty()
-            status_placeholder = st.empty()
-            log_placeholder = st.empty()
-            
-            # Progress bar container
-            with progress_placeholder.container():
-                st.markdown("""
-                <div class="panel" style="margin: 1rem 0;">
-                    <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
-                        <span class="panel-title">Analysis Progress</span>
-                        <span class="status-badge status-badge-info" id="progress-status">Initializing</span>
-                    </div>
-                """, unsafe_allow_html=True)
-                progress_bar = st.progress(0)
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            def update_progress(percent, status, message):
-                progress_bar.progress(percent)
-                status_placeholder.markdown(f"""
-                <div style="margin-top: 0.5rem;">
-                    <span class="status-badge status-badge-info">{status}</span>
-                    <span style="color: #8892b0; margin-left: 0.5rem;">{message}</span>
-                </div>
-                """, unsafe_allow_html=True)
-                time.sleep(0.2)
-            
-            # Run verification
-            update_progress(20, "Loading", "Initializing neural networks...")
-            verifier = get_verifier()
-            
-            update_progress(45, "Processing", "Analyzing facial features...")
-            result: VerificationResult = verifier.verify(ref_path, probe_path)
-            
-            update_progress(80, "Computing", "Calculating similarity metrics...")
-            
-            # Occlusion analysis
-            try:
-                occengine = get_occlusion_engine()
-                e1u = occengine.embed_upper_face(ref_path)
-                e2u = occengine.embed_upper_face(probe_path)
-                occsim = cosine_sim(e1u, e2u)
-            except:
-                occsim = None
-            
-            update_progress(100, "Complete", "Verification finished")
-            
-            # Clear progress display
-            progress_placeholder.empty()
-            status_placeholder.empty()
-            
-            # Display Results
-            st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
-            
-            # Verdict Display - using beginning code format
-            if result.error:
-                vclass = "verdict-different"
-                vtext = f"ERROR: {result.error}"
-                explanation = "Engine could not complete verification. Check image quality / face visibility."
-            elif result.verdict.startswith("SAME"):
-                vclass = "verdict-same"
-                vtext = "SEEMS TO BE SAME PERSON"
-                explanation = "Neural similarity + quality support a same-person match."
-            elif result.verdict == "UNCERTAIN":
-                vclass = "verdict-uncertain"
-                vtext = "UNCERTAIN MATCH — TRY MORE PICTURES"
-                explanation = "Signals are borderline/mixed. Capture better images and retry."
-            else:
-                vclass = "verdict-different"
-                vtext = "SEEMS DIFFERENT"
-                explanation = "Embeddings show clear differences."
-            
-            st.markdown(f"<div class='verdict-container {vclass}'><div class='verdict-text'>{vtext}</div><div style='color: #8892b0; margin-bottom: 1rem;'>{explanation}</div>", unsafe_allow_html=True)
-            
-            # Add the confidence and similarity display
-            st.markdown(f"""
-            <div style="display: flex; justify-content: center; gap: 2rem; margin-top: 1rem;">
-                <div>
-                    <div class="metric-label">Confidence</div>
-                    <div style="font-size: 1.5rem; color: #e6f1ff;">{result.confidence:.1f}%</div>
-                </div>
-                <div>
-                    <div class="metric-label">Similarity</div>
-                    <div style="font-size: 1.5rem; color: #e6f1ff;">{result.similarity:.3f}</div>
-                </div>
-            </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Metrics Grid
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.markdown("""
-                <div class="metric-card">
-                    <div class="metric-label">Neural Similarity</div>
-                    <div class="metric-value">{:.3f}</div>
-                </div>
-                """.format(result.similarity), unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown("""
-                <div class="metric-card">
-                    <div class="metric-label">Quality Score</div>
-                    <div class="metric-value">{:.1f}/100</div>
-                </div>
-                """.format(result.quality_avg), unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown("""
-                <div class="metric-card">
-                    <div class="metric-label">Processing Time</div>
-                    <div class="metric-value">{:.2f}s</div>
-                </div>
-                """.format(result.execution_time), unsafe_allow_html=True)
-            
-            with col4:
-                if occsim:
-                    st.markdown("""
-                    <div class="metric-card">
-                        <div class="metric-label">Upper Face Match</div>
-                        <div class="metric-value">{:.3f}</div>
-                    </div>
-                    """.format(occsim), unsafe_allow_html=True)
-            
-            # Detailed Analysis
-            with st.expander("🔬 Detailed Analysis Report", expanded=False):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("#### Reference Image Analysis")
-                    st.metric("Quality Score", f"{result.q1.score:.1f}")
-                    if hasattr(result.q1, 'details'):
-                        st.json(result.q1.details)
-                
-                with col2:
-                    st.markdown("#### Probe Image Analysis")
-                    st.metric("Quality Score", f"{result.q2.score:.1f}")
-                    if hasattr(result.q2, 'details'):
-                        st.json(result.q2.details)
-                
-                st.markdown("#### Geometric Analysis")
-                st.metric("Geometric Similarity", f"{result.geometry_sim:.1f}%")
-                
-                st.markdown("#### Raw Data Export")
-                export_data = {
-                    "timestamp": datetime.now().isoformat(),
-                    "session_id": st.session_state.session_id,
-                    "verdict": result.verdict,
-                    "confidence": result.confidence,
-                    "similarity": round(result.similarity, 4),
-                    "quality_average": round(result.quality_avg, 2),
-                    "execution_time": round(result.execution_time, 3),
-                    "reference_quality": result.q1.score,
-                    "probe_quality": result.q2.score,
-                    "geometric_similarity": round(result.geometry_sim, 2),
-                    "upper_face_similarity": round(occsim, 4) if occsim else None,
-                    "error": result.error
-                }
-                st.json(export_data)
-                
-                # Download button for this verification
-                st.download_button(
-                    label="📥 Download Report (JSON)",
-                    data=json.dumps(export_data, indent=2),
-                    file_name=f"verification_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
-            
-            # Save to history
-            st.session_state.verification_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "verdict": result.verdict,
-                "confidence": result.confidence,
-                "similarity": result.similarity,
-                "quality": result.quality_avg,
-                "execution_time": result.execution_time
-            })
-            
-        finally:
-            # Cleanup
-            try:
-                os.unlink(ref_path)
-                os.unlink(probe_path)
-            except:
-                pass
+        # Upper-face (occlusion) score reuses the faces found by the core pass.
+        # The job writes its own audit row; this page only adds it to history.
+        verify = partial(
+            run_audited, get_verifier(), get_audit_store(), ref_path, probe_path,
+            sha256_bytes(ref_bytes), sha256_bytes(probe_bytes),
+            session_id=st.session_state.session_id,
+            operator=st.session_state.operator or None,
+            upper_face=True,
+        )
+        job = jobs.submit(
+            st.session_state.session_id,
+            f"{imgref.name} ↔ {imgprobe.name}",
+            verify,
+            cleanup=(ref_path, probe_path),
+        )
+        st.toast(f"Verification queued (job {job.id})")
+
+session_jobs = jobs.jobs(st.session_state.session_id)
+for job in session_jobs:
+    if jobs.mark_recorded(job):
+        record_job(job)
+        st.session_state.job_view = job.id   # show the newest result as soon as it lands
+
+if session_jobs:
+    st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
+    pending = sum(not j.done for j in session_jobs)
+    st.markdown(f"""
+    <div class="panel-header">
+        <span class="panel-title">⏳ Verification Jobs</span>
+        <span class="status-badge status-badge-info">{pending} IN PROGRESS</span>
+    </div>
+    """, unsafe_allow_html=True)
+    st.dataframe(
+        pd.DataFrame([{
+            "Job": j.id,
+            "Images": j.label,
+            "Status": j.status.upper(),
+            "Submitted": datetime.fromtimestamp(j.submitted).strftime("%H:%M:%S"),
+            "Time (s)": round(j.elapsed, 2),
+            "Verdict": j.result.verdict if j.status == "done" else (j.error or ""),
+        } for j in reversed(session_jobs)]),
+        use_container_width=True,
+        hide_index=True,
+    )
+    
+    finished = [j for j in reversed(session_jobs) if j.status == "done"]
+    if finished:
+        ids = [j.id for j in finished]
+        if st.session_state.get("job_view") not in ids:
+            st.session_state.job_view = ids[0]
+        view = st.selectbox(
+            "Show result of job",
+            ids,
+            key="job_view",
+            format_func=lambda i: f"{i} — {jobs.get(i).label}",
+        )
+        render_result(jobs.get(view).result, jobs.get(view))
 
 st.markdown('</div>', unsafe_allow_html=True)
 
 # =============================================================================
 # Recent Activity
 # =============================================================================
-if st.session_state.verification_history:
+HISTORY_PAGE_SIZE = 25
+
+if st.session_state.history.total:
     st.markdown('<div class="panel" style="margin-top: 1rem;">', unsafe_allow_html=True)
     st.markdown("""
     <div class="panel-header">
@@ -728,8 +758,15 @@ if st.session_state.verification_history:
     </div>
     """, unsafe_allow_html=True)
     
-    # Create a DataFrame for display
-    history_df = pd.DataFrame(st.session_state.verification_history[-5:])  # Last 5
+    # One page (newest first); older pages are read back from disk
+    n_pages = st.session_state.history.pages(HISTORY_PAGE_SIZE)
+    page = st.number_input(
+        f"Page (1 = newest, of {n_pages})",
+        min_value=1,
+        max_value=n_pages,
+        key="history_page",
+    )
+    history_df = pd.DataFrame(st.session_state.history.page(page - 1, HISTORY_PAGE_SIZE))
     history_df = history_df[['timestamp', 'verdict', 'confidence', 'similarity', 'quality', 'execution_time']]
     history_df.columns = ['Timestamp', 'Verdict', 'Confidence %', 'Similarity', 'Quality', 'Time (s)']
     
@@ -761,3 +798,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Poll while this session has work in flight; a finished job is recorded
+# and rendered on the first rerun that sees it.
+if get_job_manager().pending(st.session_state.session_id):
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
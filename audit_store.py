@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Append-only audit store for verification records.
+
+SQLite in WAL mode. record() only enqueues; a background thread commits
+rows in batches, so the request path never waits on disk. Rows carry
+verdict, scores, stage timings, image content hashes (SHA-256), session
+and operator, indexed on hash, time and session so case lookups are
+index seeks instead of scans over rotated log files.
+
+A batch that cannot be committed is retried with backoff; if it still
+fails, its rows are appended to <db>.failed.jsonl rather than dropped,
+and `replay` loads them once the database is writable again.
+
+CLI:
+    python3 audit_store.py query --hash <sha256|image path> [--since 2026-09-01]
+    python3 audit_store.py query --session 20261019_101500 --json
+    python3 audit_store.py replay
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from logger import LogManager
+
+logger = LogManager.get_logger(__name__)
+
+DEFAULT_DB = "audit.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verifications (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts             REAL NOT NULL,
+    session_id     TEXT,
+    operator       TEXT,
+    source         TEXT,
+    verdict        TEXT NOT NULL,
+    confidence     REAL,
+    similarity     REAL,
+    geometry_sim   REAL,
+    quality_avg    REAL,
+    q1             REAL,
+    q2             REAL,
+    execution_time REAL,
+    timings        TEXT,
+    img1_hash      TEXT,
+    img2_hash      TEXT,
+    error          TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_verifications_ts ON verifications(ts);
+CREATE INDEX IF NOT EXISTS idx_verifications_session ON verifications(session_id, ts);
+CREATE INDEX IF NOT EXISTS idx_verifications_img1 ON verifications(img1_hash, ts);
+CREATE INDEX IF NOT EXISTS idx_verifications_img2 ON verifications(img2_hash, ts);
+CREATE TRIGGER IF NOT EXISTS verifications_no_update BEFORE UPDATE ON verifications
+BEGIN SELECT RAISE(ABORT, 'audit store is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS verifications_no_delete BEFORE DELETE ON verifications
+BEGIN SELECT RAISE(ABORT, 'audit store is append-only'); END;
+"""
+
+_COLUMNS = (
+    "ts", "session_id", "operator", "source", "verdict", "confidence", "similarity",
+    "geometry_sim", "quality_avg", "q1", "q2", "execution_time", "timings",
+    "img1_hash", "img2_hash", "error",
+)
+_INSERT = f"INSERT INTO verifications ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> Optional[str]:
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def fallback_path(path: str) -> str:
+    return path + ".failed.jsonl"
+
+
+class AuditStore:
+    BATCH_SIZE = 500
+    FLUSH_INTERVAL = 0.5   # seconds
+    QUEUE_SIZE = 10_000
+    WRITE_ATTEMPTS = 3
+    RETRY_DELAY = 0.5      # seconds, doubled after each failed attempt
+
+    _STOP = object()
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        with _connect(path) as conn:
+            conn.executescript(_SCHEMA)
+        self._q: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._writer = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # -------------------------------------------------------------------------
+    # Write path
+    # -------------------------------------------------------------------------
+
+    def record(
+        self,
+        result,
+        img1_hash: Optional[str],
+        img2_hash: Optional[str],
+        session_id: Optional[str] = None,
+        operator: Optional[str] = None,
+        source: str = "cli",
+    ) -> None:
+        """Queue one VerificationResult. Blocks only if the writer is QUEUE_SIZE rows behind."""
+        self._q.put((
+            time.time(), session_id, operator, source, result.verdict,
+            float(result.confidence), float(result.similarity), float(result.geometry_sim),
+            float(result.quality_avg), float(result.q1.score), float(result.q2.score),
+            float(result.execution_time),
+            json.dumps({k: round(v, 4) for k, v in getattr(result, "timings", {}).items()}),
+            img1_hash, img2_hash, result.error,
+        ))
+
+    def record_failure(
+        self,
+        error: str,
+        img1_hash: Optional[str],
+        img2_hash: Optional[str],
+        session_id: Optional[str] = None,
+        operator: Optional[str] = None,
+        source: str = "cli",
+        execution_time: float = 0.0,
+    ) -> None:
+        """Queue a verification that raised instead of returning a result."""
+        self._q.put((
+            time.time(), session_id, operator, source, "ERROR", 0.0, 0.0, 0.0, 0.0, None, None,
+            float(execution_time), "{}", img1_hash, img2_hash, error,
+        ))
+
+    def flush(self) -> None:
+        """Block until everything queued so far is committed."""
+        self._q.join()
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._q.put(self._STOP)
+            self._writer.join(5)
+
+    def _run(self) -> None:
+        conn = None
+        stop = False
+        while not stop:
+            try:
+                batch = [self._q.get(timeout=self.FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [r for r in batch if r is not self._STOP]
+            stop = len(rows) != len(batch)
+            try:
+                if rows:
+                    conn = self._write(conn, rows)
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+        if conn is not None:
+            conn.close()
+
+    def _write(self, conn: Optional[sqlite3.Connection], rows: list) -> Optional[sqlite3.Connection]:
+        """Commit `rows`, reconnecting and retrying on error; spill them to the fallback file if that fails."""
+        delay = self.RETRY_DELAY
+        for attempt in range(1, self.WRITE_ATTEMPTS + 1):
+            try:
+                if conn is None:
+                    conn = _connect(self.path)
+                with conn:
+                    conn.executemany(_INSERT, rows)
+                return conn
+            except sqlite3.Error:
+                logger.warning("Audit batch write failed", extra={"rows": len(rows), "attempt": attempt},
+                               exc_info=True)
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                if attempt < self.WRITE_ATTEMPTS:
+                    time.sleep(delay)
+                    delay *= 2
+        self._spill(rows)
+        return conn
+
+    def _spill(self, rows: list) -> None:
+        path = fallback_path(self.path)
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(dict(zip(_COLUMNS, row))) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            logger.critical("Audit rows lost: database and fallback file both unwritable",
+                            extra={"rows": len(rows), "fallback": path}, exc_info=True)
+            return
+        logger.error(f"Audit batch saved to {path}; run 'audit_store.py replay' to load it",
+                     extra={"rows": len(rows)})
+
+    # -------------------------------------------------------------------------
+    # Read path
+    # -------------------------------------------------------------------------
+
+    def query(
+        self,
+        image_hash: Optional[str] = None,
+        session_id: Optional[str] = None,
+        operator: Optional[str] = None,
+        verdict: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 1000,
+    ) -> List[dict]:
+        return query(self.path, image_hash, session_id, operator, verdict, since, until, limit)
+
+
+def replay(path: str = DEFAULT_DB) -> int:
+    """Insert the rows spilled to the fallback file, then remove it; returns the row count."""
+    spill = fallback_path(path)
+    work = spill + ".replay"          # left behind if a previous replay failed
+    if not os.path.exists(work):
+        if not os.path.exists(spill):
+            return 0
+        os.replace(spill, work)       # a live writer starts a new fallback file
+    with open(work, encoding="utf-8") as f:
+        rows = [tuple(rec.get(c) for c in _COLUMNS) for rec in map(json.loads, filter(str.strip, f))]
+    conn = _connect(path)
+    try:
+        conn.executescript(_SCHEMA)
+        with conn:
+            conn.executemany(_INSERT, rows)
+    finally:
+        conn.close()
+    os.remove(work)
+    return len(rows)
+
+
+def query(
+    path: str,
+    image_hash: Optional[str] = None,
+    session_id: Optional[str] = None,
+    operator: Optional[str] = None,
+    verdict: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = 1000,
+) -> List[dict]:
+    where, params = [], []
+    if image_hash:
+        where.append("(img1_hash = ? OR img2_hash = ?)")
+        params += [image_hash, image_hash]
+    if session_id:
+        where.append("session_id = ?")
+        params.append(session_id)
+    if operator:
+        where.append("operator = ?")
+        params.append(operator)
+    if verdict:
+        where.append("verdict = ?")
+        params.append(verdict)
+    if since is not None:
+        where.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("ts < ?")
+        params.append(until)
+
+    sql = "SELECT * FROM verifications"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY ts DESC LIMIT ?"
+    params.append(limit)
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = [dict(r) for r in conn.execute(sql, params)]
+    finally:
+        conn.close()
+    for r in rows:
+        r["timings"] = json.loads(r["timings"] or "{}")
+    return rows
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LazzyBioIntel audit store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("query", help="look up verification records")
+    q.add_argument("--db", default=DEFAULT_DB)
+    q.add_argument("--hash", help="SHA-256 of an image, or a path to hash")
+    q.add_argument("--session")
+    q.add_argument("--operator")
+    q.add_argument("--verdict")
+    q.add_argument("--since", help="ISO date/time (UTC if no offset)")
+    q.add_argument("--until", help="ISO date/time (UTC if no offset)")
+    q.add_argument("--limit", type=int, default=1000)
+    q.add_argument("--json", action="store_true")
+    r = sub.add_parser("replay", help="load rows spilled to <db>.failed.jsonl after write failures")
+    r.add_argument("--db", default=DEFAULT_DB)
+    args = parser.parse_args()
+
+    if args.cmd == "replay":
+        print(f"{replay(args.db)} row(s) replayed into {args.db}")
+        return
+
+    if not os.path.exists(args.db):
+        print(f"No audit store at {args.db}")
+        sys.exit(1)
+
+    image_hash = args.hash
+    if image_hash and os.path.isfile(image_hash):
+        image_hash = sha256_file(image_hash)
+
+    rows = query(args.db, image_hash, args.session, args.operator, args.verdict,
+                 _parse_time(args.since), _parse_time(args.until), args.limit)
+
+    if args.json:
+        for r in rows:
+            print(json.dumps(r))
+        return
+
+    print(f"{'TIME (UTC)':<20} {'SESSION':<16} {'OPERATOR':<12} {'VERDICT':<12} {'SIM':>6} "
+          f"{'IMG1':<12} {'IMG2':<12}")
+    for r in rows:
+        ts = datetime.fromtimestamp(r["ts"], timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{ts:<20} {str(r['session_id'] or '-'):<16} {str(r['operator'] or '-'):<12} "
+              f"{r['verdict']:<12} {r['similarity']:>6.3f} "
+              f"{(r['img1_hash'] or '-')[:12]:<12} {(r['img2_hash'] or '-')[:12]:<12}")
+    print(f"{len(rows)} record(s)")
+
+
+if __name__ == "__main__":
+    main()
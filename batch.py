@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Resumable batch verification over a pairs list.
+
+Each pair is one work unit. Completed units are recorded in a
+recovery.JobJournal, so an interrupted run restarted with the same
+arguments skips everything already done and appends to the same output.
+
+    python3 batch.py pairs.txt --out results.jsonl [--job-id NAME]
+
+Pairs file format is the one used by evaluate.py (label column optional).
+Each output line is the verify_v6 --json result plus the pair index and paths.
+
+With --dedup, images are first grouped by perceptual hash (dedup.py).
+Features are extracted once per group and reused for a member only after
+its face region is confirmed to match the representative's; rows computed
+from a near-duplicate carry the representative in "img1_rep" / "img2_rep".
+The two sides of one pair are never served from the same representative:
+they are always compared from their own images.
+
+run_zip_batch() is the dashboard's one-reference-many-probes mode: probes
+are read from a ZIP held in memory (never extracted to disk), decoded once
+and verified against features of the reference computed once, with a
+bounded number of probes in flight.
+"""
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import threading
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import List, Optional
+
+from audit_store import sha256_bytes
+from dedup import FeatureReuse, confirm_faces, group_paths
+from evaluate import file_digest, load_pairs
+from lz_validators import ALLOWED_EXTS, MAX_BYTES, validate_image_bytes
+from recovery import JobJournal
+from verify_v6 import ImageFeatures, UltimateVerifier, logger, result_to_dict
+
+
+def default_job_id(pairs_path: str) -> str:
+    """Stable id for 'this pairs file, this content', so a plain re-run resumes."""
+    key = f"{os.path.abspath(pairs_path)}:{file_digest(pairs_path)}"
+    return "batch-" + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def written_pairs(out_path: str) -> dict:
+    """
+    {pair index: row} for complete rows already in `out_path`. A torn
+    last row (crash mid-write) is cut off so the resumed run rewrites it.
+    """
+    rows, good = {}, 0
+    if not os.path.exists(out_path):
+        return rows
+    with open(out_path, "rb") as f:
+        for line in f:
+            try:
+                row = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                row = None
+            if row is None:
+                break
+            rows[row["pair"]] = row
+            good += len(line)
+    if good < os.path.getsize(out_path):
+        os.truncate(out_path, good)
+    return rows
+
+
+def run_batch(verifier: UltimateVerifier, pairs, out_path: str, job_id: str, dedup: bool = False) -> dict:
+    journal = JobJournal(job_id)
+    # The row is written before the unit is journaled; a crash in between
+    # leaves a row the journal does not know about. Adopt it, don't redo it.
+    for i, row in written_pairs(out_path).items():
+        if str(i) not in journal and i < len(pairs) and tuple(pairs[i][:2]) == (row["img1"], row["img2"]):
+            journal.mark_done(str(i), row.get("verdict"))
+    skipped = len(journal)
+    if skipped:
+        logger.info(f"Resuming job {job_id}: {skipped}/{len(pairs)} pairs already done",
+                    extra={"job_id": job_id, "done": skipped, "total": len(pairs)})
+
+    t0 = time.time()
+    reuse = None
+    if dedup:
+        todo = [p for i, p in enumerate(pairs) if str(i) not in journal]
+        rep_of = group_paths([x for a, b, _ in todo for x in (a, b)])
+        reuse = FeatureReuse(verifier.extract, rep_of, confirm=confirm_faces())
+
+    processed = errors = 0
+    with open(out_path, "a", encoding="utf-8") as out:
+        for i, (a, b, label) in enumerate(pairs):
+            unit = str(i)
+            if unit in journal:
+                continue
+            row = {"pair": i, "img1": a, "img2": b, "label": label}
+            if reuse is not None:
+                (f1, r1), (f2, r2) = reuse(a), reuse(b)
+                if r1 == r2 and a != b:
+                    # Both sides resolved to one representative: comparing
+                    # it with itself would score 1.0 without looking at b.
+                    (f1, r1), (f2, r2) = reuse.own(a), reuse.own(b)
+                result = verifier.verify_features(f1, f2)
+                if r1 != a:
+                    row["img1_rep"] = r1
+                if r2 != b:
+                    row["img2_rep"] = r2
+            else:
+                result = verifier.verify(a, b)
+            row.update(result_to_dict(result))
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+            journal.mark_done(unit, result.verdict)
+            processed += 1
+            errors += result.error is not None
+    journal.close()
+
+    return {
+        "job_id": job_id,
+        "total": len(pairs),
+        "processed": processed,
+        "resumed_from": skipped,
+        "errors": errors,
+        "inferences": reuse.computed if reuse else 2 * processed,
+        "inferences_avoided": reuse.avoided if reuse else 0,
+        "elapsed": round(time.time() - t0, 2),
+    }
+
+
+# =============================================================================
+# ZIP batch (one reference, many probes)
+# =============================================================================
+
+ZIP_FIELDS = ["probe", "verdict", "confidence", "similarity", "quality", "geometry", "time", "error"]
+
+
+def zip_members(zf: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Image members, skipping directories, macOS resource forks and dotfiles."""
+    out = []
+    for info in zf.infolist():
+        name = PurePosixPath(info.filename)
+        if info.is_dir() or "__MACOSX" in name.parts or name.name.startswith("."):
+            continue
+        if name.suffix.lower() in ALLOWED_EXTS:
+            out.append(info)
+    return out
+
+
+@dataclass
+class ZipBatchRun:
+    """Progress shared between the worker thread and the page that polls it."""
+    total: int
+    rows: List[dict] = field(default_factory=list)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, row: dict) -> None:
+        with self._lock:
+            self.rows.append(row)
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return list(self.rows)
+
+    @property
+    def done(self) -> int:
+        return len(self.rows)
+
+
+def run_audited(verifier: UltimateVerifier, audit, img1: str, img2: str, img1_hash: Optional[str],
+                img2_hash: Optional[str], session_id: Optional[str] = None, operator: Optional[str] = None,
+                source: str = "dashboard", **kwargs):
+    """
+    verify() plus its audit row, success or failure, for a background job.
+    The row is written by the job itself, so it lands even if the page
+    that submitted the job never comes back to collect it.
+    """
+    t0 = time.time()
+    try:
+        result = verifier.verify(img1, img2, **kwargs)
+    except Exception as e:
+        audit.record_failure(f"{type(e).__name__}: {e}", img1_hash, img2_hash, session_id=session_id,
+                             operator=operator, source=source, execution_time=time.time() - t0)
+        raise
+    audit.record(result, img1_hash, img2_hash, session_id=session_id, operator=operator, source=source)
+    return result
+
+
+def _probe_row(verifier: UltimateVerifier, ref: ImageFeatures, name: str, data: bytes,
+               audit=None, ref_hash: Optional[str] = None, session_id: Optional[str] = None,
+               operator: Optional[str] = None) -> dict:
+    t0 = time.time()
+    ok, msg, img = validate_image_bytes(data, name)
+    if not ok:
+        return {"probe": name, "verdict": "ERROR", "time": round(time.time() - t0, 3),
+                "error": f"Image invalid: {msg}"}
+    try:
+        result = verifier.verify_features(ref, verifier.extract_image(img, name, t0))
+    except Exception as e:
+        logger.error(f"Batch probe failed: {name}", exc_info=True)
+        return {"probe": name, "verdict": "ERROR", "time": round(time.time() - t0, 3), "error": str(e)}
+    if audit is not None:
+        audit.record(result, ref_hash, sha256_bytes(data), session_id=session_id,
+                     operator=operator, source="dashboard-batch")
+    return {
+        "probe": name,
+        "verdict": result.verdict,
+        "confidence": result.confidence,
+        "similarity": round(result.similarity, 4),
+        "quality": round(result.quality_avg, 1),
+        "geometry": round(result.geometry_sim, 1),
+        "time": round(result.execution_time, 3),
+        "error": result.error,
+    }
+
+
+def run_zip_batch(verifier: UltimateVerifier, ref: ImageFeatures, archive: bytes, run: ZipBatchRun,
+                  workers: int = 2, **audit_kwargs) -> ZipBatchRun:
+    """
+    Verify every image in `archive` against `ref`. At most 2 x workers
+    members are decoded and in flight at once, so memory stays bounded by
+    the pool, not the archive.
+    """
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf, ThreadPoolExecutor(workers) as pool:
+        in_flight = set()
+        for info in zip_members(zf):
+            if run.cancelled.is_set():
+                break
+            if info.file_size > MAX_BYTES:
+                run.add({"probe": info.filename, "verdict": "ERROR", "error": "File too large (>50MB)"})
+                continue
+            data = zf.read(info)
+            in_flight.add(pool.submit(_probe_row, verifier, ref, info.filename, data, **audit_kwargs))
+            if len(in_flight) >= 2 * workers:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    run.add(f.result())
+        for f in wait(in_flight).done:
+            run.add(f.result())
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable batch verification")
+    parser.add_argument("pairs", help="pairs file: img1 img2 [label]")
+    parser.add_argument("--out", required=True, help="JSONL output (appended on resume)")
+    parser.add_argument("--job-id", help="journal name (default: derived from the pairs file)")
+    parser.add_argument("--restart", action="store_true", help="discard the journal and start over")
+    parser.add_argument("--dedup", action="store_true",
+                        help="reuse features across near-duplicate images (face-confirmed)")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=("sample", "cprofile"),
+                        help="profile the batch; files are written next to --out")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.pairs)
+    job_id = args.job_id or default_job_id(args.pairs)
+    if args.restart:
+        JobJournal(job_id).discard()
+        if os.path.exists(args.out):
+            os.remove(args.out)
+
+    profiler = nullcontext()
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(args.profile)
+
+    try:
+        with profiler:
+            summary = run_batch(UltimateVerifier(), pairs, args.out, job_id, dedup=args.dedup)
+    except KeyboardInterrupt:
+        print(f"Interrupted; re-run the same command to resume job {job_id}")
+        sys.exit(130)
+    finally:
+        if args.profile:
+            profiler.write(args.out)
+            profiler.print_table()
+
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash pre-filter for near-duplicate images.
+
+Recompressions, thumbnails and burst frames are byte-different but share
+nearly the same 64-bit difference hash (dHash): the image is decoded at
+reduced resolution, shrunk to 9x8 grey, and each bit records whether a
+pixel is brighter than its right neighbour. Two images are treated as
+near-duplicates when their hashes differ in at most
+Config.DEDUP_MAX_DISTANCE bits.
+
+A whole-image hash says nothing about a small face: two burst frames of
+the same scene with different people in it hash alike. Reuse is therefore
+confirmed per face (face_hashes / faces_match): the representative's face
+boxes are cut from both images and their crop hashes must also agree.
+
+DuplicateIndex splits every hash into 8 bands of 8 bits. Two hashes at
+distance <= 7 agree exactly on at least one band (pigeonhole), so a lookup
+only compares against entries that share a band bucket.
+
+    python3 dedup.py DIR_OR_IMAGES... [--max-distance 4] [--json]
+"""
+import os
+import sys
+import json
+import argparse
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from lz_validators import ALLOWED_EXTS
+from verify_v6 import Config
+
+BANDS = 8
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def dhash_image(img: np.ndarray) -> int:
+    """64-bit difference hash of a BGR or greyscale image."""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_file(path: str) -> Optional[int]:
+    """dHash from a reduced-size JPEG/PNG decode; None if unreadable."""
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None or img.shape[0] < 8 or img.shape[1] < 9:
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    return dhash_image(img)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _crop(img: np.ndarray, box) -> Optional[np.ndarray]:
+    h, w = img.shape[:2]
+    x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+    x2, y2 = min(w, int(box[2])), min(h, int(box[3]))
+    if x2 - x1 < 9 or y2 - y1 < 8:
+        return None
+    return img[y1:y2, x1:x2]
+
+
+def face_hashes(img: np.ndarray, boxes) -> List[Optional[int]]:
+    """dHash of each face box region (None where the box is too small to hash)."""
+    crops = (_crop(img, b) for b in boxes)
+    return [dhash_image(c) if c is not None else None for c in crops]
+
+
+def faces_match(img: np.ndarray, boxes, hashes: Sequence[Optional[int]],
+                max_distance: int = Config.DEDUP_MAX_DISTANCE) -> bool:
+    """
+    True when every face region of a representative looks the same in `img`.
+    No faces, or a face too small to hash, cannot be confirmed: False.
+    """
+    if not len(boxes) or any(h is None for h in hashes):
+        return False
+    mine = face_hashes(img, boxes)
+    return all(m is not None and hamming(m, h) <= max_distance for m, h in zip(mine, hashes))
+
+
+class DuplicateIndex:
+    """
+    Representatives keyed by hash, with band buckets for sub-linear lookup.
+    `capacity` bounds the index for long-running ingest (oldest evicted).
+    """
+
+    def __init__(self, max_distance: int = Config.DEDUP_MAX_DISTANCE, capacity: Optional[int] = None):
+        if not 0 <= max_distance < BANDS:
+            raise ValueError(f"max_distance must be in [0, {BANDS - 1}]")
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self._hashes: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._buckets = [defaultdict(list) for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._hashes
+
+    @staticmethod
+    def _bands(h: int):
+        for b in range(BANDS):
+            yield b, (h >> (b * BAND_BITS)) & BAND_MASK
+
+    def find(self, h: int) -> Optional[Hashable]:
+        """Closest indexed key within max_distance of `h`, or None."""
+        best, best_d = None, self.max_distance + 1
+        seen = set()
+        for b, v in self._bands(h):
+            for key in self._buckets[b].get(v, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                d = hamming(h, self._hashes[key])
+                if d < best_d:
+                    best, best_d = key, d
+        return best
+
+    def add(self, key: Hashable, h: int) -> None:
+        if key in self._hashes:
+            return
+        self._hashes[key] = h
+        for b, v in self._bands(h):
+            self._buckets[b][v].append(key)
+        if self.capacity is not None and len(self._hashes) > self.capacity:
+            old, oh = self._hashes.popitem(last=False)
+            for b, v in self._bands(oh):
+                bucket = self._buckets[b][v]
+                bucket.remove(old)
+                if not bucket:
+                    del self._buckets[b][v]
+
+
+def group_paths(paths: Sequence[str], max_distance: int = Config.DEDUP_MAX_DISTANCE) -> Dict[str, str]:
+    """
+    Map every path to its group representative (the first path seen in its
+    group). Unreadable files are their own representative.
+    """
+    index = DuplicateIndex(max_distance)
+    rep_of = {}
+    for path in paths:
+        if path in rep_of:
+            continue
+        h = dhash_file(path)
+        if h is None:
+            rep_of[path] = path
+            continue
+        rep = index.find(h)
+        if rep is None:
+            index.add(path, h)
+            rep = path
+        rep_of[path] = rep
+    return rep_of
+
+
+def groups(rep_of: Dict[str, str]) -> List[List[str]]:
+    by_rep = defaultdict(list)
+    for path, rep in rep_of.items():
+        by_rep[rep].append(path)
+    return [members for members in by_rep.values() if len(members) > 1]
+
+
+class FeatureReuse:
+    """
+    Per-representative cache in front of a per-image function (e.g.
+    UltimateVerifier.extract). Counts calls made and calls avoided.
+
+    `confirm(value, rep, path)` must approve every reuse for a path other
+    than the representative itself; otherwise the path is computed on its
+    own. confirm_faces() is the check for ImageFeatures.
+    """
+
+    def __init__(self, fn, rep_of: Dict[str, str], capacity: int = Config.DEDUP_CACHE_SIZE, confirm=None):
+        self.fn = fn
+        self.rep_of = rep_of
+        self.capacity = capacity
+        self.confirm = confirm
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self.computed = 0
+        self.avoided = 0
+
+    def own(self, path: str):
+        """Value computed from `path` itself, never from its representative."""
+        if path in self._cache:
+            self._cache.move_to_end(path)
+            return self._cache[path], path
+        value = self.fn(path)
+        self.computed += 1
+        self._cache[path] = value
+        if len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+        return value, path
+
+    def __call__(self, path: str):
+        rep = self.rep_of.get(path, path)
+        if rep == path:
+            return self.own(path)
+        value, _ = self.own(rep)
+        if self.confirm is None or not self.confirm(value, rep, path):
+            return self.own(path)
+        self.avoided += 1
+        return value, rep
+
+
+def confirm_faces(max_distance: int = Config.DEDUP_MAX_DISTANCE):
+    """FeatureReuse confirm: the representative's face box must look the same in the member image."""
+    rep_hash: Dict[str, Optional[int]] = {}
+
+    def confirm(feats, rep: str, path: str) -> bool:
+        box = getattr(feats, "face_box", None)
+        if box is None or getattr(feats, "error", None):
+            return False
+        if rep not in rep_hash:
+            img = cv2.imread(rep, cv2.IMREAD_GRAYSCALE)
+            rep_hash[rep] = face_hashes(img, [box])[0] if img is not None else None
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        return img is not None and faces_match(img, [box], [rep_hash[rep]], max_distance)
+
+    return confirm
+
+
+def _collect(inputs: Sequence[str]) -> List[str]:
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(str(p) for p in Path(item).rglob("*") if p.suffix.lower() in ALLOWED_EXTS))
+        else:
+            paths.append(item)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group near-duplicate images by perceptual hash")
+    parser.add_argument("inputs", nargs="+", help="images or directories")
+    parser.add_argument("--max-distance", type=int, default=Config.DEDUP_MAX_DISTANCE,
+                        help=f"max differing dHash bits (0-{BANDS - 1})")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    paths = _collect(args.inputs)
+    rep_of = group_paths(paths, args.max_distance)
+    dup_groups = groups(rep_of)
+    avoided = len(paths) - len(set(rep_of.values()))
+
+    if args.json:
+        print(json.dumps({"images": len(paths), "inferences_avoided": avoided, "groups": dup_groups}, indent=2))
+    else:
+        for members in dup_groups:
+            print(f"{members[0]}")
+            for m in members[1:]:
+                print(f"  = {m}")
+        print(f"\n{len(paths)} images, {len(dup_groups)} duplicate groups, "
+              f"{avoided} inferences avoidable ({avoided / max(len(paths), 1):.0%})")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Compressed embedding storage for templates and in-RAM galleries.
+
+Two codecs for unit-norm embeddings:
+
+  int8    per-vector scale s = max|x| / 127, codes = round(x / s).
+          512-d: 516 B/vector (512 codes + float32 scale), 25% of float32.
+          |score error| <= s / 2 * ||q||_1 for probe q; scores() returns
+          this bound for every row.
+  float16 1024 B/vector, 50% of float32. Relative rounding error 2^-11
+          per element, so |score error| <= 2^-11 * sum|x_i q_i| <= 4.9e-4
+          for unit vectors.
+
+Scoring runs vectorized on the compressed arrays in row blocks (the only
+float32 temporary is one block), and only the top k * RERANK_FACTOR
+candidates are rescored in full precision with cosine_sim against the
+float32 originals, which can stay on disk as a memory-mapped .npy.
+shards.py --codec serves gallery partitions this way.
+
+    python3 embedding_codec.py --bench [--n 100000] [--embeddings gallery.npy]
+"""
+import sys
+import time
+import argparse
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from verify_v6 import cosine_sim
+
+BLOCK_ROWS = 8192
+RERANK_FACTOR = 4
+F16_REL_ERROR = 2.0 ** -11
+
+
+def _normalize(E: np.ndarray) -> np.ndarray:
+    E = np.asarray(E, dtype=np.float32)
+    return E / np.maximum(np.linalg.norm(E, axis=-1, keepdims=True), 1e-12)
+
+
+def quantize_int8(E: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-vector symmetric int8 quantization: (N x D int8 codes, N float32 scales)."""
+    E = np.atleast_2d(np.asarray(E, dtype=np.float32))
+    scales = np.maximum(np.abs(E).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(E / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+class CompressedGallery:
+    """
+    Gallery of unit-norm embeddings held in int8 or float16.
+
+    `full` (optional) is the float32 matrix used for exact reranking; pass a
+    np.load(..., mmap_mode="r") array to keep it out of RAM.
+    """
+
+    def __init__(self, embeddings: np.ndarray, ids: Optional[Sequence] = None,
+                 mode: str = "int8", full: Optional[np.ndarray] = None):
+        if mode not in ("int8", "float16"):
+            raise ValueError(f"Unknown mode: {mode}")
+        E = _normalize(embeddings)
+        self.mode = mode
+        self.ids = list(ids) if ids is not None else list(range(len(E)))
+        self.dim = E.shape[1]
+        self.full = full
+        if mode == "int8":
+            self.codes, self.scales = quantize_int8(E)
+        else:
+            self.codes, self.scales = E.astype(np.float16), None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def memory_bytes(self) -> dict:
+        compressed = self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        float32 = len(self) * self.dim * 4
+        return {
+            "vectors": len(self),
+            "compressed_bytes": compressed,
+            "float32_bytes": float32,
+            "bytes_per_vector": compressed / max(len(self), 1),
+            "ratio": compressed / max(float32, 1),
+        }
+
+    def scores(self, probes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate scores for every row plus the per-row absolute error bound.
+        `probes` is D or M x D; several probes share one decode of each block.
+        """
+        single = np.ndim(probes) == 1
+        Q = np.atleast_2d(_normalize(probes))
+        out = np.empty((len(Q), len(self)), dtype=np.float32)
+        for i in range(0, len(self), BLOCK_ROWS):
+            block = self.codes[i:i + BLOCK_ROWS].astype(np.float32)
+            out[:, i:i + BLOCK_ROWS] = Q @ block.T
+        if self.mode == "int8":
+            out *= self.scales
+            bound = self.scales[None, :] * (0.5 * np.abs(Q).sum(axis=1, keepdims=True))
+        else:
+            bound = np.full(out.shape, F16_REL_ERROR, dtype=np.float32)
+        return (out[0], bound[0]) if single else (out, bound)
+
+    def search(self, probe: np.ndarray, k: int = 10, rerank: int = RERANK_FACTOR) -> List[Tuple[object, float, bool]]:
+        """
+        Top-k as (id, score, exact). Candidates come from the compressed
+        scores; with `full` available the top k * rerank are rescored with
+        cosine_sim in float32 and exact=True.
+        """
+        approx, _ = self.scores(probe)
+        n = min(len(self), max(k, k * rerank if self.full is not None else k))
+        if n == 0:
+            return []
+        cand = np.argpartition(-approx, n - 1)[:n]
+        if self.full is None:
+            cand = cand[np.argsort(-approx[cand])][:k]
+            return [(self.ids[i], float(approx[i]), False) for i in cand]
+        exact = [(int(i), cosine_sim(np.asarray(self.full[i], dtype=np.float32), probe)) for i in cand]
+        exact.sort(key=lambda t: -t[1])
+        return [(self.ids[i], s, True) for i, s in exact[:k]]
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def bench(E: np.ndarray, probes: int = 100, k: int = 10) -> None:
+    E = _normalize(E)
+    rng = np.random.default_rng(0)
+    # Probes near gallery members, as in a real search
+    idx = rng.choice(len(E), size=min(probes, len(E)), replace=False)
+    Q = _normalize(E[idx] + 0.05 * rng.standard_normal((len(idx), E.shape[1])).astype(np.float32))
+
+    t = time.perf_counter()
+    exact = Q @ E.T
+    t_exact = (time.perf_counter() - t) / len(Q)
+
+    print(f"\nGallery: {len(E)} x {E.shape[1]} float32 = {E.nbytes / 2**20:.1f} MiB")
+    print(f"{'MODE':<9}{'MiB':>9}{'RATIO':>8}{'B/VEC':>8}{'MAX ERR':>11}{'MEAN ERR':>11}"
+          f"{'BOUND':>10}{'RECALL@' + str(k):>11}{'ms/query':>10}")
+    print(f"{'float32':<9}{E.nbytes / 2**20:>9.1f}{1.0:>8.2f}{E.shape[1] * 4:>8}"
+          f"{0.0:>11.2e}{0.0:>11.2e}{0.0:>10.1e}{1.0:>11.3f}{t_exact * 1000:>10.2f}")
+
+    for mode in ("int8", "float16"):
+        g = CompressedGallery(E, mode=mode, full=E)
+        mem = g.memory_bytes()
+        recall = []
+        t = time.perf_counter()
+        s, b = g.scores(Q)
+        t_comp = (time.perf_counter() - t) / len(Q)
+        errs = np.abs(s - exact)
+        bounds = [b.max()]
+        for qi, q in enumerate(Q):
+            truth = set(np.argsort(-exact[qi])[:k].tolist())
+            got = {i for i, _, _ in g.search(q, k)}
+            recall.append(len(truth & got) / k)
+        print(f"{mode:<9}{mem['compressed_bytes'] / 2**20:>9.1f}{mem['ratio']:>8.2f}"
+              f"{mem['bytes_per_vector']:>8.0f}{errs.max():>11.2e}{errs.mean():>11.2e}"
+              f"{max(bounds):>10.1e}{np.mean(recall):>11.3f}{t_comp * 1000:>10.2f}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed embedding storage")
+    parser.add_argument("--bench", action="store_true", help="measure memory, score error and recall")
+    parser.add_argument("--embeddings", help=".npy of real N x D embeddings (default: random unit vectors)")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.print_help()
+        sys.exit(1)
+    if args.embeddings:
+        E = np.load(args.embeddings, mmap_mode="r")
+    else:
+        E = np.random.default_rng(1).standard_normal((args.n, args.dim)).astype(np.float32)
+    bench(np.asarray(E, dtype=np.float32))
+
+
+if __name__ == "__main__":
+    main()
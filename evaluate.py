@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Speed / accuracy evaluation harness for UltimateVerifier.
+
+Runs a local genuine/impostor pairs list through several named engine
+configurations and prints one table with ROC AUC, TAR@FAR, verdict drift
+against the baseline configuration, mean/p99 pair latency, and how often
+lazy geometry skipped FaceMesh (compare with the eager_geometry config).
+
+Pairs file : one pair per line "img1 img2 label" (comma or whitespace
+             separated, label 1/genuine or 0/impostor, '#' comments).
+Configs    : optional JSON {"name": {"DET_SIZE": [480, 480], ...}}; keys are
+             Config attributes. The first entry is the baseline.
+
+Per-image features are cached per configuration under --cache-dir, so
+re-running with other decision constants never repeats inference.
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from verify_v6 import (
+    Config,
+    ImageFeatures,
+    ImageQuality,
+    UltimateVerifier,
+    cosine_sim,
+    decide,
+    geometry_can_change,
+    geometry_similarity,
+    logger,
+)
+
+DEFAULT_CONFIGS = {
+    "baseline": {},
+    "det480": {"DET_SIZE": [480, 480]},
+    "det320": {"DET_SIZE": [320, 320]},
+    "no_geometry": {"USE_GEOMETRY": False},
+    "eager_geometry": {"LAZY_GEOMETRY": False},
+}
+
+FAR_POINTS = (1e-1, 1e-2, 1e-3)
+VERDICTS = ("SAME_HIGH", "SAME_MEDIUM", "UNCERTAIN", "DIFFERENT", "ERROR")
+
+
+# =============================================================================
+# Inputs
+# =============================================================================
+
+def load_pairs(path: str) -> List[Tuple[str, str, Optional[int]]]:
+    """Parse a pairs list; the label column is optional (None when absent)."""
+    pairs = []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.replace(",", " ").split()
+            if len(parts) not in (2, 3):
+                raise ValueError(f"{path}:{lineno}: expected 'img1 img2 [label]'")
+            a, b = (p if os.path.isabs(p) else os.path.join(base, p) for p in parts[:2])
+            label = None
+            if len(parts) == 3:
+                tag = parts[2].lower()
+                if tag in ("1", "genuine", "same", "true"):
+                    label = 1
+                elif tag in ("0", "impostor", "different", "false"):
+                    label = 0
+                else:
+                    raise ValueError(f"{path}:{lineno}: bad label {parts[2]!r}")
+            pairs.append((a, b, label))
+    return pairs
+
+
+def load_configs(path: Optional[str]) -> Dict[str, dict]:
+    if not path:
+        return dict(DEFAULT_CONFIGS)
+    with open(path, encoding="utf-8") as f:
+        configs = json.load(f)
+    for name, overrides in configs.items():
+        unknown = [k for k in overrides if not hasattr(Config, k)]
+        if unknown:
+            raise ValueError(f"Config '{name}': unknown keys {unknown}")
+    return configs
+
+
+@contextmanager
+def config_overrides(overrides: dict):
+    """Temporarily apply Config attribute overrides (lists become tuples)."""
+    saved = {k: getattr(Config, k) for k in overrides}
+    try:
+        for k, v in overrides.items():
+            setattr(Config, k, tuple(v) if isinstance(v, list) else v)
+        yield
+    finally:
+        for k, v in saved.items():
+            setattr(Config, k, v)
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# =============================================================================
+# Feature cache
+# =============================================================================
+
+class FeatureCache:
+    """One .npz per (feature settings, image content) holding an ImageFeatures.
+
+    The directory is keyed on the effective values of FEATURE_KEYS only, so
+    configs that differ just in thresholds or decision weights share entries
+    and a threshold sweep runs inference once.
+    """
+
+    VERSION = 2   # .npz layout; bump on change so older caches are never read
+
+    # Config keys read by UltimateVerifier.extract(): detection, tiling,
+    # quality scoring and geometry. Anything else only affects decide().
+    FEATURE_KEYS = (
+        "MODEL_NAME", "DET_SIZE", "MIN_DETECTION_CONFIDENCE", "USE_GEOMETRY",
+        "BLUR_WEIGHT", "BRIGHTNESS_WEIGHT", "CONTRAST_WEIGHT", "RESOLUTION_WEIGHT",
+        "TILED_DETECTION", "TILE_SIZE", "TILE_OVERLAP", "TILE_MIN_SIDE", "TILE_NMS_IOU",
+    )
+
+    def __init__(self, root: str, overrides: dict):
+        settings = {k: overrides.get(k, getattr(Config, k)) for k in self.FEATURE_KEYS}
+        key = json.dumps(settings, sort_keys=True)
+        fp = hashlib.sha1(f"v{self.VERSION}:{key}".encode()).hexdigest()[:12]
+        self.dir = os.path.join(root, f"features-{fp}")
+        os.makedirs(self.dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, digest: str) -> str:
+        return os.path.join(self.dir, digest + ".npz")
+
+    def get(self, path: str, digest: str) -> Optional[ImageFeatures]:
+        f = self._file(digest)
+        if not os.path.exists(f):
+            self.misses += 1
+            return None
+        with np.load(f, allow_pickle=False) as z:
+            q = z["quality"]
+            quality = ImageQuality(
+                float(q[0]), float(q[1]), float(q[2]), (int(q[3]), int(q[4])),
+                float(q[5]), bool(q[6]), str(z["qerror"]) or None,
+            )
+            emb = z["embedding"] if z["embedding"].size else None
+            geo = z["geometry"] if z["geometry"].size else None
+            feats = ImageFeatures(path, quality, emb, geo, str(z["error"]) or None,
+                                  float(z["elapsed"]), float(z["geometry_elapsed"]))
+        self.hits += 1
+        return feats
+
+    def put(self, digest: str, feats: ImageFeatures) -> None:
+        q = feats.quality
+        np.savez(
+            self._file(digest),
+            quality=np.array([q.blur, q.brightness, q.contrast, q.resolution[0],
+                              q.resolution[1], q.score, float(q.valid)], dtype=np.float64),
+            qerror=np.array(q.error or ""),
+            embedding=np.asarray(feats.embedding if feats.embedding is not None else [], dtype=np.float32),
+            geometry=np.asarray(feats.geometry if feats.geometry is not None else [], dtype=np.float64),
+            error=np.array(feats.error or ""),
+            elapsed=np.array(feats.elapsed),
+            geometry_elapsed=np.array(feats.geometry_elapsed),
+        )
+
+
+# =============================================================================
+# Metrics
+# =============================================================================
+
+def roc_curve(scores: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """FPR/TPR at every distinct score threshold (descending)."""
+    order = np.argsort(-scores, kind="mergesort")
+    s, y = scores[order], labels[order]
+    tps = np.cumsum(y)
+    fps = np.cumsum(1 - y)
+    last = np.r_[np.nonzero(np.diff(s))[0], len(s) - 1]
+    pos = max(int(y.sum()), 1)
+    neg = max(int(len(y) - y.sum()), 1)
+    tpr = np.r_[0.0, tps[last] / pos]
+    fpr = np.r_[0.0, fps[last] / neg]
+    return fpr, tpr, np.r_[np.inf, s[last]]
+
+
+def roc_auc(fpr: np.ndarray, tpr: np.ndarray) -> float:
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+
+def tar_at_far(fpr: np.ndarray, tpr: np.ndarray, far: float) -> float:
+    ok = fpr <= far
+    return float(tpr[ok].max()) if ok.any() else 0.0
+
+
+def pair_decision(f1: ImageFeatures, f2: ImageFeatures) -> Tuple[str, float]:
+    """Verdict and similarity exactly as UltimateVerifier.verify() would produce them."""
+    if f1.error or f2.error:
+        return "ERROR", 0.0
+    sim = cosine_sim(f1.embedding, f2.embedding)
+    quality = (f1.quality.score + f2.quality.score) / 2
+    geo = 50.0 if geometry_skipped(sim, quality) else geometry_similarity(f1.geometry, f2.geometry)
+    return decide(sim, geo, quality)[0], sim
+
+
+def geometry_skipped(sim: float, quality: float) -> bool:
+    """verify()'s lazy-geometry test under the current Config."""
+    return Config.USE_GEOMETRY and Config.LAZY_GEOMETRY and not geometry_can_change(sim, quality)
+
+
+# =============================================================================
+# Evaluation
+# =============================================================================
+
+def extract_features(name: str, overrides: dict, paths: List[str], cache_root: str) -> Dict[str, ImageFeatures]:
+    cache = FeatureCache(cache_root, overrides)
+    verifier = None
+    feats = {}
+    with config_overrides(overrides):
+        for path in paths:
+            digest = file_digest(path) if os.path.isfile(path) else None
+            f = cache.get(path, digest) if digest else None
+            if f is None:
+                if verifier is None:
+                    verifier = UltimateVerifier()
+                f = verifier.extract(path)
+                if digest:
+                    cache.put(digest, f)
+            feats[path] = f
+    logger.info(
+        f"[{name}] features ready",
+        extra={"config": name, "cache_hits": cache.hits, "cache_misses": cache.misses},
+    )
+    return feats
+
+
+def evaluate_config(name: str, overrides: dict, pairs, cache_root: str) -> dict:
+    paths = sorted({p for a, b, _ in pairs for p in (a, b)})
+    feats = extract_features(name, overrides, paths, cache_root)
+
+    verdicts, sims, latencies = [], [], []
+    skipped = 0
+    with config_overrides(overrides):
+        for a, b, _ in pairs:
+            fa, fb = feats[a], feats[b]
+            verdict, sim = pair_decision(fa, fb)
+            verdicts.append(verdict)
+            sims.append(sim)
+            latency = fa.elapsed + fb.elapsed
+            # Features are extracted eagerly for caching; a lazy verify() would
+            # not have paid for FaceMesh on pairs it skips.
+            if verdict != "ERROR" and geometry_skipped(sim, (fa.quality.score + fb.quality.score) / 2):
+                latency -= fa.geometry_elapsed + fb.geometry_elapsed
+                skipped += 1
+            latencies.append(latency)
+
+    report = {
+        "name": name,
+        "overrides": overrides,
+        "pairs": len(pairs),
+        "errors": sum(v == "ERROR" for v in verdicts),
+        "geometry_skipped": skipped,
+        "verdicts": verdicts,
+        "latency_mean_ms": float(np.mean(latencies) * 1000) if latencies else 0.0,
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000) if latencies else 0.0,
+    }
+
+    labelled = [(s, l) for (s, v), (_, _, l) in zip(zip(sims, verdicts), pairs)
+                if l is not None and v != "ERROR"]
+    if labelled and 0 < sum(l for _, l in labelled) < len(labelled):
+        scores = np.array([s for s, _ in labelled], dtype=np.float64)
+        labels = np.array([l for _, l in labelled], dtype=np.int64)
+        fpr, tpr, thr = roc_curve(scores, labels)
+        report["auc"] = roc_auc(fpr, tpr)
+        report["tar_at_far"] = {str(far): tar_at_far(fpr, tpr, far) for far in FAR_POINTS}
+        report["roc"] = {"fpr": fpr.tolist(), "tpr": tpr.tolist(), "thresholds": thr[1:].tolist()}
+    return report
+
+
+def verdict_confusion(base: List[str], other: List[str]) -> Dict[str, Dict[str, int]]:
+    table = {v: {w: 0 for w in VERDICTS} for v in VERDICTS}
+    for a, b in zip(base, other):
+        table[a][b] += 1
+    return table
+
+
+def print_table(reports: List[dict]) -> None:
+    fars = "".join(f"{'TAR@' + format(far, 'g'):>12}" for far in FAR_POINTS)
+    header = (f"{'CONFIG':<16}{'PAIRS':>7}{'ERR':>6}{'AUC':>8}{fars}{'CHANGED':>9}{'GEO SKIP':>10}"
+              f"{'MEAN ms':>10}{'P99 ms':>10}{'SPEEDUP':>9}")
+    print("\n" + "=" * len(header))
+    print(header)
+    print("-" * len(header))
+    for r in reports:
+        auc = f"{r['auc']:.4f}" if "auc" in r else "-"
+        tars = "".join(
+            f"{r['tar_at_far'][str(far)]:>12.4f}" if "tar_at_far" in r else f"{'-':>12}"
+            for far in FAR_POINTS
+        )
+        skip = r["geometry_skipped"] / max(r["pairs"] - r["errors"], 1)
+        print(
+            f"{r['name']:<16}{r['pairs']:>7}{r['errors']:>6}{auc:>8}{tars}"
+            f"{r['changed_vs_baseline']:>9}{skip:>10.1%}{r['latency_mean_ms']:>10.1f}{r['latency_p99_ms']:>10.1f}"
+            f"{r['speedup_vs_baseline']:>8.2f}x"
+        )
+    print("=" * len(header))
+
+    base = reports[0]["name"]
+    for r in reports[1:]:
+        print(f"\nVerdict confusion: {base} (rows) vs {r['name']} (cols)")
+        print(f"{'':<13}" + "".join(f"{v:>13}" for v in VERDICTS))
+        for v in VERDICTS:
+            print(f"{v:<13}" + "".join(f"{r['confusion'][v][w]:>13}" for w in VERDICTS))
+    print()
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def main():
+    ap = argparse.ArgumentParser(description="Speed/accuracy trade-off evaluation over a pairs list")
+    ap.add_argument("pairs", help="pairs file: img1 img2 label")
+    ap.add_argument("--configs", help="JSON file of named Config overrides (first = baseline)")
+    ap.add_argument("--only", nargs="+", help="evaluate only these config names (baseline always kept)")
+    ap.add_argument("--cache-dir", default=".eval_cache", help="per-config feature cache")
+    ap.add_argument("--json", dest="json_out", help="write the full report (incl. ROC points) here")
+    args = ap.parse_args()
+
+    pairs = load_pairs(args.pairs)
+    if not pairs:
+        print("No pairs found")
+        sys.exit(1)
+    configs = load_configs(args.configs)
+    names = list(configs)
+    if args.only:
+        unknown = sorted(set(args.only) - set(names))
+        if unknown:
+            ap.error(f"--only: unknown config(s) {', '.join(unknown)}; available: {', '.join(names)}")
+        names = [names[0]] + [n for n in names[1:] if n in args.only]
+
+    reports = []
+    for name in names:
+        reports.append(evaluate_config(name, configs[name], pairs, args.cache_dir))
+
+    base = reports[0]
+    for r in reports:
+        r["confusion"] = verdict_confusion(base["verdicts"], r["verdicts"])
+        r["changed_vs_baseline"] = sum(a != b for a, b in zip(base["verdicts"], r["verdicts"]))
+        r["speedup_vs_baseline"] = base["latency_mean_ms"] / r["latency_mean_ms"] if r["latency_mean_ms"] else 0.0
+
+    print_table(reports)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Report written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Multi-image template fusion.
+
+Several photos of one identity are embedded once and fused into a single
+L2-normalised template, weighted by ImageQuality.score, so comparing a
+reference set with a probe (or probe set) is one dot product instead of
+M x N verify() calls. The per-image embeddings are kept for a max-score
+fallback when the fused score lands in the UNCERTAIN band.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lz_validators import validate_image_file
+from verify_v6 import Config, ImageQualityAnalyzer, UltimateVerifier, decide, logger
+
+
+# =============================================================================
+# Data Classes
+# =============================================================================
+
+@dataclass
+class FusedTemplate:
+    identity: str
+    fused: Optional[np.ndarray]          # D, unit norm
+    embeddings: np.ndarray               # N x D, unit norm rows
+    weights: np.ndarray                  # N, sums to 1
+    qualities: List[float] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    rejected: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return len(self.sources)
+
+    @property
+    def quality(self) -> float:
+        """Weight-averaged image quality of the fused template."""
+        if not self.size:
+            return 0.0
+        return float(np.dot(self.weights, self.qualities))
+
+
+@dataclass
+class TemplateMatch:
+    fused_score: float
+    max_score: float
+    best_pair: Tuple[str, str]
+    verdict: str
+    confidence: float
+    used_fallback: bool
+    execution_time: float
+    error: Optional[str] = None
+
+
+# =============================================================================
+# Fusion
+# =============================================================================
+
+def _normalize(v: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.maximum(n, 1e-12)
+
+
+def fuse(embeddings: np.ndarray, qualities: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Quality-weighted mean of unit embeddings; returns (fused, weights)."""
+    q = np.maximum(np.asarray(qualities, dtype=np.float64), Config.FUSION_MIN_WEIGHT)
+    w = q / q.sum()
+    fused = _normalize((w[:, None] * embeddings).sum(axis=0))
+    return fused.astype(np.float32), w
+
+
+def build_template(verifier: UltimateVerifier, paths: Sequence[str], identity: str = "") -> FusedTemplate:
+    embs, quals, sources, rejected = [], [], [], []
+    for path in paths:
+        ok, msg = validate_image_file(path)
+        if not ok:
+            rejected.append((path, f"Image invalid: {msg}"))
+            continue
+        q = ImageQualityAnalyzer.analyze(path)
+        if not q.valid:
+            rejected.append((path, "Quality failure"))
+            continue
+        e = verifier.engine.embed(path)
+        if e is None:
+            rejected.append((path, "Face not detected"))
+            continue
+        embs.append(np.asarray(e, dtype=np.float32))
+        quals.append(q.score)
+        sources.append(path)
+
+    if rejected:
+        logger.warning(
+            f"Template '{identity}': {len(rejected)} image(s) rejected",
+            extra={"identity": identity, "rejected": len(rejected), "accepted": len(sources)},
+        )
+    if not embs:
+        return FusedTemplate(identity, None, np.zeros((0, 0), np.float32), np.zeros(0), [], [], rejected)
+
+    E = _normalize(np.stack(embs))
+    fused, w = fuse(E, quals)
+    return FusedTemplate(identity, fused, E, w, quals, sources, rejected)
+
+
+def compare_templates(ref: FusedTemplate, probe: FusedTemplate) -> TemplateMatch:
+    t0 = time.time()
+    if ref.fused is None or probe.fused is None:
+        missing = "reference" if ref.fused is None else "probe"
+        return TemplateMatch(0.0, 0.0, ("", ""), "ERROR", 0, False, time.time() - t0,
+                             f"No usable {missing} images")
+
+    fused_score = float(np.dot(ref.fused, probe.fused))
+    pairwise = ref.embeddings @ probe.embeddings.T
+    i, j = np.unravel_index(int(np.argmax(pairwise)), pairwise.shape)
+    max_score = float(pairwise[i, j])
+
+    quality = (ref.quality + probe.quality) / 2
+    verdict, conf = decide(fused_score, 50.0, quality)
+    used_fallback = False
+    if verdict == "UNCERTAIN":
+        fb_verdict, fb_conf = decide(max_score, 50.0, quality)
+        if fb_verdict != "UNCERTAIN":
+            verdict, conf, used_fallback = fb_verdict, fb_conf, True
+
+    return TemplateMatch(
+        fused_score=fused_score,
+        max_score=max_score,
+        best_pair=(ref.sources[i], probe.sources[j]),
+        verdict=verdict,
+        confidence=round(conf, 1),
+        used_fallback=used_fallback,
+        execution_time=time.time() - t0,
+    )
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Enrollment gallery with stored aligned face crops.
+
+Every enrollment keeps the 112x112 ArcFace-aligned crop (lossless PNG,
+about half the size of the raw uint8 array) next to its embedding.
+Embeddings live in their own table keyed by (enrollment, model_version),
+so several recognition models can coexist during an upgrade and the
+active one is chosen at read time.
+
+Changing the recognition model is then a re-embedding of crops only: no
+decoding of original images and no detection. `migrate` fans batches of
+enrollment ids out to worker processes; each worker loads its own
+recognition model, reads its crops straight from the database and returns
+float32 vectors, which the parent writes in one transaction per batch.
+Interrupted migrations resume, since only enrollments lacking the target
+version are selected.
+
+    python3 gallery.py enroll --identity "J. Doe" a.jpg b.jpg
+    python3 gallery.py migrate --model buffalo_l --version buffalo_l-int8 --workers 4
+    python3 gallery.py stats
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from audit_store import sha256_file
+from lz_validators import validate_image_file
+from resources import ThreadBudget
+from verify_v6 import Config, ImageQualityAnalyzer, InsightEngine, logger
+
+DEFAULT_DB = "gallery.db"
+MIGRATE_BATCH = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS enrollments (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    identity    TEXT NOT NULL,
+    source      TEXT,
+    source_hash TEXT,
+    quality     REAL,
+    det_score   REAL,
+    crop        BLOB NOT NULL,
+    created     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_enrollments_identity ON enrollments(identity);
+CREATE TABLE IF NOT EXISTS embeddings (
+    enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+    model_version TEXT NOT NULL,
+    dim           INTEGER NOT NULL,
+    vector        BLOB NOT NULL,
+    created       REAL NOT NULL,
+    PRIMARY KEY (enrollment_id, model_version)
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_version ON embeddings(model_version);
+"""
+
+
+def encode_crop(crop: np.ndarray) -> bytes:
+    ok, buf = cv2.imencode(".png", crop)
+    if not ok:
+        raise ValueError("PNG encode failed")
+    return buf.tobytes()
+
+
+def decode_crop(blob: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class Gallery:
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self.conn = _connect(path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # -------------------------------------------------------------------------
+    # Enrollment
+    # -------------------------------------------------------------------------
+
+    def enroll(self, engine: InsightEngine, identity: str, path: str,
+               model_version: Optional[str] = None) -> Optional[int]:
+        """Detect the primary face, store its aligned crop and embedding; returns the id."""
+        ok, msg = validate_image_file(path)
+        if not ok:
+            logger.warning(f"Gallery: rejected {path}: {msg}")
+            return None
+        found = engine.detect_face(path)
+        if found is None:
+            logger.warning(f"Gallery: no face in {path}")
+            return None
+        img, face = found
+        crop = engine.align(img, face.kps)
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO enrollments (identity, source, source_hash, quality, det_score, crop, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (identity, path, sha256_file(path), ImageQualityAnalyzer.analyze_image(img).score,
+                 float(face.det_score), encode_crop(crop), time.time()),
+            )
+            eid = cur.lastrowid
+            self._put_embeddings([(eid, face.embedding)], model_version or engine.model_name)
+        return eid
+
+    def _put_embeddings(self, rows: Sequence[Tuple[int, np.ndarray]], model_version: str) -> None:
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (enrollment_id, model_version, dim, vector, created) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(eid, model_version, len(v), np.asarray(v, np.float32).tobytes(), now) for eid, v in rows],
+        )
+
+    # -------------------------------------------------------------------------
+    # Read path
+    # -------------------------------------------------------------------------
+
+    def embeddings(self, model_version: str = Config.MODEL_NAME) -> Tuple[List[int], List[str], np.ndarray]:
+        """(enrollment ids, identities, N x D float32) for one model version."""
+        rows = self.conn.execute(
+            "SELECT e.id, e.identity, m.dim, m.vector FROM embeddings m "
+            "JOIN enrollments e ON e.id = m.enrollment_id WHERE m.model_version = ? ORDER BY e.id",
+            (model_version,),
+        ).fetchall()
+        if not rows:
+            return [], [], np.zeros((0, 0), np.float32)
+        E = np.stack([np.frombuffer(r[3], np.float32, count=r[2]) for r in rows])
+        return [r[0] for r in rows], [r[1] for r in rows], E
+
+    def shard(self, model_version: str, index: int, count: int) -> Tuple[List[int], List[str], List[float], np.ndarray]:
+        """embeddings() for the enrollments with id % count == index, plus their quality scores."""
+        rows = self.conn.execute(
+            "SELECT e.id, e.identity, e.quality, m.dim, m.vector FROM embeddings m "
+            "JOIN enrollments e ON e.id = m.enrollment_id "
+            "WHERE m.model_version = ? AND e.id % ? = ? ORDER BY e.id",
+            (model_version, count, index),
+        ).fetchall()
+        if not rows:
+            return [], [], [], np.zeros((0, 0), np.float32)
+        E = np.stack([np.frombuffer(r[4], np.float32, count=r[3]) for r in rows])
+        return [r[0] for r in rows], [r[1] for r in rows], [r[2] or 0.0 for r in rows], E
+
+    def crops(self, ids: Sequence[int]) -> Iterator[Tuple[int, np.ndarray]]:
+        marks = ",".join("?" * len(ids))
+        for eid, blob in self.conn.execute(f"SELECT id, crop FROM enrollments WHERE id IN ({marks})", list(ids)):
+            yield eid, decode_crop(blob)
+
+    def missing(self, model_version: str) -> List[int]:
+        return [r[0] for r in self.conn.execute(
+            "SELECT id FROM enrollments WHERE id NOT IN "
+            "(SELECT enrollment_id FROM embeddings WHERE model_version = ?) ORDER BY id",
+            (model_version,),
+        )]
+
+    def stats(self) -> dict:
+        enrollments = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(crop)), 0) FROM enrollments").fetchone()
+        versions = dict(self.conn.execute(
+            "SELECT model_version, COUNT(*) FROM embeddings GROUP BY model_version").fetchall())
+        return {
+            "enrollments": enrollments[0],
+            "crop_bytes": enrollments[1],
+            "identities": self.conn.execute("SELECT COUNT(DISTINCT identity) FROM enrollments").fetchone()[0],
+            "versions": versions,
+        }
+
+
+# =============================================================================
+# Migration
+# =============================================================================
+
+_worker_engine = None
+_worker_gallery = None
+
+
+def _init_worker(model_name: str, db_path: str, workers: int) -> None:
+    global _worker_engine, _worker_gallery
+    budget = ThreadBudget(workers)
+    budget.apply()
+    # One recognition model per process; detection is loaded only because
+    # FaceAnalysis requires it, and is never run here.
+    _worker_engine = InsightEngine(model_name, allowed_modules=["detection", "recognition"],
+                                   sess_options=budget.session_options())
+    _worker_gallery = Gallery(db_path)
+
+
+def _embed_batch(ids: List[int]) -> Tuple[List[int], bytes, int]:
+    """Embeddings for the crops of `ids` that still exist and decode; the rest are left out."""
+    rows = [(eid, crop) for eid, crop in _worker_gallery.crops(ids) if crop is not None]
+    if len(rows) < len(ids):
+        logger.warning(f"Gallery: {len(ids) - len(rows)} crops missing or undecodable, not migrated")
+    if not rows:
+        return [], b"", 0
+    E = np.asarray(_worker_engine.embed_aligned([crop for _, crop in rows]), dtype=np.float32)
+    return [eid for eid, _ in rows], E.tobytes(), E.shape[1]
+
+
+def migrate(db_path: str, model_name: str, model_version: Optional[str] = None,
+            workers: int = 2, batch_size: int = MIGRATE_BATCH) -> dict:
+    """Re-embed every enrollment lacking `model_version` from its stored crop."""
+    model_version = model_version or model_name
+    batch_size = min(batch_size, 999)   # SQLite's default bound-parameter limit for crops()
+    gallery = Gallery(db_path)
+    todo = gallery.missing(model_version)
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    logger.info(f"Migrating {len(todo)} enrollments to {model_version}",
+                extra={"batches": len(batches), "workers": workers})
+
+    t0 = time.time()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_name, db_path, workers)) as pool:
+        futures = {pool.submit(_embed_batch, b): b for b in batches}
+        for fut in as_completed(futures):
+            try:
+                eids, raw, dim = fut.result()
+            except Exception as e:
+                # The batch stays missing(); a later migrate run retries it.
+                batch = futures[fut]
+                logger.error(f"Gallery: batch of {len(batch)} from id {batch[0]} failed: {e}")
+                continue
+            if not eids:
+                continue
+            E = np.frombuffer(raw, np.float32).reshape(len(eids), dim)
+            with gallery.conn:
+                gallery._put_embeddings(list(zip(eids, E)), model_version)
+            done += len(eids)
+            rate = done / max(time.time() - t0, 1e-9)
+            print(f"\r{done}/{len(todo)} re-embedded ({rate:.0f}/s)", end="", file=sys.stderr, flush=True)
+    if todo:
+        print(file=sys.stderr)
+    gallery.close()
+
+    elapsed = time.time() - t0
+    return {
+        "model_version": model_version,
+        "migrated": done,
+        "failed": len(todo) - done,
+        "elapsed": round(elapsed, 2),
+        "per_second": round(done / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrollment gallery with stored aligned crops")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("enroll", help="enroll images for one identity")
+    p.add_argument("--identity", required=True)
+    p.add_argument("images", nargs="+")
+
+    p = sub.add_parser("migrate", help="re-embed stored crops with another recognition model")
+    p.add_argument("--model", default=Config.MODEL_NAME, help="insightface model pack")
+    p.add_argument("--version", help="embedding version label (default: --model)")
+    p.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    p.add_argument("--batch", type=int, default=MIGRATE_BATCH)
+
+    sub.add_parser("stats", help="enrollment and embedding-version counts")
+    args = parser.parse_args()
+
+    if args.cmd == "enroll":
+        gallery = Gallery(args.db)
+        engine = InsightEngine()
+        ids = [gallery.enroll(engine, args.identity, path) for path in args.images]
+        gallery.close()
+        print(json.dumps({"identity": args.identity, "enrolled": [i for i in ids if i is not None]}))
+        sys.exit(0 if all(i is not None for i in ids) else 1)
+    elif args.cmd == "migrate":
+        print(json.dumps(migrate(args.db, args.model, args.version, args.workers, args.batch), indent=2))
+    else:
+        gallery = Gallery(args.db)
+        print(json.dumps(gallery.stats(), indent=2))
+        gallery.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Bounded verification history for the dashboard.
+
+Only the most recent records stay in memory (a ring buffer); every record
+is appended to a per-session JSONL file under .recovery/history/, and the
+sidebar aggregates are updated on add(). Rerun cost is therefore constant
+no matter how many checks a session has done; older pages and the CSV
+export are read back from disk on demand.
+"""
+import os
+import csv
+import io
+import json
+from array import array
+from collections import Counter, deque
+from pathlib import Path
+from typing import Iterator, List
+
+from recovery import RECOVERY_DIR
+
+HISTORY_DIR = RECOVERY_DIR / "history"
+
+FIELDS = ["timestamp", "verdict", "confidence", "similarity", "quality", "execution_time"]
+
+
+def verdict_class(verdict: str) -> str:
+    if verdict.startswith("SAME"):
+        return "same"
+    if verdict == "DIFFERENT":
+        return "different"
+    if verdict == "UNCERTAIN":
+        return "uncertain"
+    return "error"
+
+
+class VerificationHistory:
+    CAPACITY = 200
+
+    def __init__(self, session_id: str, capacity: int = CAPACITY, directory: Path = HISTORY_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.session_id = session_id
+        self.path = directory / f"{session_id}.jsonl"
+        self.recent = deque(maxlen=capacity)
+        self.counts = Counter()
+        self._offsets = array("q")   # byte offset of every record, 8 bytes each
+        self._size = 0               # bytes this instance knows to be in the file
+        if self.path.exists():
+            self._reload()
+
+    def _reload(self) -> None:
+        """
+        One sequential pass to rebuild offsets, aggregates and the ring.
+        A torn last record (crash mid-write) is truncated away so the next
+        add() starts on a fresh line.
+        """
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    rec = None
+                if rec is None:
+                    break
+                self._offsets.append(offset)
+                offset += len(line)
+                self.counts[verdict_class(rec["verdict"])] += 1
+                self.recent.append(rec)
+        if offset < self.path.stat().st_size:
+            os.truncate(self.path, offset)
+        self._size = offset
+
+    def _check_file(self) -> None:
+        """
+        Rebuild if the file was deleted or shortened behind our back (e.g. by
+        recovery.cleanup_old_sessions), so offsets never point past its end.
+        Records only in the ring are written back when the file is gone.
+        """
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size >= self._size:
+            return
+        recent = list(self.recent)
+        self._offsets = array("q")
+        self.counts.clear()
+        self.recent.clear()
+        self._size = 0
+        if size:
+            self._reload()
+        else:
+            for rec in recent:
+                self.add(rec)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def total(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def same(self) -> int:
+        return self.counts["same"]
+
+    @property
+    def different(self) -> int:
+        return self.counts["different"]
+
+    def add(self, record: dict) -> None:
+        self._check_file()
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            self._offsets.append(f.tell())
+            f.write(line)
+            self._size = f.tell()
+        self.recent.append(record)
+        self.counts[verdict_class(record["verdict"])] += 1
+
+    def pages(self, size: int) -> int:
+        return max(1, -(-self.total // size))
+
+    def page(self, page: int, size: int = 25) -> List[dict]:
+        """Records for `page` (0 = newest), newest first."""
+        self._check_file()
+        end = self.total - page * size
+        start = max(0, end - size)
+        if end <= 0:
+            return []
+        in_memory = self.total - len(self.recent)
+        if start >= in_memory:
+            rows = list(self.recent)[start - in_memory:end - in_memory]
+        else:
+            rows = []
+            with open(self.path, "rb") as f:
+                f.seek(self._offsets[start])
+                for _ in range(end - start):
+                    rows.append(json.loads(f.readline()))
+        return rows[::-1]
+
+    def __iter__(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue   # a record still being written by add()
+
+    def to_csv(self) -> str:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for rec in self:
+            writer.writerow(rec)
+        return buf.getvalue()
@@ -0,0 +1,140 @@
+"""
+Background job execution for the dashboard.
+
+Verifications run on a small thread pool owned by the Streamlit server
+process (one JobManager via st.cache_resource), not inside the script run.
+The page submits a job, gets an id back, and polls; widget interaction
+reruns the script without touching the work in flight. Jobs are kept per
+session so an analyst can queue several comparisons and keep working.
+
+Temp files a job needs are handed over at submit time and removed by the
+worker when the job finishes, whatever the outcome. Jobs must not depend
+on the page coming back (audit rows are written inside the job), so a
+finished job is dropped after MAX_DONE_AGE whether or not a page ever
+recorded it; abandoned sessions do not pin results in memory.
+"""
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+from logger import LogManager
+
+logger = LogManager.get_logger(__name__)
+
+
+@dataclass
+class Job:
+    id: str
+    session_id: str
+    label: str
+    submitted: float
+    meta: dict = field(default_factory=dict)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    future: Optional[Future] = None
+    recorded: bool = False        # claimed via JobManager.mark_recorded() by the page that records it
+
+    @property
+    def status(self) -> str:
+        if self.future.done():
+            return "failed" if self.future.exception() is not None else "done"
+        return "running" if self.started is not None else "queued"
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    @property
+    def result(self):
+        return self.future.result() if self.status == "done" else None
+
+    @property
+    def error(self) -> Optional[str]:
+        exc = self.future.exception() if self.done else None
+        return f"{type(exc).__name__}: {exc}" if exc is not None else None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobManager:
+    MAX_JOBS_PER_SESSION = 50
+    MAX_DONE_AGE = 3600.0   # seconds a finished job is kept for its page to collect
+
+    def __init__(self, workers: int = 1):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, label: str, fn: Callable, *args,
+               cleanup: Sequence[str] = (), meta: Optional[dict] = None, **kwargs) -> Job:
+        job = Job(uuid.uuid4().hex[:8], session_id, label, time.time(), meta or {})
+
+        def run():
+            job.started = time.time()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                logger.error(f"Job {job.id} failed", extra={"job_id": job.id}, exc_info=True)
+                raise
+            finally:
+                for path in cleanup:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                job.finished = time.time()
+
+        with self._lock:
+            self._expire()
+            self._prune(session_id)
+            job.future = self._pool.submit(run)
+            self._jobs[job.id] = job
+        return job
+
+    def jobs(self, session_id: str) -> List[Job]:
+        """This session's jobs, oldest first."""
+        with self._lock:
+            self._expire()
+            return [j for j in self._jobs.values() if j.session_id == session_id]
+
+    def pending(self, session_id: str) -> int:
+        return sum(not j.done for j in self.jobs(session_id))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def mark_recorded(self, job: Job) -> bool:
+        """
+        Claim a finished job for recording. True exactly once per job, so
+        two reruns of the same session never both write it to history/audit.
+        """
+        with self._lock:
+            if not job.done or job.recorded:
+                return False
+            job.recorded = True
+            return True
+
+    def _expire(self) -> None:
+        """Drop jobs finished more than MAX_DONE_AGE ago, in every session."""
+        cutoff = time.time() - self.MAX_DONE_AGE
+        for j in [j for j in self._jobs.values() if j.done and (j.finished or 0) < cutoff]:
+            del self._jobs[j.id]
+
+    def _prune(self, session_id: str) -> None:
+        """Drop the oldest finished, already recorded jobs beyond the per-session cap."""
+        mine = [j for j in self._jobs.values() if j.session_id == session_id]
+        excess = len(mine) - self.MAX_JOBS_PER_SESSION + 1
+        for j in mine:
+            if excess <= 0:
+                break
+            if j.done and j.recorded:
+                del self._jobs[j.id]
+                excess -= 1
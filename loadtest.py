@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the verification engine.
+
+Requests arrive open-loop at a target rate (a fixed or Poisson schedule),
+whether or not earlier ones have finished, and `--clients` workers serve
+them. Latency is measured from each request's scheduled arrival, so time
+spent queued behind slow requests counts; service time (the verify call
+alone) is reported separately. Reporting only service time would hide
+exactly the tail that overloaded users see.
+
+Targets:
+  inproc   one shared UltimateVerifier called from client threads, as the
+           dashboard's job pool and the watcher use it
+  cli      one `verify_v6.py --json` subprocess per request (includes
+           interpreter and model start-up; this is the scripted entry point)
+
+Pairs are drawn (seeded) from a fixture directory of JPG/PNG images, or
+taken from an evaluate.py pairs file with --pairs.
+
+    python3 loadtest.py --fixtures fixtures/ --clients 8 --rate 4 --duration 60
+    python3 loadtest.py --pairs pairs.txt --target cli --clients 2 --rate 0.2 --json load.json
+
+The report gives throughput, p50/p95/p99 latency, the error rate, and a
+per-interval time series with RSS. In cli mode RSS is the peak of the
+child processes, since the work happens there.
+"""
+import sys
+import json
+import math
+import time
+import queue
+import random
+import resource
+import argparse
+import threading
+import subprocess
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from evaluate import load_pairs
+from lz_validators import ALLOWED_EXTS
+from resources import ThreadBudget, rss_bytes
+from verify_v6 import InsightEngine, UltimateVerifier, logger
+
+TARGETS = ("inproc", "cli")
+PERCENTILES = (50, 95, 99)
+CLI = [sys.executable, str(Path(__file__).with_name("verify_v6.py"))]
+
+
+@dataclass
+class Sample:
+    scheduled: float     # seconds since start
+    started: float
+    finished: float
+    verdict: str
+    error: Optional[str] = None
+
+    @property
+    def latency(self) -> float:
+        return self.finished - self.scheduled
+
+    @property
+    def service(self) -> float:
+        return self.finished - self.started
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.error) or self.verdict in ("ERROR", "TIMEOUT")
+
+
+# =============================================================================
+# Inputs
+# =============================================================================
+
+def fixture_pairs(directory: str, n: int, seed: int = 0) -> List[Tuple[str, str]]:
+    images = sorted(str(p) for p in Path(directory).iterdir() if p.suffix.lower() in ALLOWED_EXTS)
+    if len(images) < 2:
+        raise ValueError(f"{directory}: need at least two JPG/PNG fixtures")
+    rng = random.Random(seed)
+    return [tuple(rng.sample(images, 2)) for _ in range(n)]
+
+
+def schedule(rate: float, duration: float, poisson: bool, seed: int = 0) -> List[float]:
+    """Arrival offsets in seconds for `rate` requests/s over `duration`."""
+    rng = random.Random(seed)
+    t, out = 0.0, []
+    while True:
+        t += rng.expovariate(rate) if poisson else 1.0 / rate
+        if t >= duration:
+            return out
+        out.append(t)
+
+
+# =============================================================================
+# Targets
+# =============================================================================
+
+class InProcessTarget:
+
+    def __init__(self, clients: int, budget: bool):
+        engine = None
+        if budget:
+            # Client threads share one engine, so the budget is per session, not per thread.
+            b = ThreadBudget(clients, sessions=1)
+            b.apply()
+            engine = InsightEngine(sess_options=b.session_options())
+        self.verifier = UltimateVerifier(engine)
+
+    def __call__(self, img1: str, img2: str) -> Tuple[str, Optional[str]]:
+        r = self.verifier.verify(img1, img2)
+        return r.verdict, r.error
+
+    def rss(self) -> Optional[int]:
+        return rss_bytes()
+
+
+class CliTarget:
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    def __call__(self, img1: str, img2: str) -> Tuple[str, Optional[str]]:
+        proc = subprocess.run(CLI + [img1, img2, "--json", "--quiet"],
+                              capture_output=True, text=True, timeout=self.timeout)
+        try:
+            out = json.loads(proc.stdout)
+        except ValueError:
+            return "ERROR", f"exit {proc.returncode}: {proc.stderr.strip()[-200:]}"
+        return out.get("verdict", "ERROR"), out.get("error")
+
+    def rss(self) -> Optional[int]:
+        # Peak RSS of finished children (ru_maxrss is KiB on Linux).
+        return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024 or None
+
+
+# =============================================================================
+# Run
+# =============================================================================
+
+def run_load(target, pairs: List[Tuple[str, str]], arrivals: List[float], clients: int,
+             interval: float = 1.0) -> Tuple[List[Sample], List[dict], float]:
+    """Drive `target` open-loop; returns (samples, RSS series, wall seconds)."""
+    pending: "queue.Queue[Optional[Tuple[float, Tuple[str, str]]]]" = queue.Queue()
+    samples: List[Sample] = []
+    rss_series: List[dict] = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    t0 = time.perf_counter()
+
+    def client():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            scheduled, (a, b) = item
+            started = time.perf_counter() - t0
+            try:
+                verdict, error = target(a, b)
+            except Exception as e:
+                verdict, error = "ERROR", f"{type(e).__name__}: {e}"
+            s = Sample(scheduled, started, time.perf_counter() - t0, verdict, error)
+            with lock:
+                samples.append(s)
+
+    def point():
+        t = math.ceil((time.perf_counter() - t0) * 100) / 100   # rounded up: windows end after their samples
+        return {"t": t, "rss_mb": _mb(target.rss()), "queued": pending.qsize()}
+
+    def monitor():
+        while not stop.wait(interval):
+            rss_series.append(point())
+
+    workers = [threading.Thread(target=client, name=f"load-client-{i}", daemon=True) for i in range(clients)]
+    for w in workers:
+        w.start()
+    sampler = threading.Thread(target=monitor, name="load-rss", daemon=True)
+    sampler.start()
+
+    for i, at in enumerate(arrivals):
+        delay = at - (time.perf_counter() - t0)
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((at, pairs[i % len(pairs)]))
+    for _ in workers:
+        pending.put(None)
+    for w in workers:
+        w.join()
+    stop.set()
+    sampler.join()
+    rss_series.append(point())        # closes the last partial interval
+    return samples, rss_series, time.perf_counter() - t0
+
+
+def _mb(n: Optional[int]) -> Optional[float]:
+    return round(n / 2**20, 1) if n is not None else None
+
+
+def _pcts(values: List[float]) -> dict:
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    v = np.percentile(values, PERCENTILES)
+    return {f"p{p}": round(float(x) * 1000, 1) for p, x in zip(PERCENTILES, v)}
+
+
+def summarize(samples: List[Sample], rss_series: List[dict], wall: float, offered_rate: float) -> dict:
+    errors = [s for s in samples if s.failed]
+    series, prev = [], 0.0
+    for point in rss_series:
+        window = [s for s in samples if prev <= s.finished < point["t"]]
+        prev = point["t"]
+        series.append({**point, "completed": len(window),
+                       "errors": sum(s.failed for s in window),
+                       "p95_ms": _pcts([s.latency for s in window])["p95"]})
+    return {
+        "requests": len(samples),
+        "offered_rate": offered_rate,
+        "throughput": round(len(samples) / wall, 3) if wall else 0.0,
+        "wall_s": round(wall, 2),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "latency_ms": _pcts([s.latency for s in samples]),
+        "service_ms": _pcts([s.service for s in samples]),
+        "rss_peak_mb": max((p["rss_mb"] for p in rss_series if p["rss_mb"] is not None), default=None),
+        "error_samples": sorted({s.error or s.verdict for s in errors})[:10],
+        "series": series,
+    }
+
+
+def print_report(report: dict, target: str, clients: int) -> None:
+    lat, svc = report["latency_ms"], report["service_ms"]
+    print(f"\nLOAD TEST  target={target}  clients={clients}  offered={report['offered_rate']:g}/s")
+    print(f"{'requests':<12}{report['requests']:>10}      {'throughput':<12}{report['throughput']:>9.2f}/s")
+    print(f"{'errors':<12}{report['errors']:>10}      {'error rate':<12}{report['error_rate']:>10.2%}")
+    print(f"{'':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, p in (("latency", lat), ("service", svc)):
+        print(f"{name:<12}" + "".join(f"{p[k] if p[k] is not None else '-':>10}" for k in ("p50", "p95", "p99")))
+    print(f"\n{'T s':>7}{'DONE':>7}{'ERR':>6}{'P95 ms':>10}{'QUEUED':>8}{'RSS MB':>9}")
+    for pt in report["series"]:
+        print(f"{pt['t']:>7.1f}{pt['completed']:>7}{pt['errors']:>6}{pt['p95_ms'] or '-':>10}"
+              f"{pt['queued']:>8}{pt['rss_mb'] or '-':>9}")
+    if report["error_samples"]:
+        print("\nErrors seen: " + "; ".join(report["error_samples"]))
+    print()
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test with latency percentiles and RSS")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--fixtures", help="directory of JPG/PNG images; pairs are drawn at random")
+    src.add_argument("--pairs", help="pairs file (evaluate.py format)")
+    parser.add_argument("--target", choices=TARGETS, default="inproc")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent workers")
+    parser.add_argument("--rate", type=float, default=2.0, help="target arrivals per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals")
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of a fixed interval")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds per time-series point")
+    parser.add_argument("--budget", action="store_true", help="inproc: apply a ThreadBudget for --clients")
+    parser.add_argument("--cli-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_out", help="write the full report here")
+    args = parser.parse_args()
+    if args.rate <= 0 or args.clients < 1 or args.duration <= 0:
+        parser.error("--rate, --clients and --duration must be positive")
+
+    arrivals = schedule(args.rate, args.duration, args.poisson, args.seed)
+    if args.fixtures:
+        pairs = fixture_pairs(args.fixtures, len(arrivals), args.seed)
+    else:
+        pairs = [(a, b) for a, b, _ in load_pairs(args.pairs)]
+    if not pairs or not arrivals:
+        print("Nothing to run")
+        sys.exit(1)
+
+    if args.target == "inproc":
+        target = InProcessTarget(args.clients, args.budget)
+        target(*pairs[0])                       # load models outside the measured window
+    else:
+        target = CliTarget(args.cli_timeout)
+    logger.info("Load test starting", extra={"target": args.target, "clients": args.clients,
+                                             "rate": args.rate, "requests": len(arrivals)})
+
+    samples, rss_series, wall = run_load(target, pairs, arrivals, args.clients, args.interval)
+    report = summarize(samples, rss_series, wall, args.rate)
+    report.update({"target": args.target, "clients": args.clients, "poisson": args.poisson})
+    print_report(report, args.target, args.clients)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({**report, "samples": [asdict(s) for s in samples]}, f, indent=2)
+        print(f"Report written to {args.json_out}")
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
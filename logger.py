@@ -1,12 +1,22 @@
+import os
 import json
+import gzip
+import queue
+import atexit
+import shutil
 import logging
-from logging.handlers import TimedRotatingFileHandler   # CHANGED
-from datetime import datetime
+import threading
+from logging.handlers import QueueHandler, TimedRotatingFileHandler   # CHANGED
+from datetime import datetime, timezone
+
+# Attributes every LogRecord carries; anything else was passed via `extra=`.
+_RESERVED = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         payload = {
-            "ts": datetime.utcnow().isoformat() + "Z",
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
             "level": record.levelname,
             "logger": record.name,
             "msg": record.getMessage(),
@@ -14,20 +24,182 @@ class JsonFormatter(logging.Formatter):
 
         # include extras if present
         for k, v in record.__dict__.items():
-            if k.startswith("_") or k in (
-                "name","msg","args","levelname","levelno","pathname","filename","module",
-                "exc_info","exc_text","stack_info","lineno","funcName","created","msecs",
-                "relativeCreated","thread","threadName","processName","process"
-            ):
-                continue
-            payload[k] = v
+            if k not in _RESERVED and not k.startswith("_"):
+                payload[k] = v
 
         if record.exc_info:
-            payload["exc_info"] = self.formatException(record.exc_info)
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            payload["exc_info"] = record.exc_text
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class BatchedRotatingFileHandler(TimedRotatingFileHandler):
+    """Daily-rotating file handler that writes a whole batch with one flush."""
+
+    def emit_batch(self, records) -> None:
+        lines = []
+        for record in records:
+            try:
+                if self.shouldRollover(record):
+                    self._write(lines)
+                    lines = []
+                    self.doRollover()
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        self._write(lines)
+
+    def _write(self, lines) -> None:
+        if not lines:
+            return
+        if self.stream is None:
+            self.stream = self._open()
+        self.stream.write("\n".join(lines) + "\n")
+        self.stream.flush()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Enqueue-only handler: never blocks the caller, counts what it had to drop."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Freeze the message; JSON formatting happens on the writer thread.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _BatchWriter(threading.Thread):
+    """Background thread draining the log queue in batches."""
+
+    _STOP = object()
+
+    def __init__(self, q, file_handler, console, source, batch_size, flush_interval):
+        super().__init__(name="log-writer", daemon=True)
+        self.q = q
+        self.file_handler = file_handler
+        self.console = console
+        self.source = source
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._reported_drops = 0
+
+    def run(self) -> None:
+        stop = False
+        while not stop:
+            try:
+                batch = [self.q.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            if any(r is self._STOP for r in batch):
+                stop = True
+                batch = [r for r in batch if r is not self._STOP]
+
+            drops = self.source.dropped
+            if drops > self._reported_drops:
+                batch.append(logging.makeLogRecord({
+                    "name": "logger", "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"Log queue overflow: {drops - self._reported_drops} record(s) dropped",
+                    "dropped_total": drops,
+                }))
+                self._reported_drops = drops
+            if not batch:
+                continue
+
+            self.file_handler.emit_batch(batch)
+            for record in batch:
+                if record.levelno >= self.console.level:
+                    self.console.handle(record)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        try:
+            self.q.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.join(timeout)
+        self.file_handler.close()
 
-        return json.dumps(payload, ensure_ascii=False)
 
 class LogManager:
+    QUEUE_SIZE = 10_000
+    BATCH_SIZE = 256
+    FLUSH_INTERVAL = 0.5   # seconds
+
+    _handler = None
+    _writer = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _queue_handler(cls) -> BoundedQueueHandler:
+        with cls._lock:
+            if cls._handler is not None:
+                return cls._handler
+
+            # Daily rotation, keep 90 days (plan B), rotated files gzip'd
+            file_handler = BatchedRotatingFileHandler(
+                "face_verification.log",
+                when="D",
+                interval=1,
+                backupCount=90,
+                encoding="utf-8",
+                utc=True,
+            )
+            file_handler.suffix = "%Y-%m-%d"   # produces face_verification.log.2026-01-02.gz, etc.
+            file_handler.namer = _gzip_namer
+            file_handler.rotator = _gzip_rotator
+            file_handler.setFormatter(JsonFormatter())
+
+            console = logging.StreamHandler()
+            console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+            q = queue.Queue(maxsize=cls.QUEUE_SIZE)
+            cls._handler = BoundedQueueHandler(q)
+            cls._writer = _BatchWriter(q, file_handler, console, cls._handler,
+                                       cls.BATCH_SIZE, cls.FLUSH_INTERVAL)
+            cls._writer.start()
+            atexit.register(cls.shutdown)
+            return cls._handler
+
+    @classmethod
+    def dropped(cls) -> int:
+        """Records discarded because the queue was full."""
+        return cls._handler.dropped if cls._handler else 0
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Flush everything still queued; registered with atexit."""
+        if cls._writer is not None and cls._writer.is_alive():
+            cls._writer.stop()
+
     @staticmethod
     def get_logger(name: str = "lazzybiointel") -> logging.Logger:
         logger = logging.getLogger(name)
@@ -35,24 +207,6 @@ class LogManager:
             return logger
 
         logger.setLevel(logging.INFO)
-
-        # Daily rotation, keep 90 days (plan B)
-        file_handler = TimedRotatingFileHandler(
-            "face_verification.log",
-            when="D",
-            interval=1,
-            backupCount=90,
-            encoding="utf-8",
-            utc=True,
-        )
-        file_handler.suffix = "%Y-%m-%d"   # produces face_verification.log.2026-01-02, etc.
-        file_handler.setFormatter(JsonFormatter())
-
-        console = logging.StreamHandler()
-        console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-
-        logger.addHandler(file_handler)
-        logger.addHandler(console)
+        logger.addHandler(LogManager._queue_handler())
         logger.propagate = False
         return logger
-
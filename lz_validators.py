@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 import cv2
+import numpy as np
 
 ALLOWED_EXTS = {".jpg", ".jpeg", ".png"}
 MAX_BYTES = 50_000_000  # 50MB
@@ -43,3 +44,59 @@ def validate_image_file(path: str) -> tuple[bool, str]:
         return False, "Image too small (<50px)"
 
     return True, "OK"
+
+
+def validate_image_bytes(data: bytes, name: str) -> tuple[bool, str, object]:
+    """
+    In-memory counterpart of validate_image_file for uploads and archive
+    members. Returns (ok, message, decoded BGR image or None), so callers
+    decode only once.
+    """
+    ext = Path(name).suffix.lower()
+    if ext not in ALLOWED_EXTS:
+        return False, f"Unsupported format: {ext}", None
+
+    size = len(data)
+    if size < MIN_BYTES:
+        return False, "File too small", None
+    if size > MAX_BYTES:
+        return False, "File too large (>50MB)", None
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return False, "Unreadable / corrupted image", None
+
+    h, w = img.shape[:2]
+    if h < MIN_H or w < MIN_W:
+        return False, "Image too small (<50px)", None
+
+    return True, "OK", img
+
+
+ALLOWED_VIDEO_EXTS = {".mp4", ".avi", ".mkv", ".mov"}
+
+
+def validate_video_file(path: str) -> tuple[bool, str]:
+    p = Path(path)
+
+    if not p.exists():
+        return False, "Missing"
+    if not p.is_file():
+        return False, "Not a file"
+
+    ext = p.suffix.lower()
+    if ext not in ALLOWED_VIDEO_EXTS:
+        return False, f"Unsupported video format: {ext}"
+
+    s = str(p).replace("\\", "/")
+    if "/../" in s or s.startswith("../") or s.endswith("/.."):
+        return False, "Unsafe path (traversal)"
+
+    cap = cv2.VideoCapture(str(p))
+    try:
+        if not cap.isOpened():
+            return False, "Unreadable / corrupted video"
+    finally:
+        cap.release()
+
+    return True, "OK"
@@ -1,37 +1,73 @@
 import cv2
 import numpy as np
 from insightface.app import FaceAnalysis
+from insightface.utils import face_align
+
+from logger import LogManager
+
+logger = LogManager.get_logger(__name__)
+
+# Rows of the 112x112 ArcFace-aligned crop kept as "upper face": eyes,
+# brows and forehead down to just above the nose tip (template y=71.7).
+# Everything below is blanked so beard / mask area does not contribute.
+UPPER_FACE_ROWS = 67
+
+
+def upper_face_crop(aligned: np.ndarray) -> np.ndarray:
+    """Blank the lower part of a 112x112 aligned face crop."""
+    out = aligned.copy()
+    out[UPPER_FACE_ROWS:, :] = 0
+    return out
+
 
 class OcclusionEngine:
     """
     Extra engine focusing on upper face for disguise / mask cases.
     Does not change UltimateVerifier.
+
+    Pass the verifier's InsightEngine as `engine` to reuse its detector and
+    recognition model; the upper-face embedding is then one recognition
+    forward on a landmark-aligned crop, with no second detection pass.
     """
 
-    def __init__(self, providers=None):
-        print("OcclusionEngine initialized") 
+    def __init__(self, providers=None, engine=None):
+        logger.debug("OcclusionEngine initialized")
         if providers is None:
             providers = ["CPUExecutionProvider"]
 
-        # Start with same model; you can later swap to a more occlusion‑robust one.
-        self.app = FaceAnalysis(name="buffalo_l", providers=providers)
-        self.app.prepare(ctx_id=0, det_size=(640, 640))
+        if engine is not None:
+            self.app = engine.app
+        else:
+            # Start with same model; you can later swap to a more occlusion‑robust one.
+            self.app = FaceAnalysis(name="buffalo_l", providers=providers,
+                                    allowed_modules=["detection", "recognition"])
+            self.app.prepare(ctx_id=0, det_size=(640, 640))
+
+    def embed_aligned_upper(self, faces) -> np.ndarray:
+        """
+        Upper-face embeddings from landmarks already found by a detection pass.
+        `faces` is a sequence of (image, 5x2 keypoints); returns an N x D
+        unit-norm matrix from one batched recognition call.
+        """
+        crops = [upper_face_crop(face_align.norm_crop(img, landmark=k, image_size=112))
+                 for img, k in faces]
+        E = np.asarray(self.app.models["recognition"].get_feat(crops), dtype=np.float32)
+        E /= np.maximum(np.linalg.norm(E, axis=1, keepdims=True), 1e-12)
+        return E
+
+    def _detect(self, img: np.ndarray):
+        dets, kpss = self.app.det_model.detect(img, max_num=0, metric="default")
+        return dets, kpss
 
     def embed_upper_face(self, path: str):
         img = cv2.imread(path)
         if img is None:
             return None
 
-        h, w = img.shape[:2]
-
-        # Focus on upper 60% (eyes + forehead, less beard/mask area)
-        y0, y1 = 0, int(0.6 * h)
-        upper = img[y0:y1, :]
-
-        faces = self.app.get(upper)
-        if not faces:
+        dets, kpss = self._detect(img)
+        if not len(dets):
             return None
-        return faces[0].embedding
+        return self.embed_aligned_upper([(img, kpss[0])])[0]
 
 
 def cosine_sim(a, b) -> float:
@@ -42,4 +78,3 @@ def cosine_sim(a, b) -> float:
     if na == 0 or nb == 0:
         return 0.0
     return float(np.dot(a, b) / (na * nb))
-
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+LazzyBioIntel v6.2 PRO — Batch verification page.
+
+One reference against a ZIP of probes. The archive is read in memory,
+reference features are computed once, and probes run in a background job
+with bounded parallelism (batch.run_zip_batch). The page polls the job and
+fills the results table and CSV as rows arrive.
+"""
+import io
+import time
+import zipfile
+from functools import partial
+
+import pandas as pd
+import streamlit as st
+
+from batch import ZIP_FIELDS, ZipBatchRun, run_zip_batch, zip_members
+from audit_store import sha256_bytes
+from lz_validators import validate_image_bytes
+from ui_resources import MAX_PROBE_WORKERS, get_audit_store, get_batch_manager, get_verifier, init_session
+
+POLL_INTERVAL = 1.0
+
+st.set_page_config(
+    page_title="LazzyBioIntel v6.2 | Batch Verification",
+    page_icon="📦",
+    layout="wide",
+)
+
+init_session()
+
+st.title("📦 Batch Verification")
+st.caption("One reference image against every image in a ZIP archive of probes.")
+
+col1, col2 = st.columns([1, 2])
+with col1:
+    imgref = st.file_uploader("Reference image", type=["jpg", "jpeg", "png"], key="batch_ref")
+    if imgref:
+        st.image(imgref, use_container_width=True)
+with col2:
+    probes_zip = st.file_uploader("Probe archive (ZIP)", type=["zip"], key="batch_zip")
+    workers = st.slider("Parallel probes", 1, MAX_PROBE_WORKERS, min(2, MAX_PROBE_WORKERS))
+    start = st.button("🚀 RUN BATCH", use_container_width=True)
+
+manager = get_batch_manager()
+
+if start:
+    if not imgref or not probes_zip:
+        st.error("⚠️ Please upload a reference image and a ZIP of probes")
+    else:
+        ref_bytes = imgref.getvalue()
+        ok, msg, ref_img = validate_image_bytes(ref_bytes, imgref.name)
+        archive = probes_zip.getvalue()
+        try:
+            with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+                total = len(zip_members(zf))
+        except zipfile.BadZipFile:
+            ok, msg, total = False, "not a valid ZIP archive", 0
+
+        if not ok:
+            st.error(f"⚠️ Cannot start batch: {msg}")
+        elif total == 0:
+            st.error("⚠️ The archive contains no JPG/PNG images")
+        else:
+            verifier = get_verifier()
+            with st.spinner("Analyzing reference image..."):
+                ref = verifier.extract_image(ref_img, imgref.name)
+            if ref.error:
+                st.error(f"⚠️ Reference image: {ref.error}")
+            else:
+                run = ZipBatchRun(total)
+                batch = partial(
+                    run_zip_batch, verifier, ref, archive, run, workers,
+                    audit=get_audit_store(),
+                    ref_hash=sha256_bytes(ref_bytes),
+                    session_id=st.session_state.session_id,
+                    operator=st.session_state.operator or None,
+                )
+                job = manager.submit(
+                    st.session_state.session_id,
+                    f"{imgref.name} vs {probes_zip.name}",
+                    batch,
+                    meta={"run": run, "reference": imgref.name, "archive": probes_zip.name},
+                )
+                st.session_state.batch_job = job.id
+
+job = manager.get(st.session_state.get("batch_job", ""))
+if job is not None:
+    run: ZipBatchRun = job.meta["run"]
+    rows = run.snapshot()
+
+    st.markdown("---")
+    status = job.status.upper()
+    if job.status == "running" and run.cancelled.is_set():
+        status = "CANCELLING"
+    st.markdown(f"**{job.meta['reference']}** vs **{job.meta['archive']}** — {status} · "
+                f"{run.done}/{run.total} probes · {job.elapsed:.1f}s")
+    st.progress(run.done / max(run.total, 1))
+    if job.error:
+        st.error(f"Batch failed: {job.error}")
+    if not job.done and st.button("⏹ Cancel batch"):
+        run.cancelled.set()
+    # Rows were audited by the job itself; once its final state is shown
+    # the job may be pruned from the manager.
+    manager.mark_recorded(job)
+
+    if rows:
+        df = pd.DataFrame(rows).reindex(columns=ZIP_FIELDS)
+        same = int(df["verdict"].fillna("").str.startswith("SAME").sum())
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Processed", f"{len(df)}/{run.total}")
+        c2.metric("Same", same)
+        c3.metric("Errors", int((df["verdict"] == "ERROR").sum()))
+
+        # Best matches first; column headers stay clickable for other orders.
+        st.dataframe(
+            df.sort_values("similarity", ascending=False, na_position="last"),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "confidence": st.column_config.NumberColumn("Confidence %", format="%.1f%%"),
+                "similarity": st.column_config.NumberColumn("Similarity", format="%.3f"),
+                "quality": st.column_config.NumberColumn("Quality", format="%.1f"),
+                "geometry": st.column_config.NumberColumn("Geometry %", format="%.1f"),
+                "time": st.column_config.NumberColumn("Time (s)", format="%.2f"),
+            },
+        )
+        st.download_button(
+            "📥 Download results (CSV)" + ("" if job.done else " — partial"),
+            data=df.to_csv(index=False),
+            file_name=f"batch_{st.session_state.session_id}_{job.id}.csv",
+            mime="text/csv",
+        )
+
+    if not job.done:
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
@@ -0,0 +1,209 @@
+"""
+Profiling hooks for verify_v6 runs and batches.
+
+    with Profiler(mode="sample") as prof:
+        result = verifier.verify(a, b)
+    prof.write("result.json")      # -> result.profile.json, result.collapsed
+
+While active, the Profiler observes every StageTimer stage in the process
+and records per stage:
+
+  wall_s      wall-clock seconds
+  cpu_s       process CPU seconds (includes ONNX Runtime / OpenCV worker
+              threads, so it can exceed wall time)
+  alloc_peak  tracemalloc peak bytes above the stage's starting level.
+              Python and NumPy allocations only; ORT's native arenas are
+              invisible to tracemalloc. The peak is process-wide, so it is
+              only recorded for an outermost stage during which no other
+              thread was inside a stage; nested stages (counted in their
+              outer stage) and overlapping ones report null. For memory
+              numbers, profile sequentially: PARALLEL_STAGES off, one worker.
+
+Modes:
+  sample    a daemon thread snapshots sys._current_frames() every
+            `interval` seconds; stacks are written in collapsed format
+            ("stage;module:function;... count") for flamegraph.pl,
+            speedscope or inferno.
+  cprofile  deterministic cProfile; also writes <out>.pstats.
+
+tracemalloc adds overhead to every allocation; pass memory=False to skip
+it when only timing matters.
+"""
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+from logger import LogManager
+
+logger = LogManager.get_logger(__name__)
+
+MODES = ("sample", "cprofile")
+
+
+class Profiler:
+
+    def __init__(self, mode: str = "sample", interval: float = 0.005, memory: bool = True, timer=None):
+        """
+        `timer` is the StageTimer class to observe. Pass it explicitly when
+        verify_v6 runs as __main__, where `import verify_v6` would load a
+        second copy of the module with its own StageTimer.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        if timer is None:
+            from verify_v6 import StageTimer as timer
+        self.timer = timer
+        self.mode = mode
+        self.interval = interval
+        self.memory = memory
+        self.stages: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "alloc_peak": None})
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.wall = 0.0
+        self._current: Dict[int, str] = {}   # thread id -> active stage
+        self._active = 0                      # stages open in any thread
+        self._measuring: Optional[list] = None   # [thread id, tainted] of the stage owning the peak
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._t0 = 0.0
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # StageTimer observer interface
+    # -------------------------------------------------------------------------
+
+    def enter(self, name: str):
+        tid = threading.get_ident()
+        outer = self._current.get(tid)          # stages may nest (tiled_detect inside embed)
+        self._current[tid] = name
+        base, measure = 0, None
+        with self._lock:
+            self._active += 1
+            if self._measuring is not None and self._measuring[0] != tid:
+                self._measuring[1] = True       # another thread's allocations now share the peak
+            if self.memory and self._active == 1:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                measure = self._measuring = [tid, False]
+        return time.perf_counter(), time.process_time(), base, outer, measure
+
+    def exit(self, name: str, token) -> None:
+        wall0, cpu0, base, outer, measure = token
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        tid = threading.get_ident()
+        if outer is None:
+            self._current.pop(tid, None)
+        else:
+            self._current[tid] = outer
+        with self._lock:
+            self._active -= 1
+            peak = None
+            if measure is not None:
+                if not measure[1]:
+                    peak = tracemalloc.get_traced_memory()[1] - base
+                self._measuring = None
+            s = self.stages[name]
+            s["calls"] += 1
+            s["wall_s"] += wall
+            s["cpu_s"] += cpu
+            if peak is not None:
+                s["alloc_peak"] = max(s["alloc_peak"] or 0, peak)
+
+    # -------------------------------------------------------------------------
+    # Sampling
+    # -------------------------------------------------------------------------
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                # Root frame: the active stage, else the thread (logger writer, job pool, ...)
+                parts.append(self._current.get(tid) or f"<{names.get(tid, tid)}>")
+                self.stacks[";".join(reversed(parts))] += 1
+                self.samples += 1
+
+    # -------------------------------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------------------------------
+
+    def __enter__(self) -> "Profiler":
+        if self.timer.observer is not None:
+            raise RuntimeError("another Profiler is already active")
+        if self.memory:
+            tracemalloc.start()
+        self.timer.observer = self
+        self._t0 = time.perf_counter()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+        else:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.wall = time.perf_counter() - self._t0
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        self.timer.observer = None
+        if self.memory:
+            tracemalloc.stop()
+
+    # -------------------------------------------------------------------------
+    # Output
+    # -------------------------------------------------------------------------
+
+    def summary(self) -> dict:
+        return {
+            "mode": self.mode,
+            "wall_s": round(self.wall, 4),
+            "interval_s": self.interval if self.mode == "sample" else None,
+            "samples": self.samples,
+            "stages": {
+                name: {k: (round(v, 4) if isinstance(v, float) else v) for k, v in s.items()}
+                for name, s in sorted(self.stages.items(), key=lambda kv: -kv[1]["wall_s"])
+            },
+        }
+
+    def write(self, result_path: str) -> Dict[str, str]:
+        """Write profile files next to `result_path`; returns {kind: path}."""
+        stem = os.path.splitext(result_path)[0]
+        written = {"summary": f"{stem}.profile.json"}
+        with open(written["summary"], "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        if self.stacks:
+            written["collapsed"] = f"{stem}.collapsed"
+            with open(written["collapsed"], "w", encoding="utf-8") as f:
+                for stack, n in self.stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+        if self._cprofile is not None:
+            written["pstats"] = f"{stem}.pstats"
+            self._cprofile.dump_stats(written["pstats"])
+        logger.info("Profile written", extra=written)
+        return written
+
+    def print_table(self, file=sys.stderr) -> None:
+        print(f"\n{'STAGE':<14}{'CALLS':>6}{'WALL s':>10}{'CPU s':>10}{'ALLOC PEAK':>13}", file=file)
+        for name, s in self.summary()["stages"].items():
+            peak = "-" if s["alloc_peak"] is None else f"{s['alloc_peak'] / 2**20:.1f} MB"
+            print(f"{name:<14}{s['calls']:>6}{s['wall_s']:>10.4f}{s['cpu_s']:>10.4f}{peak:>13}", file=file)
+        print(f"{'total':<14}{'':>6}{self.wall:>10.4f}", file=file)
@@ -1,29 +1,146 @@
+import os
 import json
 import time
 from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 RECOVERY_DIR = Path(".recovery")
 RECOVERY_DIR.mkdir(exist_ok=True)
 STATE_FILE = RECOVERY_DIR / "session_state.json"
+JOBS_DIR = RECOVERY_DIR / "jobs"
+SESSION_MAX_AGE = 24 * 3600
 
-def save_session_state(state: dict) -> None:
-    tmp = STATE_FILE.with_suffix(".tmp")
-    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
-    tmp.replace(STATE_FILE)
-
-def restore_session_state() -> dict:
+def _read_states() -> Dict[str, dict]:
     if not STATE_FILE.exists():
         return {}
     try:
-        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+        states = json.loads(STATE_FILE.read_text(encoding="utf-8"))
     except Exception:
         return {}
+    if "session_id" in states:
+        # Older files held one unkeyed state; only its own id can resume it.
+        return {states["session_id"]: states}
+    return states
+
+def save_session_state(token: str, state: dict) -> None:
+    """Store `state` under the resume token of one browser session."""
+    now = time.time()
+    states = {k: v for k, v in _read_states().items() if now - v.get("ts", 0) <= SESSION_MAX_AGE}
+    states[token] = {**state, "ts": now}
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(states, separators=(",", ":")), encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+def restore_session_state(token: Optional[str]) -> dict:
+    """
+    State saved under `token`, or {}. Without a token nothing is restored,
+    so a new visitor never picks up another user's session.
+    """
+    if not token:
+        return {}
+    return _read_states().get(token, {})
 
-def cleanup_old_sessions(max_age_seconds: int = 24 * 3600) -> None:
+def cleanup_old_sessions(max_age_seconds: int = SESSION_MAX_AGE) -> None:
     now = time.time()
-    for p in RECOVERY_DIR.glob("*"):
+    for p in list(RECOVERY_DIR.glob("*")) + list(RECOVERY_DIR.glob("history/*.jsonl")):
         try:
             if p.is_file() and (now - p.stat().st_mtime) > max_age_seconds:
                 p.unlink()
         except Exception:
             pass
+
+
+class JobJournal:
+    """
+    Append-only record of completed work units for one batch / enrollment job.
+
+    mark_done() appends one JSON line. The journal is folded into a snapshot
+    once it holds at least max(compact_every, units already in the snapshot)
+    lines, so total compaction work stays linear in job size and the
+    per-unit cost is flat. A restarted job loads the snapshot, replays the
+    journal tail and skips everything already done.
+    """
+
+    COMPACT_EVERY = 500
+
+    def __init__(self, job_id: str, compact_every: Optional[int] = None):
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        self.job_id = job_id
+        self.compact_every = compact_every or self.COMPACT_EVERY
+        self.snapshot_path = JOBS_DIR / f"{job_id}.snapshot.json"
+        self.journal_path = JOBS_DIR / f"{job_id}.journal"
+        self.done: Dict[str, Any] = {}
+        self._snapshot_size = 0
+        self._pending = 0
+        self._load()
+        self._fh = open(self.journal_path, "a", encoding="utf-8")
+
+    def _load(self) -> None:
+        if self.snapshot_path.exists():
+            try:
+                self.done = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            except Exception:
+                self.done = {}
+        self._snapshot_size = len(self.done)
+        if not self.journal_path.exists():
+            return
+        good = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    entry = None
+                if entry is None:
+                    break   # torn final line from a crash
+                self.done[entry["u"]] = entry.get("r")
+                self._pending += 1
+                good += len(line)
+        if good < self.journal_path.stat().st_size:
+            # Cut the torn tail, or the next append would land on the same
+            # line and be lost with it on the following load.
+            os.truncate(self.journal_path, good)
+
+    def __contains__(self, unit_id: str) -> bool:
+        return unit_id in self.done
+
+    def __len__(self) -> int:
+        return len(self.done)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return iter(self.done.items())
+
+    def mark_done(self, unit_id: str, result: Any = None) -> None:
+        self.done[unit_id] = result
+        self._fh.write(json.dumps({"u": unit_id, "r": result}, separators=(",", ":")) + "\n")
+        self._fh.flush()
+        self._pending += 1
+        if self._pending >= max(self.compact_every, self._snapshot_size):
+            self.compact()
+
+    def compact(self) -> None:
+        """Fold the journal into the snapshot, then truncate the journal."""
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.done, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self.snapshot_path)
+        self._fh.close()
+        self._fh = open(self.journal_path, "w", encoding="utf-8")
+        self._snapshot_size = len(self.done)
+        self._pending = 0
+
+    def close(self) -> None:
+        if self._pending:
+            self.compact()
+        self._fh.close()
+
+    def discard(self) -> None:
+        """Remove all job state (after the job's output has been delivered)."""
+        self._fh.close()
+        for p in (self.snapshot_path, self.journal_path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+CPU thread budget shared by ONNX Runtime, OpenCV and BLAS.
+
+Left alone, every ORT session sizes its intra-op pool to all cores,
+OpenCV starts its own pool, and OpenBLAS/MKL start a third. With several
+workers per host that is workers x 3 x cores runnable threads fighting for
+cores. ThreadBudget splits the cores a process may use between `sessions`
+(one ORT session, i.e. one engine, per worker process by default) and gives
+each:
+
+  ORT      intra-op = cores per session, inter-op = 1 (sequential graphs)
+  OpenCV   cv2.setNumThreads(cores per session)
+  BLAS     1 thread (NumPy work here is small dot products) through
+           threadpoolctl, which is required: NumPy is already loaded by the
+           time apply() runs, so the env vars only reach child processes
+  affinity optional: worker i is pinned to its own slice of cores
+
+Worker threads that share one engine share its intra-op pool and the
+process-wide OpenCV pool, so pass sessions=1 for them; splitting the
+cores per thread would leave most of them idle at low load.
+
+    budget = ThreadBudget(workers=4)                # four worker processes
+    budget.apply(worker_index=i)
+    engine = InsightEngine(sess_options=budget.session_options())
+
+    budget = ThreadBudget(workers=4, sessions=1)    # four threads, one engine
+
+Benchmark (throughput for 1..N worker processes, with and without budget):
+
+    python3 resources.py --bench face.jpg --max-workers 4 [--seconds 10]
+
+ModelEvictor is the memory side: it unloads registered models after an
+idle period, or as soon as MemAvailable drops below a floor, and reports
+process RSS and each model's last (re)load latency.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import ctypes
+import argparse
+import threading
+import multiprocessing as mp
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import cv2
+
+from logger import LogManager
+
+logger = LogManager.get_logger(__name__)
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+BLAS_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on (respects cgroup/taskset affinity)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@dataclass
+class ThreadBudget:
+    workers: int = 1
+    cores: Optional[int] = None      # default: len(available_cores())
+    pin: bool = False                # set CPU affinity per worker
+    blas_threads: int = 1
+    sessions: Optional[int] = None   # ORT sessions splitting the cores; default: one per worker
+
+    def __post_init__(self):
+        self.workers = max(1, self.workers)
+        self.sessions = max(1, self.sessions or self.workers)
+        if self.cores is None:
+            self.cores = len(available_cores())
+
+    @property
+    def per_worker(self) -> int:
+        return max(1, self.cores // self.workers)
+
+    @property
+    def per_session(self) -> int:
+        return max(1, self.cores // self.sessions)
+
+    def session_options(self):
+        import onnxruntime
+        opts = onnxruntime.SessionOptions()
+        opts.intra_op_num_threads = self.per_session
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return opts
+
+    def worker_cores(self, worker_index: int) -> List[int]:
+        cores = available_cores()
+        start = (worker_index * self.per_worker) % len(cores)
+        return cores[start:start + self.per_worker] or cores
+
+    def plan(self, worker_index: int = 0) -> dict:
+        return {
+            "worker": worker_index,
+            "workers": self.workers,
+            "sessions": self.sessions,
+            "cores": self.cores,
+            "ort_intra_op": self.per_session,
+            "ort_inter_op": 1,
+            "cv2_threads": self.per_session,
+            "blas_threads": self.blas_threads,
+            "affinity": self.worker_cores(worker_index) if self.pin else None,
+        }
+
+    def apply(self, worker_index: int = 0) -> dict:
+        """Configure the calling process; returns the plan that was applied."""
+        if threadpool_limits is None:
+            raise RuntimeError("ThreadBudget needs threadpoolctl to limit the BLAS pool NumPy has "
+                               "already started (pip install threadpoolctl)")
+        for var in BLAS_ENV:
+            os.environ[var] = str(self.blas_threads)   # for child processes
+        threadpool_limits(limits=self.blas_threads, user_api="blas")
+        cv2.setNumThreads(self.per_session)
+
+        plan = self.plan(worker_index)
+        if plan["affinity"] and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, plan["affinity"])
+        logger.info("Thread budget applied", extra=plan)
+        return plan
+
+
+# =============================================================================
+# Memory
+# =============================================================================
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc; None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def mem_available_bytes() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _trim_heap() -> None:
+    """Return freed heap pages to the OS (glibc only) so RSS reflects the unload."""
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _mb(n: Optional[int]) -> Optional[float]:
+    return round(n / 2**20, 1) if n is not None else None
+
+
+@dataclass
+class _Evictable:
+    loaded: Callable[[], bool]
+    idle_for: Callable[[], float]
+    unload: Callable[[], None]
+    load_seconds: Optional[Callable[[], float]] = None
+    evictions: int = 0
+
+
+class ModelEvictor:
+    """
+    Unloads registered models that have been idle for `idle_seconds`, or
+    every loaded model idle for at least one `interval` when MemAvailable
+    falls below `min_available_mb`. Models reload lazily on next use; the
+    owner is responsible for that (and for locking against in-flight use).
+    """
+
+    def __init__(self, idle_seconds: float = 300, min_available_mb: float = 512, interval: float = 10.0):
+        self.idle_seconds = idle_seconds
+        self.min_available = min_available_mb * 2**20
+        self.interval = interval
+        self._models: Dict[str, _Evictable] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, loaded, idle_for, unload, load_seconds=None) -> None:
+        self._models[name] = _Evictable(loaded, idle_for, unload, load_seconds)
+
+    def check(self) -> List[str]:
+        available = mem_available_bytes()
+        pressure = available is not None and available < self.min_available
+        evicted = []
+        for name, m in self._models.items():
+            if not m.loaded():
+                continue
+            idle = m.idle_for()
+            if idle >= self.idle_seconds or (pressure and idle >= self.interval):
+                before = rss_bytes()
+                m.unload()
+                gc.collect()
+                _trim_heap()
+                after = rss_bytes()
+                m.evictions += 1
+                evicted.append(name)
+                logger.info(
+                    f"Evicted model '{name}' after {idle:.0f}s idle" + (" (memory pressure)" if pressure else ""),
+                    extra={"model": name, "rss_before_mb": _mb(before), "rss_after_mb": _mb(after),
+                           "mem_available_mb": _mb(available)},
+                )
+        return evicted
+
+    def report(self) -> dict:
+        return {
+            "rss_mb": _mb(rss_bytes()),
+            "mem_available_mb": _mb(mem_available_bytes()),
+            "models": {
+                name: {
+                    "loaded": m.loaded(),
+                    "idle_seconds": round(m.idle_for(), 1) if m.loaded() else None,
+                    "evictions": m.evictions,
+                    "last_load_seconds": round(m.load_seconds(), 3) if m.load_seconds else None,
+                }
+                for name, m in self._models.items()
+            },
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.error("Model eviction check failed", exc_info=True)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-evictor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def _bench_worker(index, workers, budgeted, pin, image, ready, start, seconds, out):
+    from verify_v6 import InsightEngine
+    opts = None
+    if budgeted:
+        budget = ThreadBudget(workers=workers, pin=pin)
+        budget.apply(index)
+        opts = budget.session_options()
+    engine = InsightEngine(sess_options=opts)
+    img = cv2.imread(image)
+    engine.embed_all(img)              # warm-up outside the timed window
+    ready.put(index)
+    start.wait()
+    n, t_end = 0, time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        engine.embed_all(img)
+        n += 1
+    out.put(n)
+
+
+def bench_workers(image: str, workers: int, budgeted: bool, seconds: float, pin: bool = False) -> float:
+    ctx = mp.get_context("spawn")
+    ready, start, out = ctx.Queue(), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=_bench_worker, args=(i, workers, budgeted, pin, image, ready, start, seconds, out))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:                    # all models loaded and warm before timing starts
+        ready.get()
+    start.set()
+    total = sum(out.get() for _ in procs)
+    for p in procs:
+        p.join()
+    return total / seconds
+
+
+def bench(image: str, max_workers: int, seconds: float, pin: bool) -> List[dict]:
+    rows = []
+    base = {}
+    print(f"\nCores available: {len(available_cores())}")
+    print(f"{'WORKERS':>8}{'MODE':>10}{'THR/W':>7}{'IMG/S':>9}{'SPEEDUP':>9}{'EFFIC':>8}")
+    for n in range(1, max_workers + 1):
+        for budgeted in (False, True):
+            mode = "budget" if budgeted else "default"
+            rate = bench_workers(image, n, budgeted, seconds, pin)
+            base.setdefault(mode, rate)
+            speedup = rate / base[mode] if base[mode] else 0.0
+            row = {"workers": n, "mode": mode, "threads_per_worker": ThreadBudget(n).per_worker if budgeted else None,
+                   "images_per_s": round(rate, 2), "speedup": round(speedup, 2),
+                   "efficiency": round(speedup / n, 2)}
+            rows.append(row)
+            print(f"{n:>8}{mode:>10}{row['threads_per_worker'] or '-':>7}{rate:>9.2f}"
+                  f"{speedup:>9.2f}{row['efficiency']:>8.2f}")
+    print()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU thread budget for ORT / OpenCV / BLAS")
+    parser.add_argument("--bench", metavar="IMAGE", help="measure throughput from 1 to --max-workers processes")
+    parser.add_argument("--max-workers", type=int, default=max(1, len(available_cores()) // 2))
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--pin", action="store_true", help="pin each budgeted worker to its own cores")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if not args.bench:
+        budget = ThreadBudget(args.max_workers, pin=args.pin)
+        print(json.dumps([budget.plan(i) for i in range(budget.workers)], indent=2))
+        sys.exit(0)
+    rows = bench(args.bench, args.max_workers, args.seconds, args.pin)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
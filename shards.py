@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+Sharded gallery search: scatter a probe to every shard, gather top-k.
+
+The enrollment gallery (gallery.py) is partitioned by enrollment id
+(id % shards == index). Each shard is a server process holding only its
+partition as a unit-norm float32 matrix, on this host or another node.
+The coordinator sends the probe embedding to all shards in parallel, each
+shard answers with its own top-k, and the per-shard lists (already sorted)
+are merged with heapq into the global top-k. The adaptive-threshold
+verdict (decide) is applied to the final candidates only.
+
+Wire format (TCP, one persistent connection per shard, no pickle):
+
+  header   magic "LZSH", version u8, type u8, reserved u16,
+           JSON length u32, payload length u32   (little-endian)
+  body     UTF-8 JSON metadata, then a raw little-endian float32 payload
+
+  SEARCH   {"k": k, "n": probes, "dim": d}      payload: n x d probes
+  RESULT   {"shard", "size", "hits": [[[id, identity, quality], ...] per probe],
+            "seconds"}                          payload: scores, row-major
+  INFO     {} -> INFO {"shard", "count", "size", "dim", "model_version"}
+  AUTH     {} -> AUTH {"nonce"}; {"mac"} -> AUTH {"ok": true}
+  ERROR    {"error": message}
+
+Shards bind to 127.0.0.1 unless started with --allow-remote, which also
+requires a shared secret in $LZ_SHARD_SECRET. A shard with a secret answers
+nothing but AUTH until the client has returned HMAC-SHA256(secret, nonce);
+coordinators read the same variable and authenticate on every new connection.
+
+A shard that fails or times out is reported in `missing_shards`; the
+merge still returns the best candidates from the shards that answered.
+
+With --codec int8 (or float16) a shard keeps its partition compressed in
+RAM (embedding_codec.CompressedGallery, about 25% / 50% of float32) and
+reranks the top k * RERANK_FACTOR candidates exactly against a float32
+copy that is memory-mapped from disk, so returned scores are unchanged.
+
+    LZ_SHARD_SECRET=... python3 shards.py serve --db gallery.db --index 0 --count 4 --host 0.0.0.0 --allow-remote
+    python3 shards.py search probe.jpg --shards node1:7400,node2:7400 -k 10
+    python3 shards.py local --db gallery.db --count 4 probe.jpg   # spawns 4 local shards
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import heapq
+import socket
+import struct
+import argparse
+import hashlib
+import ipaddress
+import itertools
+import tempfile
+import threading
+import socketserver
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_codec import CompressedGallery
+from gallery import DEFAULT_DB, Gallery
+from verify_v6 import Config, Template, UltimateVerifier, decide, logger
+
+MAGIC = b"LZSH"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHII")
+MSG_SEARCH, MSG_RESULT, MSG_INFO, MSG_ERROR, MSG_AUTH = 1, 2, 3, 4, 5
+
+CODECS = ("int8", "float16")
+MAX_JSON = 16 << 20
+MAX_PAYLOAD = 64 << 20
+DEFAULT_PORT = 7400
+DEFAULT_K = 10
+SHARD_TIMEOUT = 30.0
+SECRET_ENV = "LZ_SHARD_SECRET"
+
+
+class ProtocolError(Exception):
+    pass
+
+
+# =============================================================================
+# Framing
+# =============================================================================
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        r = sock.recv_into(view[got:])
+        if r == 0:
+            raise ConnectionError("connection closed")
+        got += r
+    return bytes(buf)
+
+
+def send_msg(sock: socket.socket, kind: int, meta: dict, payload: bytes = b"") -> None:
+    body = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    sock.sendall(HEADER.pack(MAGIC, VERSION, kind, 0, len(body), len(payload)) + body + payload)
+
+
+def recv_msg(sock: socket.socket) -> Tuple[int, dict, bytes]:
+    magic, version, kind, _, n_json, n_payload = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if magic != MAGIC:
+        raise ProtocolError("bad magic")
+    if version != VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    if n_json > MAX_JSON or n_payload > MAX_PAYLOAD:
+        raise ProtocolError(f"message too large ({n_json} + {n_payload} bytes)")
+    meta = json.loads(_recv_exact(sock, n_json)) if n_json else {}
+    payload = _recv_exact(sock, n_payload) if n_payload else b""
+    return kind, meta, payload
+
+
+def _mac(secret: str, nonce: str) -> str:
+    return hmac.new(secret.encode("utf-8"), nonce.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# =============================================================================
+# Shard server
+# =============================================================================
+
+class Shard:
+    """
+    One gallery partition held in RAM as unit-norm float32 rows, or with
+    `codec` as a CompressedGallery reranked against a memory-mapped float32 copy.
+    """
+
+    def __init__(self, db: str, index: int, count: int, model_version: str = Config.MODEL_NAME,
+                 codec: Optional[str] = None):
+        self.index, self.count, self.model_version = index, count, model_version
+        gallery = Gallery(db)
+        self.ids, self.identities, self.qualities, E = gallery.shard(model_version, index, count)
+        gallery.close()
+        E = np.ascontiguousarray(E, dtype=np.float32)
+        if len(E):
+            E /= np.maximum(np.linalg.norm(E, axis=1, keepdims=True), 1e-12)
+        self.dim = int(E.shape[1]) if len(E) else 0
+        self.codec = codec if len(E) else None
+        self.E, self.compressed = E, None
+        if self.codec:
+            self.compressed = CompressedGallery(E, mode=codec, full=_spill(E))
+            self.E = None
+        logger.info(f"Shard {index}/{count} loaded",
+                    extra={"enrollments": len(self.ids), "model_version": model_version, "codec": self.codec})
+
+    def info(self) -> dict:
+        return {"shard": self.index, "count": self.count, "size": len(self.ids),
+                "dim": self.dim, "model_version": self.model_version, "codec": self.codec}
+
+    def search(self, Q: np.ndarray, k: int) -> Tuple[List[list], np.ndarray]:
+        """Per probe: top-k [id, identity, quality] by cosine, and the Q x k' score matrix."""
+        k = min(k, len(self.ids))
+        if k == 0:
+            return [[] for _ in Q], np.zeros((len(Q), 0), np.float32)
+        if self.compressed is not None:
+            found = [self.compressed.search(q, k) for q in Q]
+            top = np.array([[i for i, _, _ in f] for f in found], dtype=np.int64)
+            scores = np.array([[s for _, s, _ in f] for f in found], dtype="<f4")
+        else:
+            S = Q @ self.E.T
+            top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+            rows = np.arange(len(Q))[:, None]
+            top = top[rows, np.argsort(-S[rows, top], axis=1)]
+            scores = np.ascontiguousarray(S[rows, top], dtype="<f4")
+        hits = [[[self.ids[i], self.identities[i], self.qualities[i]] for i in t] for t in top]
+        return hits, scores
+
+
+def _spill(E: np.ndarray) -> np.ndarray:
+    """Move a float32 matrix to a memory-mapped temp file (unlinked at once on POSIX)."""
+    fd, path = tempfile.mkstemp(prefix="lzshard-", suffix=".npy")
+    os.close(fd)
+    np.save(path, E)
+    full = np.load(path, mmap_mode="r")
+    try:
+        os.unlink(path)   # the mapping keeps the data alive
+    except OSError:
+        pass
+    return full
+
+
+class _ShardHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        shard: Shard = self.server.shard
+        secret = self.server.secret
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        nonce, authed = None, secret is None
+        while True:
+            try:
+                kind, meta, payload = recv_msg(sock)
+            except (ConnectionError, OSError):
+                return
+            except (ProtocolError, ValueError) as e:
+                logger.warning(f"Shard {shard.index}: dropping client: {e}")
+                return
+            if kind == MSG_AUTH:
+                if authed:
+                    send_msg(sock, MSG_AUTH, {"ok": True})
+                elif "mac" not in meta:
+                    nonce = os.urandom(16).hex()
+                    send_msg(sock, MSG_AUTH, {"nonce": nonce})
+                elif nonce and hmac.compare_digest(str(meta["mac"]), _mac(secret, nonce)):
+                    authed = True
+                    send_msg(sock, MSG_AUTH, {"ok": True})
+                else:
+                    logger.warning(f"Shard {shard.index}: authentication failed from {self.client_address[0]}")
+                    send_msg(sock, MSG_ERROR, {"error": "authentication failed"})
+                    return
+                continue
+            if not authed:
+                send_msg(sock, MSG_ERROR, {"error": "authentication required"})
+                return
+            try:
+                if kind == MSG_INFO:
+                    send_msg(sock, MSG_INFO, shard.info())
+                elif kind == MSG_SEARCH:
+                    t = time.perf_counter()
+                    n, dim, k = int(meta["n"]), int(meta["dim"]), int(meta["k"])
+                    if shard.dim and dim != shard.dim:
+                        raise ValueError(f"probe dim {dim} != gallery dim {shard.dim}")
+                    if len(payload) != n * dim * 4:
+                        raise ValueError("payload size does not match n x dim")
+                    Q = np.frombuffer(payload, dtype="<f4").reshape(n, dim)
+                    hits, scores = shard.search(Q, k)
+                    send_msg(sock, MSG_RESULT, {"shard": shard.index, "size": len(shard.ids), "hits": hits,
+                                                "seconds": round(time.perf_counter() - t, 6)},
+                             scores.tobytes())
+                else:
+                    send_msg(sock, MSG_ERROR, {"error": f"unknown message type {kind}"})
+            except (KeyError, ValueError) as e:
+                send_msg(sock, MSG_ERROR, {"error": str(e)})
+
+
+class ShardServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, shard: Shard, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 secret: Optional[str] = None, allow_remote: bool = False):
+        if not _is_loopback(host):
+            if not allow_remote:
+                raise ValueError(f"refusing to bind {host}: pass allow_remote to expose a shard")
+            if not secret:
+                raise ValueError(f"refusing to bind {host} without a shared secret (${SECRET_ENV})")
+        self.shard = shard
+        self.secret = secret or None
+        super().__init__((host, port), _ShardHandler)
+
+
+def serve(db: str, index: int, count: int, model_version: str, host: str, port: int, ready=None,
+          codec: Optional[str] = None, secret: Optional[str] = None, allow_remote: bool = False) -> None:
+    server = ShardServer(Shard(db, index, count, model_version, codec), host, port, secret, allow_remote)
+    logger.info(f"Shard {index}/{count} listening on {host}:{server.server_address[1]}")
+    if ready is not None:
+        ready.put((index, server.server_address[1]))
+    server.serve_forever()
+
+
+# =============================================================================
+# Coordinator
+# =============================================================================
+
+@dataclass
+class Candidate:
+    enrollment_id: int
+    identity: str
+    similarity: float
+    shard: int
+    verdict: str = ""
+    confidence: float = 0.0
+
+
+@dataclass
+class ShardedResult:
+    candidates: List[Candidate]
+    shards: int
+    missing_shards: List[str] = field(default_factory=list)
+    scanned: int = 0
+    shard_seconds: dict = field(default_factory=dict)
+    execution_time: float = 0.0
+
+
+class _ShardClient:
+    """
+    One persistent connection per shard. A request that fails on a reused
+    connection (closed by the server while idle) is retried once on a new
+    one. Timeouts are not retried: the shard is slow, not gone, and a retry
+    would only double the wait and the shard's load. A malformed reply
+    closes the connection, since the stream can no longer be trusted.
+    """
+
+    def __init__(self, address: str, timeout: float, secret: Optional[str] = None):
+        host, _, port = address.rpartition(":")
+        self.address = address
+        self.endpoint = (host or "127.0.0.1", int(port or DEFAULT_PORT))
+        self.timeout = timeout
+        self.secret = secret or None
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection(self.endpoint, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.secret:
+            try:
+                self._authenticate(sock)
+            except BaseException:
+                sock.close()
+                raise
+        return sock
+
+    def _authenticate(self, sock: socket.socket) -> None:
+        send_msg(sock, MSG_AUTH, {})
+        kind, meta, _ = recv_msg(sock)
+        if kind == MSG_AUTH and "nonce" in meta:
+            send_msg(sock, MSG_AUTH, {"mac": _mac(self.secret, str(meta["nonce"]))})
+            kind, meta, _ = recv_msg(sock)
+        if kind != MSG_AUTH or not meta.get("ok"):
+            raise ProtocolError(f"{self.address}: {meta.get('error', 'authentication failed')}")
+
+    def call(self, kind: int, meta: dict, payload: bytes = b"") -> Tuple[dict, bytes]:
+        with self._lock:
+            for attempt in (0, 1):
+                reused = self._sock is not None
+                if not reused:
+                    self._sock = self._connect()
+                try:
+                    send_msg(self._sock, kind, meta, payload)
+                    rkind, rmeta, rpayload = recv_msg(self._sock)
+                    break
+                except socket.timeout:
+                    self.close_locked()   # a late reply would desync the stream
+                    raise
+                except (ProtocolError, ValueError):
+                    self.close_locked()   # framing or JSON is broken; nothing after it can be parsed
+                    raise
+                except (ConnectionError, OSError):
+                    self.close_locked()
+                    if attempt or not reused:
+                        raise
+        if rkind == MSG_ERROR:
+            raise ProtocolError(f"{self.address}: {rmeta.get('error')}")
+        return rmeta, rpayload
+
+    def close_locked(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def close(self) -> None:
+        with self._lock:
+            self.close_locked()
+
+
+class ShardedGallery:
+
+    def __init__(self, addresses: Sequence[str], timeout: float = SHARD_TIMEOUT, secret: Optional[str] = None):
+        self.clients = [_ShardClient(a, timeout, secret) for a in addresses]
+        self._pool = ThreadPoolExecutor(max_workers=len(self.clients), thread_name_prefix="shard-scatter")
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        for c in self.clients:
+            c.close()
+
+    def info(self) -> List[dict]:
+        return list(self._pool.map(lambda c: c.call(MSG_INFO, {})[0], self.clients))
+
+    def search(self, probe: np.ndarray, k: int = DEFAULT_K, probe_quality: float = 100.0) -> ShardedResult:
+        """Global top-k for one probe embedding, with a verdict per candidate."""
+        t0 = time.time()
+        q = np.asarray(probe, dtype="<f4").ravel()
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        meta, payload = {"k": k, "n": 1, "dim": len(q)}, q.tobytes()
+
+        futures = [(c, self._pool.submit(c.call, MSG_SEARCH, meta, payload)) for c in self.clients]
+        lists, missing, scanned, seconds, quality = [], [], 0, {}, {}
+        for client, fut in futures:
+            try:
+                rmeta, rpayload = fut.result()
+            except Exception as e:
+                logger.warning(f"Shard {client.address} unavailable: {e}")
+                missing.append(client.address)
+                continue
+            hits = rmeta["hits"][0]
+            scores = np.frombuffer(rpayload, dtype="<f4")[:len(hits)]
+            lists.append([(-float(s), eid, ident, rmeta["shard"]) for (eid, ident, _), s in zip(hits, scores)])
+            quality.update({eid: qual for eid, _, qual in hits})
+            scanned += rmeta["size"]
+            seconds[client.address] = rmeta["seconds"]
+
+        candidates = []
+        for neg, eid, ident, shard in itertools.islice(heapq.merge(*lists), k):
+            verdict, conf = decide(-neg, 50.0, (probe_quality + quality[eid]) / 2)
+            candidates.append(Candidate(eid, ident, -neg, shard, verdict, round(conf, 1)))
+        return ShardedResult(candidates, len(self.clients), missing, scanned, seconds, time.time() - t0)
+
+
+# =============================================================================
+# Local shards (testing / single-host deployments)
+# =============================================================================
+
+class LocalShards:
+    """Spawn `count` shard processes on 127.0.0.1 ephemeral ports; use as a context manager."""
+
+    def __init__(self, db: str, count: int, model_version: str = Config.MODEL_NAME, codec: Optional[str] = None):
+        self.db, self.count, self.model_version, self.codec = db, count, model_version, codec
+        self.procs: List[mp.Process] = []
+        self.addresses: List[str] = []
+
+    def __enter__(self) -> "LocalShards":
+        ctx = mp.get_context("spawn")
+        ready = ctx.Queue()
+        self.procs = [ctx.Process(target=serve, name=f"shard-{i}", daemon=True,
+                                  args=(self.db, i, self.count, self.model_version, "127.0.0.1", 0, ready,
+                                        self.codec))
+                      for i in range(self.count)]
+        for p in self.procs:
+            p.start()
+        ports = dict(ready.get(timeout=120) for _ in self.procs)
+        self.addresses = [f"127.0.0.1:{ports[i]}" for i in range(self.count)]
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for p in self.procs:
+            p.terminate()
+        for p in self.procs:
+            p.join()
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def _probe(args) -> Template:
+    if args.template:
+        return Template.load(args.template)
+    return UltimateVerifier().enroll(args.probe)
+
+
+def _print(result: ShardedResult, as_json: bool) -> None:
+    if as_json:
+        print(json.dumps({
+            "shards": result.shards,
+            "missing_shards": result.missing_shards,
+            "scanned": result.scanned,
+            "execution_time": round(result.execution_time, 4),
+            "shard_seconds": result.shard_seconds,
+            "candidates": [{**c.__dict__, "similarity": round(c.similarity, 4)} for c in result.candidates],
+        }, indent=2))
+        return
+    print(f"\n{result.scanned} enrollments on {result.shards - len(result.missing_shards)}/{result.shards} shards "
+          f"in {result.execution_time * 1000:.1f} ms")
+    if result.missing_shards:
+        print(f"MISSING SHARDS: {', '.join(result.missing_shards)}")
+    print(f"{'#':>3}  {'ENROLLMENT':>10}  {'IDENTITY':<24}{'SIM':>7}  {'VERDICT':<12}{'CONF':>6}{'SHARD':>7}")
+    for rank, c in enumerate(result.candidates, 1):
+        print(f"{rank:>3}  {c.enrollment_id:>10}  {c.identity[:23]:<24}{c.similarity:>7.3f}  "
+              f"{c.verdict:<12}{c.confidence:>6.1f}{c.shard:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded gallery search with scatter-gather top-k")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("serve", help="run one shard server")
+    p.add_argument("--db", default=DEFAULT_DB)
+    p.add_argument("--index", type=int, required=True)
+    p.add_argument("--count", type=int, required=True)
+    p.add_argument("--version", default=Config.MODEL_NAME, help="embedding model version to load")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--allow-remote", action="store_true",
+                   help=f"allow a non-loopback --host; requires ${SECRET_ENV}")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--codec", choices=CODECS, help="hold the partition compressed; rerank in float32")
+
+    for name, help_ in (("search", "search remote shards"), ("local", "spawn local shards and search them")):
+        p = sub.add_parser(name, help=help_)
+        p.add_argument("probe", nargs="?", help="probe image (or use --template)")
+        p.add_argument("--template", help="enrolled probe template (verify_v6.py --enroll)")
+        p.add_argument("-k", type=int, default=DEFAULT_K)
+        p.add_argument("--timeout", type=float, default=SHARD_TIMEOUT, help="per-shard timeout in seconds")
+        p.add_argument("--json", action="store_true")
+        if name == "search":
+            p.add_argument("--shards", required=True, help="comma-separated host:port list")
+        else:
+            p.add_argument("--db", default=DEFAULT_DB)
+            p.add_argument("--count", type=int, default=4)
+            p.add_argument("--version", default=Config.MODEL_NAME)
+            p.add_argument("--codec", choices=CODECS, help="hold partitions compressed; rerank in float32")
+    args = parser.parse_args()
+    secret = os.environ.get(SECRET_ENV) or None
+
+    if args.cmd == "serve":
+        if not 0 <= args.index < args.count:
+            parser.error("--index must be in [0, --count)")
+        if not _is_loopback(args.host):
+            if not args.allow_remote:
+                parser.error(f"--host {args.host} exposes the shard on the network; add --allow-remote")
+            if not secret:
+                parser.error(f"--allow-remote requires a shared secret in ${SECRET_ENV}")
+        serve(args.db, args.index, args.count, args.version, args.host, args.port, codec=args.codec,
+              secret=secret, allow_remote=args.allow_remote)
+        return
+
+    if not args.probe and not args.template:
+        parser.error("give a probe image or --template")
+    template = _probe(args)
+
+    def run(addresses):
+        sharded = ShardedGallery(addresses, args.timeout, secret)
+        try:
+            return sharded.search(template.embedding, args.k, template.quality.score)
+        finally:
+            sharded.close()
+
+    if args.cmd == "local":
+        with LocalShards(args.db, args.count, args.version, args.codec) as local:
+            result = run(local.addresses)
+    else:
+        result = run([a.strip() for a in args.shards.split(",") if a.strip()])
+
+    _print(result, args.json)
+    if not result.candidates:
+        sys.exit(1)
+    sys.exit(0 if result.candidates[0].verdict.startswith("SAME") else 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Audit rows survive a database that refuses writes."""
+import sqlite3
+
+from audit_store import AuditStore, fallback_path, query, replay
+from verify_v6 import ImageQuality, VerificationResult
+
+
+def _result(verdict="SAME_HIGH"):
+    q = ImageQuality(0.0, 0.0, 0.0, (0, 0), 80.0)
+    return VerificationResult(verdict, 90.0, 0.8, 60.0, 80.0, 0.2, q, q, timings={"embed": 0.1})
+
+
+def test_failed_batch_is_spilled_and_replayed(tmp_path, monkeypatch):
+    db = str(tmp_path / "audit.db")
+    monkeypatch.setattr(AuditStore, "RETRY_DELAY", 0.0)
+    store = AuditStore(db)
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TRIGGER refuse BEFORE INSERT ON verifications BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    conn.commit()
+
+    store.record(_result(), "h1", "h2", session_id="s")
+    store.record(_result("DIFFERENT"), "h1", "h3", session_id="s")
+    store.flush()
+    assert query(db, session_id="s") == []
+    with open(fallback_path(db), encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+    conn.execute("DROP TRIGGER refuse")
+    conn.commit()
+    conn.close()
+    assert replay(db) == 2
+    rows = query(db, session_id="s")
+    assert sorted(r["verdict"] for r in rows) == ["DIFFERENT", "SAME_HIGH"]
+    assert replay(db) == 0
+    store.close()
+
+
+def test_transient_failure_is_retried(tmp_path, monkeypatch):
+    db = str(tmp_path / "audit.db")
+    monkeypatch.setattr(AuditStore, "RETRY_DELAY", 0.0)
+    store = AuditStore(db)
+    calls = []
+
+    def connect_fails_once(path):
+        calls.append(path)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return sqlite3.connect(path, check_same_thread=False)
+
+    monkeypatch.setattr("audit_store._connect", connect_fails_once)
+    store.record(_result(), "h1", "h2", session_id="t")
+    store.flush()
+    assert len(query(db, session_id="t")) == 1
+    assert len(calls) == 2
+    store.close()
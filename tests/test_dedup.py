@@ -0,0 +1,88 @@
+"""Near-duplicate feature reuse must never merge two different faces."""
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import recovery
+from batch import run_batch
+from dedup import group_paths
+from verify_v6 import ImageFeatures, ImageQuality, UltimateVerifier
+
+FACE_BOX = (112, 112, 144, 144)
+PERSON = {"x": 0, "a": 0, "c": 0, "b": 1}
+
+
+def _frame(face_seed: int, noise_seed: int = 0) -> np.ndarray:
+    """One scene (shared background) with a person-specific face patch."""
+    yy, xx = np.mgrid[0:256, 0:256]
+    img = ((xx * 0.6 + yy * 0.3) % 256).astype(np.uint8)
+    img = np.dstack([img] * 3)
+    x1, y1, x2, y2 = FACE_BOX
+    face = np.random.default_rng(face_seed).integers(0, 256, (y2 - y1, x2 - x1, 3), dtype=np.uint8)
+    img[y1:y2, x1:x2] = face
+    if noise_seed:
+        img = cv2.add(img, np.random.default_rng(noise_seed).integers(0, 2, img.shape, dtype=np.uint8))
+    return img
+
+
+class _Verifier(UltimateVerifier):
+    """Real decision logic; features come from the file name instead of models."""
+
+    def __init__(self):
+        self.extracted = []
+
+    def extract(self, path: str) -> ImageFeatures:
+        self.extracted.append(path)
+        emb = np.eye(8, dtype=np.float32)[PERSON[path.rsplit("/", 1)[-1][0]]]
+        q = ImageQuality(100.0, 128.0, 50.0, (256, 256), 90.0)
+        return ImageFeatures(path, q, emb, None, None, 0.0, 0.0, FACE_BOX)
+
+
+@pytest.fixture
+def scene(tmp_path, monkeypatch):
+    monkeypatch.setattr(recovery, "JOBS_DIR", tmp_path / "jobs")
+    paths = {}
+    for name, face, noise in (("x", 7, 0), ("a", 1, 0), ("b", 2, 0), ("c", 1, 3)):
+        paths[name] = str(tmp_path / f"{name}.png")
+        cv2.imwrite(paths[name], _frame(face, noise) if name != "x" else np.full((256, 256, 3), 40, np.uint8))
+    rep_of = group_paths([paths["a"], paths["b"], paths["c"]])
+    assert rep_of[paths["b"]] == paths["a"] and rep_of[paths["c"]] == paths["a"], "frames must hash alike"
+    return tmp_path, paths
+
+
+def _rows(out):
+    return [json.loads(line) for line in open(out, encoding="utf-8")]
+
+
+def test_pair_of_near_duplicate_frames_with_different_faces_is_not_same(scene):
+    tmp, p = scene
+    v = _Verifier()
+    summary = run_batch(v, [(p["a"], p["b"], None)], str(tmp / "out.jsonl"), "pair", dedup=True)
+    (row,) = _rows(tmp / "out.jsonl")
+    assert not row["verdict"].startswith("SAME")
+    assert "img2_rep" not in row
+    assert summary["inferences_avoided"] == 0
+
+
+def test_member_with_a_different_face_is_extracted_on_its_own(scene):
+    tmp, p = scene
+    v = _Verifier()
+    pairs = [(p["x"], p["a"], None), (p["x"], p["b"], None), (p["x"], p["c"], None)]
+    summary = run_batch(v, pairs, str(tmp / "out.jsonl"), "members", dedup=True)
+    rows = _rows(tmp / "out.jsonl")
+    assert rows[0]["verdict"].startswith("SAME")
+    assert not rows[1]["verdict"].startswith("SAME") and "img2_rep" not in rows[1]
+    # A recompression of the same face still reuses the representative.
+    assert rows[2]["img2_rep"] == p["a"] and rows[2]["verdict"].startswith("SAME")
+    assert p["b"] in v.extracted and p["c"] not in v.extracted
+    assert summary["inferences_avoided"] == 1
+
+
+def test_dedup_is_off_by_default(scene):
+    tmp, p = scene
+    v = _Verifier()
+    v.verify = lambda a, b: v.verify_features(v.extract(a), v.extract(b))
+    run_batch(v, [(p["a"], p["b"], None)], str(tmp / "out.jsonl"), "default")
+    assert v.extracted == [p["a"], p["b"]]
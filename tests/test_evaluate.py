@@ -0,0 +1,44 @@
+"""evaluate.py feature cache and CLI validation."""
+import sys
+
+import numpy as np
+import pytest
+
+import evaluate
+from evaluate import FeatureCache
+from verify_v6 import ImageFeatures, ImageQuality
+
+
+def test_cache_round_trip(tmp_path):
+    cache = FeatureCache(str(tmp_path), {})
+    q = ImageQuality(12.5, 120.0, 40.0, (640, 480), 77.3)
+    cache.put("d1", ImageFeatures("a.jpg", q, np.ones(4, np.float32), None, None, 0.5, 0.2))
+    f = cache.get("a.jpg", "d1")
+    assert f.quality == q and f.geometry is None
+    assert np.array_equal(f.embedding, np.ones(4, np.float32))
+    assert (f.elapsed, f.geometry_elapsed) == (0.5, 0.2)
+    assert cache.get("b.jpg", "d2") is None and (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_directory_changes_with_format_version(tmp_path, monkeypatch):
+    old = FeatureCache(str(tmp_path), {}).dir
+    monkeypatch.setattr(FeatureCache, "VERSION", FeatureCache.VERSION + 1)
+    assert FeatureCache(str(tmp_path), {}).dir != old
+
+
+def test_cache_is_shared_by_configs_with_the_same_features(tmp_path):
+    base = FeatureCache(str(tmp_path), {}).dir
+    assert FeatureCache(str(tmp_path), {"BASE_THRESHOLD": 0.5, "LAZY_GEOMETRY": False}).dir == base
+    assert FeatureCache(str(tmp_path), {"DET_SIZE": [640, 640]}).dir == base   # the default, as JSON gives it
+    assert FeatureCache(str(tmp_path), {"DET_SIZE": [320, 320]}).dir != base
+    assert FeatureCache(str(tmp_path), {"TILED_DETECTION": True}).dir != base
+
+
+def test_only_rejects_unknown_config(tmp_path, monkeypatch, capsys):
+    pairs = tmp_path / "pairs.txt"
+    pairs.write_text("a.jpg b.jpg 1\n", encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["evaluate.py", str(pairs), "--only", "nope"])
+    with pytest.raises(SystemExit) as exc:
+        evaluate.main()
+    assert exc.value.code == 2
+    assert "unknown config(s) nope" in capsys.readouterr().err
@@ -0,0 +1,32 @@
+"""Quality-weighted template fusion."""
+import numpy as np
+
+from fusion import fuse
+from verify_v6 import Config
+
+
+def test_fuse_weights_by_quality_and_returns_a_unit_vector():
+    E = np.eye(3, dtype=np.float32)[:2]
+    fused, w = fuse(E, [30.0, 90.0])
+    np.testing.assert_allclose(w, [0.25, 0.75])
+    assert fused.dtype == np.float32
+    assert abs(np.linalg.norm(fused) - 1.0) < 1e-6
+    np.testing.assert_allclose(fused, np.array([1, 3, 0]) / np.sqrt(10), atol=1e-6)
+
+
+def test_fuse_equal_qualities_is_the_normalised_mean():
+    rng = np.random.default_rng(0)
+    E = rng.standard_normal((4, 16)).astype(np.float32)
+    E /= np.linalg.norm(E, axis=1, keepdims=True)
+    fused, w = fuse(E, [60.0] * 4)
+    mean = E.mean(axis=0)
+    np.testing.assert_allclose(fused, mean / np.linalg.norm(mean), atol=1e-6)
+    np.testing.assert_allclose(w, 0.25)
+
+
+def test_fuse_floors_zero_quality_weights():
+    E = np.eye(2, dtype=np.float32)
+    _, w = fuse(E, [0.0, 0.0])                   # every image failed quality scoring
+    np.testing.assert_allclose(w, [0.5, 0.5])
+    _, w = fuse(E, [0.0, 3.0 * Config.FUSION_MIN_WEIGHT])
+    np.testing.assert_allclose(w, [0.25, 0.75])
@@ -0,0 +1,47 @@
+"""Gallery enrollment validation and migration batches with unusable crops."""
+import time
+
+import numpy as np
+import pytest
+
+import gallery
+from gallery import Gallery, encode_crop
+
+
+class _Engine:
+    model_name = "m"
+
+    def detect_face(self, path):
+        raise AssertionError("invalid files must not reach the detector")
+
+    def embed_aligned(self, crops):
+        return [np.full(4, float(c[0, 0, 0]), np.float32) for c in crops]
+
+
+@pytest.fixture
+def db(tmp_path):
+    g = Gallery(str(tmp_path / "gallery.db"))
+    yield g
+    g.close()
+
+
+def test_enroll_rejects_invalid_files(db, tmp_path):
+    (tmp_path / "notes.txt").write_text("not an image")
+    assert db.enroll(_Engine(), "alice", str(tmp_path / "notes.txt")) is None
+    assert db.enroll(_Engine(), "alice", str(tmp_path / "missing.jpg")) is None
+    assert db.stats()["enrollments"] == 0
+
+
+def test_embed_batch_skips_missing_and_undecodable_crops(db, monkeypatch):
+    with db.conn:
+        good = db.conn.execute("INSERT INTO enrollments (identity, crop, created) VALUES (?, ?, ?)",
+                               ("a", encode_crop(np.full((112, 112, 3), 7, np.uint8)), time.time())).lastrowid
+        bad = db.conn.execute("INSERT INTO enrollments (identity, crop, created) VALUES (?, ?, ?)",
+                              ("b", b"not a png", time.time())).lastrowid
+    monkeypatch.setattr(gallery, "_worker_gallery", db)
+    monkeypatch.setattr(gallery, "_worker_engine", _Engine())
+
+    eids, raw, dim = gallery._embed_batch([good, bad, 999])
+    assert eids == [good] and dim == 4
+    assert np.frombuffer(raw, np.float32).tolist() == [7.0] * 4
+    assert gallery._embed_batch([bad, 999]) == ([], b"", 0)
@@ -0,0 +1,60 @@
+"""VerificationHistory survives a torn last record and a deleted or shortened file."""
+import os
+
+from history import VerificationHistory
+
+
+def _rec(i, verdict="SAME_HIGH"):
+    return {"timestamp": f"t{i}", "verdict": verdict, "confidence": 90.0,
+            "similarity": 0.7, "quality": 80.0, "execution_time": 0.1}
+
+
+def test_torn_tail_is_truncated_and_later_records_kept(tmp_path):
+    h = VerificationHistory("s", directory=tmp_path)
+    h.add(_rec(0))
+    h.add(_rec(1, "DIFFERENT"))
+    with open(h.path, "ab") as f:
+        f.write(b'{"timestamp": "t2", "verd')
+
+    h = VerificationHistory("s", directory=tmp_path)
+    assert h.total == 2 and h.same == 1 and h.different == 1
+    h.add(_rec(3))
+
+    h = VerificationHistory("s", capacity=1, directory=tmp_path)   # older pages come from disk
+    assert [r["timestamp"] for r in h] == ["t0", "t1", "t3"]
+    assert [r["timestamp"] for r in h.page(0, size=2)] == ["t3", "t1"]
+    assert [r["timestamp"] for r in h.page(1, size=2)] == ["t0"]
+
+
+def test_iteration_and_csv_skip_unparsable_lines(tmp_path):
+    h = VerificationHistory("s", directory=tmp_path)
+    h.add(_rec(0))
+    with open(h.path, "ab") as f:
+        f.write(b'{"timestamp": "t1", "ver')     # add() in progress elsewhere
+    assert [r["timestamp"] for r in h] == ["t0"]
+    lines = h.to_csv().splitlines()
+    assert lines[0].startswith("timestamp,verdict") and len(lines) == 2
+
+
+def test_deleted_file_keeps_the_ring_and_new_records(tmp_path):
+    h = VerificationHistory("s", capacity=2, directory=tmp_path)
+    for i in range(4):
+        h.add(_rec(i))
+    h.path.unlink()                                 # cleanup_old_sessions() swept it
+    assert [r["timestamp"] for r in h.page(0, size=10)] == ["t3", "t2"]
+    h.add(_rec(4, "DIFFERENT"))
+    assert h.total == 3 and h.different == 1
+    assert [r["timestamp"] for r in h.page(1, size=2)] == ["t2"]
+    assert [r["timestamp"] for r in VerificationHistory("s", directory=tmp_path)] == ["t2", "t3", "t4"]
+
+
+def test_shortened_file_is_reloaded_before_seeking(tmp_path):
+    h = VerificationHistory("s", capacity=1, directory=tmp_path)
+    for i in range(4):
+        h.add(_rec(i))
+    with open(h.path, "rb") as f:
+        keep = len(f.readline()) + len(f.readline())
+    os.truncate(h.path, keep)
+    assert h.total == 4
+    assert [r["timestamp"] for r in h.page(0, size=10)] == ["t1", "t0"]
+    assert h.total == 2 and h.same == 2
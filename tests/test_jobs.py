@@ -0,0 +1,67 @@
+"""Dashboard job bookkeeping."""
+import threading
+from functools import partial
+
+from audit_store import AuditStore
+from batch import run_audited
+from jobs import JobManager
+
+
+def test_mark_recorded_is_claimed_once():
+    jobs = JobManager()
+    job = jobs.submit("s", "pair", lambda: 42)
+    job.future.result()
+    wins = []
+    barrier = threading.Barrier(8)
+
+    def claim():
+        barrier.wait()
+        wins.append(jobs.mark_recorded(job))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert wins.count(True) == 1 and job.recorded
+
+
+def test_unfinished_job_cannot_be_claimed():
+    jobs = JobManager()
+    gate = threading.Event()
+    job = jobs.submit("s", "pair", gate.wait)
+    assert not jobs.mark_recorded(job)
+    gate.set()
+    job.future.result()
+    assert jobs.mark_recorded(job)
+
+
+class _Verifier:
+    def verify(self, a, b, **kwargs):
+        raise RuntimeError(f"cannot read {a}")
+
+
+def test_job_audits_itself_even_if_no_page_collects_it(tmp_path):
+    store = AuditStore(str(tmp_path / "audit.db"))
+    jobs = JobManager()
+    verify = partial(run_audited, _Verifier(), store, "a.jpg", "b.jpg", "h1", "h2",
+                     session_id="s", operator="alice", upper_face=True)
+    job = jobs.submit("s", "pair", verify)
+    job.future.exception()
+    store.flush()
+    (row,) = store.query(session_id="s")
+    assert row["verdict"] == "ERROR" and row["operator"] == "alice" and row["source"] == "dashboard"
+    assert row["error"] == "RuntimeError: cannot read a.jpg"
+    assert not job.recorded
+    store.close()
+
+
+def test_finished_jobs_expire_whether_recorded_or_not(monkeypatch):
+    jobs = JobManager()
+    old = jobs.submit("abandoned", "pair", lambda: 1)
+    old.future.result()
+    live = jobs.submit("s", "pair", lambda: 2)
+    live.future.result()
+    old.finished -= JobManager.MAX_DONE_AGE + 1
+    assert jobs.jobs("abandoned") == [] and jobs.get(old.id) is None
+    assert jobs.jobs("s") == [live]
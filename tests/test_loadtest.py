@@ -0,0 +1,29 @@
+"""Arrival schedule and per-interval windowing of the load test report."""
+import pytest
+
+from loadtest import Sample, schedule, summarize
+
+
+def test_fixed_schedule():
+    assert schedule(4.0, 1.0, poisson=False) == pytest.approx([0.25, 0.5, 0.75])
+
+
+def test_poisson_schedule_is_seeded_and_bounded():
+    a = schedule(50.0, 10.0, poisson=True, seed=3)
+    assert a == schedule(50.0, 10.0, poisson=True, seed=3)
+    assert a == sorted(a) and 0 < a[0] and a[-1] < 10.0
+    assert 400 < len(a) < 600
+
+
+def test_series_windows_count_each_sample_once():
+    samples = [Sample(0.0, 0.0, f, "SAME_HIGH") for f in (0.2, 0.9, 1.0, 1.5, 2.49)]
+    samples.append(Sample(2.0, 2.0, 2.6, "ERROR", "boom"))
+    series = [{"t": 1.0, "rss_mb": 100.0, "queued": 0},
+              {"t": 2.0, "rss_mb": 120.0, "queued": 1},
+              {"t": 2.61, "rss_mb": None, "queued": 0}]
+    report = summarize(samples, series, wall=2.61, offered_rate=2.0)
+    assert [p["completed"] for p in report["series"]] == [2, 2, 2]
+    assert [p["errors"] for p in report["series"]] == [0, 0, 1]
+    assert sum(p["completed"] for p in report["series"]) == report["requests"] == 6
+    assert report["errors"] == 1 and report["error_rate"] == pytest.approx(1 / 6, abs=1e-4)
+    assert report["rss_peak_mb"] == 120.0 and report["error_samples"] == ["boom"]
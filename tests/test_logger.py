@@ -0,0 +1,57 @@
+"""Bounded log queue: non-blocking enqueue, drop counting and the overflow report."""
+import io
+import logging
+import queue
+import time
+
+from logger import BoundedQueueHandler, _BatchWriter
+
+
+class _File:
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def emit_batch(self, records):
+        self.batches.append(list(records))
+
+    def close(self):
+        self.closed = True
+
+
+def _record(i):
+    return logging.makeLogRecord({"name": "t", "levelno": logging.INFO, "levelname": "INFO",
+                                  "msg": "rec %d", "args": (i,)})
+
+
+def test_full_queue_drops_and_counts_without_blocking():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=2))
+    t = time.perf_counter()
+    for i in range(5):
+        handler.handle(_record(i))
+    assert time.perf_counter() - t < 0.5
+    assert handler.dropped == 3 and handler.queue.qsize() == 2
+    kept = [handler.queue.get_nowait() for _ in range(2)]
+    assert [r.msg for r in kept] == ["rec 0", "rec 1"] and all(r.args is None for r in kept)
+
+
+def test_writer_batches_records_and_reports_drops_once():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=3))
+    for i in range(5):
+        handler.handle(_record(i))
+    file = _File()
+    console = logging.StreamHandler(io.StringIO())
+    console.setLevel(logging.CRITICAL)
+    writer = _BatchWriter(handler.queue, file, console, handler, batch_size=2, flush_interval=0.05)
+    writer.start()
+    time.sleep(0.2)
+    handler.handle(_record(5))
+    writer.stop()
+
+    records = [r for b in file.batches for r in b]
+    assert all(len(b) <= 3 for b in file.batches)     # batch_size plus at most one overflow report
+    assert [r.getMessage() for r in records if r.name == "t"] == ["rec 0", "rec 1", "rec 2", "rec 5"]
+    reports = [r for r in records if r.name == "logger"]
+    assert len(reports) == 1 and reports[0].levelno == logging.WARNING
+    assert reports[0].getMessage() == "Log queue overflow: 2 record(s) dropped" and reports[0].dropped_total == 2
+    assert file.closed and not writer.is_alive()
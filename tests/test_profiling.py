@@ -0,0 +1,62 @@
+"""Profiler stage accounting and allocation peaks."""
+import io
+import threading
+
+import numpy as np
+
+from profiling import Profiler
+
+
+class _Timer:
+    observer = None
+
+
+def _stage(prof, name, nbytes=0, inner=None):
+    token = prof.enter(name)
+    buf = np.ones(nbytes, np.uint8) if nbytes else None
+    if inner:
+        inner()
+    del buf
+    prof.exit(name, token)
+
+
+def test_outermost_stage_records_the_peak_of_its_nested_stages():
+    with Profiler(timer=_Timer) as prof:
+        _stage(prof, "embed", inner=lambda: _stage(prof, "tiled_detect", 4 << 20))
+        _stage(prof, "geometry", 1 << 20)
+    stages = prof.summary()["stages"]
+    assert stages["embed"]["alloc_peak"] >= 4 << 20
+    assert stages["tiled_detect"]["alloc_peak"] is None and stages["tiled_detect"]["calls"] == 1
+    assert 1 << 20 <= stages["geometry"]["alloc_peak"] < 4 << 20   # reset between stages
+    assert _Timer.observer is None
+
+
+def test_overlapping_stages_do_not_report_a_peak():
+    entered, release = threading.Event(), threading.Event()
+
+    def other():
+        token = prof.enter("embed_b")
+        entered.set()
+        release.wait(5)
+        prof.exit("embed_b", token)
+
+    with Profiler(timer=_Timer) as prof:
+        token = prof.enter("embed_a")
+        t = threading.Thread(target=other)
+        t.start()
+        entered.wait(5)
+        release.set()
+        t.join()
+        prof.exit("embed_a", token)
+    stages = prof.summary()["stages"]
+    assert stages["embed_a"]["alloc_peak"] is None and stages["embed_b"]["alloc_peak"] is None
+    assert stages["embed_a"]["calls"] == stages["embed_b"]["calls"] == 1
+
+
+def test_memory_off_and_table():
+    with Profiler(mode="cprofile", memory=False, timer=_Timer) as prof:
+        _stage(prof, "quality", 1 << 10)
+    out = io.StringIO()
+    prof.print_table(file=out)
+    assert prof.stages["quality"]["alloc_peak"] is None
+    assert out.getvalue().splitlines()[2].startswith("quality") and out.getvalue().splitlines()[2].endswith("-")
@@ -0,0 +1,85 @@
+"""Crash recovery: torn journal tails, batch resume and session tokens."""
+import json
+
+import pytest
+
+import recovery
+from batch import run_batch
+from recovery import JobJournal
+from verify_v6 import ImageQuality, VerificationResult
+
+
+@pytest.fixture(autouse=True)
+def recovery_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(recovery, "JOBS_DIR", tmp_path / "jobs")
+    monkeypatch.setattr(recovery, "STATE_FILE", tmp_path / "session_state.json")
+    return tmp_path
+
+
+def test_torn_journal_tail_is_truncated_before_appending(recovery_dir):
+    j = JobJournal("job", compact_every=100)
+    j.mark_done("0", "SAME_HIGH")
+    j.mark_done("1", "DIFFERENT")
+    j._fh.close()
+    with open(j.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"u":"2","r":"SA')          # crash mid-write
+
+    j = JobJournal("job", compact_every=100)
+    assert set(j.done) == {"0", "1"}
+    j.mark_done("3", "UNCERTAIN")
+    j._fh.close()
+
+    j = JobJournal("job", compact_every=100)
+    assert j.done == {"0": "SAME_HIGH", "1": "DIFFERENT", "3": "UNCERTAIN"}
+    j.discard()
+
+
+def test_journal_line_without_newline_is_torn(recovery_dir):
+    j = JobJournal("job", compact_every=100)
+    j._fh.write('{"u":"0","r":null}')
+    j._fh.close()
+    j = JobJournal("job", compact_every=100)
+    assert "0" not in j
+    assert j.journal_path.stat().st_size == 0
+    j.discard()
+
+
+class _Verifier:
+    def __init__(self):
+        self.calls = []
+
+    def verify(self, a, b):
+        self.calls.append((a, b))
+        q = ImageQuality(0.0, 0.0, 0.0, (0, 0), 80.0)
+        return VerificationResult("DIFFERENT", 80.0, 0.1, 0.0, 80.0, 0.01, q, q)
+
+
+def test_resume_adopts_rows_written_before_the_journal(recovery_dir):
+    out = recovery_dir / "out.jsonl"
+    pairs = [("a.jpg", "b.jpg", None), ("c.jpg", "d.jpg", None)]
+    # Row 0 reached the output but the crash came before mark_done; row 1 is torn.
+    out.write_text(json.dumps({"pair": 0, "img1": "a.jpg", "img2": "b.jpg", "verdict": "SAME_HIGH"})
+                   + '\n{"pair": 1, "img1": "c.j', encoding="utf-8")
+    v = _Verifier()
+    summary = run_batch(v, pairs, str(out), "resume")
+    assert v.calls == [("c.jpg", "d.jpg")]
+    assert summary["processed"] == 1 and summary["resumed_from"] == 1
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [r["pair"] for r in rows] == [0, 1]
+
+
+def test_rows_from_another_pairs_file_are_not_adopted(recovery_dir):
+    out = recovery_dir / "out.jsonl"
+    out.write_text(json.dumps({"pair": 0, "img1": "x.jpg", "img2": "y.jpg"}) + "\n", encoding="utf-8")
+    v = _Verifier()
+    run_batch(v, [("a.jpg", "b.jpg", None)], str(out), "other")
+    assert v.calls == [("a.jpg", "b.jpg")]
+
+
+def test_session_state_needs_its_token():
+    recovery.save_session_state("tok-a", {"session_id": "s1"})
+    recovery.save_session_state("tok-b", {"session_id": "s2"})
+    assert recovery.restore_session_state(None) == {}
+    assert recovery.restore_session_state("nope") == {}
+    assert recovery.restore_session_state("tok-a")["session_id"] == "s1"
+    assert recovery.restore_session_state("tok-b")["session_id"] == "s2"
@@ -0,0 +1,146 @@
+"""Sharded gallery search against a brute-force scan."""
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from gallery import Gallery
+from shards import (HEADER, MAGIC, MSG_INFO, ProtocolError, Shard, ShardServer, ShardedGallery, _ShardClient,
+                    recv_msg, send_msg)
+
+DIM = 64
+
+
+@pytest.fixture
+def gallery_db(tmp_path):
+    rng = np.random.default_rng(0)
+    E = rng.standard_normal((300, DIM)).astype(np.float32)
+    g = Gallery(str(tmp_path / "gallery.db"))
+    with g.conn:
+        for i, e in enumerate(E):
+            cur = g.conn.execute(
+                "INSERT INTO enrollments (identity, quality, crop, created) VALUES (?, ?, ?, ?)",
+                (f"person-{i}", 80.0, b"", time.time()))
+            g._put_embeddings([(cur.lastrowid, e)], "m")
+    g.close()
+    E /= np.linalg.norm(E, axis=1, keepdims=True)
+    return str(tmp_path / "gallery.db"), E
+
+
+@pytest.mark.parametrize("codec", ["int8", "float16"])
+def test_compressed_shard_matches_float32(gallery_db, codec):
+    db, E = gallery_db
+    probes = E[[3, 150, 299]] + 0.3 * np.random.default_rng(1).standard_normal((3, DIM)).astype(np.float32)
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    plain, packed = Shard(db, 0, 2, "m"), Shard(db, 0, 2, "m", codec=codec)
+    assert packed.E is None and packed.info()["codec"] == codec
+    h1, s1 = plain.search(probes, 5)
+    h2, s2 = packed.search(probes, 5)
+    assert h1 == h2
+    np.testing.assert_allclose(s1, s2, atol=1e-5)
+
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"127.0.0.1:{server.server_address[1]}"
+
+
+def _listener():
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen()
+    return srv, f"127.0.0.1:{srv.getsockname()[1]}"
+
+
+def test_merged_top_k_equals_brute_force(gallery_db):
+    db, E = gallery_db
+    servers = [ShardServer(Shard(db, i, 3, "m"), "127.0.0.1", 0) for i in range(3)]
+    dead, dead_addr = _listener()
+    dead.close()                                  # nothing listens there any more
+    sharded = ShardedGallery([_start(s) for s in servers] + [dead_addr], timeout=5)
+    try:
+        probe = E[42] + 0.5 * np.random.default_rng(2).standard_normal(DIM).astype(np.float32)
+        q = probe / np.linalg.norm(probe)
+        result = sharded.search(probe, k=10)
+        S = E @ q
+        expect = np.argsort(-S)[:10] + 1          # enrollment ids start at 1
+        assert [c.enrollment_id for c in result.candidates] == list(expect)
+        np.testing.assert_allclose([c.similarity for c in result.candidates], S[expect - 1], atol=1e-5)
+        assert result.missing_shards == [dead_addr] and result.scanned == len(E)
+    finally:
+        sharded.close()
+        for s in servers:
+            s.shutdown()
+            s.server_close()
+
+
+def test_timeout_is_not_retried():
+    srv, addr = _listener()
+    accepted = []
+    threading.Thread(target=lambda: [accepted.append(srv.accept()) for _ in range(2)], daemon=True).start()
+    client = _ShardClient(addr, timeout=0.3)
+    with pytest.raises(socket.timeout):
+        client.call(MSG_INFO, {})
+    time.sleep(0.2)
+    assert len(accepted) == 1
+    client.close()
+    srv.close()
+
+
+def test_request_on_stale_connection_is_retried_once():
+    srv, addr = _listener()
+
+    def one_reply_per_connection():
+        for _ in range(2):
+            conn, _ = srv.accept()
+            recv_msg(conn)
+            send_msg(conn, MSG_INFO, {"ok": True})
+            conn.close()                          # server drops the idle connection
+
+    threading.Thread(target=one_reply_per_connection, daemon=True).start()
+    client = _ShardClient(addr, timeout=5)
+    assert client.call(MSG_INFO, {})[0] == {"ok": True}
+    time.sleep(0.1)
+    assert client.call(MSG_INFO, {})[0] == {"ok": True}
+    client.close()
+    srv.close()
+
+
+def test_shard_refuses_remote_bind_without_opt_in_and_secret(gallery_db):
+    shard = Shard(gallery_db[0], 0, 1, "m")
+    with pytest.raises(ValueError, match="allow_remote"):
+        ShardServer(shard, "0.0.0.0", 0)
+    with pytest.raises(ValueError, match="secret"):
+        ShardServer(shard, "0.0.0.0", 0, allow_remote=True)
+
+
+def test_shared_secret_handshake(gallery_db):
+    server = ShardServer(Shard(gallery_db[0], 0, 1, "m"), "127.0.0.1", 0, secret="s3cret")
+    addr = _start(server)
+    try:
+        assert _ShardClient(addr, 5, "s3cret").call(MSG_INFO, {})[0]["size"] == 300
+        with pytest.raises(ProtocolError, match="authentication failed"):
+            _ShardClient(addr, 5, "wrong").call(MSG_INFO, {})
+        with pytest.raises(ProtocolError, match="authentication required"):
+            _ShardClient(addr, 5).call(MSG_INFO, {})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_malformed_reply_closes_the_connection():
+    srv, addr = _listener()
+
+    def garbage():
+        conn, _ = srv.accept()
+        recv_msg(conn)
+        conn.sendall(HEADER.pack(MAGIC, 1, MSG_INFO, 0, 3, 0) + b"{x}")   # bad JSON
+
+    threading.Thread(target=garbage, daemon=True).start()
+    client = _ShardClient(addr, timeout=5)
+    with pytest.raises(ValueError):
+        client.call(MSG_INFO, {})
+    assert client._sock is None
+    srv.close()
@@ -0,0 +1,80 @@
+"""Tiled detection: tile grid, NMS merge and deadline handling."""
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from verify_v6 import Config, Deadline, DeadlineExceeded, InsightEngine, nms
+
+
+def test_nms_keeps_the_best_of_each_overlapping_group():
+    dets = np.array([
+        [0, 0, 10, 10, 0.80],
+        [1, 1, 11, 11, 0.90],     # IoU 0.68 with the first
+        [20, 20, 30, 30, 0.95],
+        [20, 25, 30, 35, 0.50],   # IoU 0.33 with the third
+    ], np.float32)
+    assert nms(dets, 0.4) == [2, 1, 3]
+    assert nms(dets, 0.3) == [2, 1]
+    assert nms(dets, 0.9) == [2, 1, 0, 3]
+    assert nms(np.zeros((0, 5), np.float32), 0.4) == []
+
+
+@pytest.mark.parametrize("h, w", [(1000, 1500), (640, 640), (300, 2000), (1600, 1120)])
+def test_tile_grid_covers_the_image_with_full_size_tiles(h, w):
+    size, overlap = 640, 0.25
+    tiles = InsightEngine.tile_grid(h, w, size, overlap)
+    covered = np.zeros((h, w), bool)
+    for x0, y0, x1, y1 in tiles:
+        assert 0 <= x0 < x1 <= w and 0 <= y0 < y1 <= h
+        assert x1 - x0 == min(size, w) and y1 - y0 == min(size, h)   # shifted inwards, never shrunk
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+    assert len(set(tiles)) == len(tiles)
+    xs = sorted({t[0] for t in tiles})
+    assert all(b - a <= int(size * (1 - overlap)) for a, b in zip(xs, xs[1:]))
+
+
+def test_tile_grid_layout():
+    assert InsightEngine.tile_grid(1000, 1500, 640, 0.25) == [
+        (0, 0, 640, 640), (480, 0, 1120, 640), (860, 0, 1500, 640),
+        (0, 360, 640, 1000), (480, 360, 1120, 1000), (860, 360, 1500, 1000),
+    ]
+
+
+class _Detector:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def detect(self, img, max_num=0, metric="default"):
+        self.calls += 1
+        time.sleep(self.delay)
+        return np.zeros((0, 5), np.float32), np.zeros((0, 5, 2), np.float32)
+
+
+def _engine(det):
+    eng = InsightEngine.__new__(InsightEngine)   # no models: only the tiling code is exercised
+    eng._pool, eng._pool_lock = None, threading.Lock()
+    eng.app = SimpleNamespace(det_model=det)
+    return eng
+
+
+def test_tiled_detection_stops_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(Config, "TILE_WORKERS", 1)
+    det = _Detector(delay=0.05)
+    img = np.zeros((2000, 2000, 3), np.uint8)
+    tiles = len(InsightEngine.tile_grid(2000, 2000, Config.TILE_SIZE, Config.TILE_OVERLAP))
+    with pytest.raises(DeadlineExceeded):
+        _engine(det).detect_tiled(img, Deadline(0.12))
+    time.sleep(0.1)
+    assert det.calls < tiles + 1
+
+
+def test_tiled_detection_without_deadline_runs_every_tile():
+    det = _Detector()
+    dets, kpss = _engine(det).detect_tiled(np.zeros((2000, 2000, 3), np.uint8))
+    assert len(dets) == 0 and kpss.shape == (0, 5, 2)
+    assert det.calls == len(InsightEngine.tile_grid(2000, 2000, Config.TILE_SIZE, Config.TILE_OVERLAP)) + 1
@@ -0,0 +1,146 @@
+"""Template format, lazy-geometry skip rule, deadlines and retries, multi-face search."""
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+import verify_v6
+from verify_v6 import (Config, Deadline, DeadlineExceeded, ImageQuality, NON_TRANSIENT_ERRORS, Template,
+                       UltimateVerifier, _retry, decide, geometry_can_change)
+
+
+def _template(geometry=True):
+    emb = np.random.default_rng(0).standard_normal(512).astype(np.float32)
+    emb /= np.linalg.norm(emb)
+    geo = np.array([1.01, 0.42, 0.77, 1.3]) if geometry else None
+    return Template(emb, ImageQuality(123.4, 118.2, 51.7, (1280, 960), 77.3), geo, "buffalo_l", 1760000000.25)
+
+
+@pytest.mark.parametrize("geometry", [True, False])
+def test_template_round_trip(tmp_path, geometry):
+    t = _template(geometry)
+    t.save(str(tmp_path / "a.tpl"))
+    u = Template.load(str(tmp_path / "a.tpl"))
+    assert np.array_equal(u.embedding, t.embedding) and u.embedding.dtype == np.float32
+    assert u.quality == t.quality and u.model == t.model and u.created == t.created
+    if geometry:
+        assert np.array_equal(u.geometry, t.geometry)
+    else:
+        assert u.geometry is None
+
+
+def test_template_rejects_corruption():
+    data = bytearray(_template().to_bytes())
+    with pytest.raises(ValueError, match="checksum"):
+        Template.from_bytes(bytes(data[:40]) + bytes([data[40] ^ 0x01]) + bytes(data[41:]))
+    with pytest.raises(ValueError, match="checksum"):
+        Template.from_bytes(bytes(data[:-8]) + bytes(data[-4:]))     # truncated body
+    with pytest.raises(ValueError, match="Not a face template"):
+        Template.from_bytes(b"JUNK" + bytes(data[4:]))
+
+
+def test_geometry_skip_never_changes_the_verdict():
+    geos = np.concatenate([np.linspace(0.0, 100.0, 21), np.nextafter(float(Config.HIGH_GEOMETRY_THRESHOLD), [0.0, 100.0])])
+    for quality in np.linspace(0.0, 100.0, 41):
+        for sim in np.linspace(-0.2, 1.0, 601):
+            sim, quality = float(sim), float(quality)
+            outcomes = {decide(sim, float(g), quality) for g in geos}
+            if not geometry_can_change(sim, quality):
+                assert len(outcomes) == 1, (sim, quality)
+            else:
+                assert len(outcomes) > 1, (sim, quality)
+
+
+def test_deadline():
+    assert Deadline().remaining() == math.inf and not Deadline().expired()
+    assert Deadline(0).expired() and Deadline(0).remaining() == 0.0
+    assert 9.0 < Deadline(10).remaining() <= 10.0
+
+
+class _Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(verify_v6.time, "sleep", lambda s: None)
+
+
+def test_retry_recovers_from_transient_errors(no_sleep):
+    fn = _Flaky([RuntimeError("ort busy"), OSError("io")])
+    assert _retry("op", fn, tries=3) == "ok" and fn.calls == 3
+    fn = _Flaky([RuntimeError("a"), RuntimeError("b")])
+    with pytest.raises(RuntimeError, match="b"):
+        _retry("op", fn, tries=2)
+    assert fn.calls == 2
+
+
+@pytest.mark.parametrize("error", [e("bad input") for e in NON_TRANSIENT_ERRORS if e is not cv2.error]
+                         + [cv2.error("bad input")])
+def test_retry_does_not_repeat_deterministic_failures(no_sleep, error):
+    fn = _Flaky([error])
+    with pytest.raises(type(error)):
+        _retry("op", fn, tries=3)
+    assert fn.calls == 1
+
+
+def test_retry_respects_the_deadline(no_sleep):
+    fn = _Flaky([])
+    with pytest.raises(DeadlineExceeded):
+        _retry("op", fn, deadline=Deadline(0))
+    assert fn.calls == 0
+    fn = _Flaky([RuntimeError("slow")])
+    with pytest.raises(RuntimeError):                 # the backoff would outlast the budget
+        _retry("op", fn, tries=3, base_delay=5.0, deadline=Deadline(1.0))
+    assert fn.calls == 1
+
+
+class _SceneEngine:
+    """embed() per reference path; embed_all() returns fixed scene faces."""
+
+    def __init__(self, refs, faces, boxes):
+        self.refs, self.faces, self.boxes = refs, faces, boxes
+
+    def embed(self, path):
+        return self.refs[path]
+
+    def embed_all(self, img):
+        return self.faces, self.boxes
+
+
+def _noise_png(path, seed):
+    cv2.imwrite(str(path), np.random.default_rng(seed).integers(0, 256, (200, 200, 3), dtype=np.uint8))
+    return str(path)
+
+
+def test_search_faces_scores_every_face_against_every_reference(tmp_path):
+    e = np.eye(8, dtype=np.float32)
+    refs = {_noise_png(tmp_path / "r0.png", 0): e[0], _noise_png(tmp_path / "r1.png", 1): e[1]}
+    faces = np.stack([e[2], 0.6 * e[0] + 0.8 * e[2], e[1]])
+    boxes = np.array([[0, 0, 60, 60, 0.9], [70, 0, 130, 60, 0.8], [0, 100, 60, 160, 0.7]], np.float32)
+    verifier = UltimateVerifier(_SceneEngine(refs, faces, boxes), memory_budget=False)
+
+    result = verifier.search_faces(list(refs), _noise_png(tmp_path / "scene.png", 2))
+    assert result.error is None and len(result.faces) == 3
+    assert [f.reference for f in result.faces] == [0, 0, 1]
+    np.testing.assert_allclose([f.similarity for f in result.faces], [0.0, 0.6, 1.0], atol=1e-6)
+    assert result.faces[0].verdict == "DIFFERENT"
+    assert result.best_index == 2 and result.best_box == (0, 100, 60, 160)
+    assert result.verdict.startswith("SAME") and result.best_score == pytest.approx(1.0)
+
+
+def test_search_faces_without_faces_is_an_error(tmp_path):
+    ref = _noise_png(tmp_path / "r.png", 0)
+    engine = _SceneEngine({ref: np.eye(8, dtype=np.float32)[0]}, np.zeros((0, 8), np.float32),
+                          np.zeros((0, 5), np.float32))
+    result = UltimateVerifier(engine, memory_budget=False).search_faces([ref], _noise_png(tmp_path / "s.png", 1))
+    assert result.verdict == "ERROR" and result.error == "Face not detected" and result.faces == []
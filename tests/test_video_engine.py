@@ -0,0 +1,78 @@
+"""Strided video reader, IoU tracking and best-frame selection."""
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from video_engine import FrameReader, IoUTracker, Track, VideoVerifier, iou_matrix
+
+
+def _video(path, n):
+    w = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 25.0, (64, 48))
+    if not w.isOpened():
+        pytest.skip("no MJPG encoder in this OpenCV build")
+    for i in range(n):
+        w.write(np.full((48, 64, 3), i * 10, np.uint8))
+    w.release()
+    return str(path)
+
+
+@pytest.mark.parametrize("n, stride, decoded", [(11, 5, [0, 5, 10]), (12, 5, [0, 5, 10]), (4, 1, [0, 1, 2, 3])])
+def test_frames_read_counts_grabbed_frames(tmp_path, n, stride, decoded):
+    reader = FrameReader(_video(tmp_path / "v.avi", n), stride)
+    assert [idx for idx, _, _ in reader] == decoded
+    assert reader.frames_read == n
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [100, 100, 110, 110]], np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [50, 50, 60, 60]], np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1, 1 / 3, 0], [0, 0, 0]], atol=1e-5)
+    assert iou_matrix(a, np.zeros((0, 4), np.float32)).shape == (2, 0)
+    assert iou_matrix(np.zeros((0, 4), np.float32), b).shape == (0, 3)
+
+
+def test_tracker_follows_several_faces_and_expires_lost_ones():
+    tracker = IoUTracker(iou_threshold=0.3, max_missed=1)
+    left, right = np.array([0, 0, 40, 40], np.float32), np.array([200, 0, 240, 40], np.float32)
+    assigned, _ = tracker.update(0, np.stack([left, right]))
+    ids = {di: t.track_id for t, di in assigned}
+    assert sorted(ids.values()) == [1, 2]
+
+    # Both faces move a little and swap order in the detector output.
+    assigned, expired = tracker.update(5, np.stack([right + 4, left + 4]))
+    assert {di: t.track_id for t, di in assigned} == {0: ids[1], 1: ids[0]}
+    assert not expired and all(t.hits == 2 for t in tracker.active)
+
+    # Only the left face stays; a third appears far away.
+    assigned, expired = tracker.update(10, np.stack([left + 8, np.array([400, 0, 440, 40], np.float32)]))
+    assert {di: t.track_id for t, di in assigned} == {0: ids[0], 1: 3}
+    assert not expired
+    _, expired = tracker.update(15, np.stack([left + 8]))
+    assert [t.track_id for t in expired] == [ids[1]] and expired[0].last_frame == 5
+    assert sorted(t.track_id for t in tracker.flush()) == [ids[0], 3]
+
+
+class _Engine:
+    """align() stand-in: the keypoints' bounding box resized to 112x112."""
+
+    def align(self, img, kps):
+        x1, y1 = kps.min(axis=0).astype(int)
+        x2, y2 = kps.max(axis=0).astype(int) + 1
+        return cv2.resize(img[y1:y2, x1:x2], (112, 112), interpolation=cv2.INTER_NEAREST)
+
+
+def test_small_faces_pick_the_sharpest_frame():
+    vv = VideoVerifier(SimpleNamespace(engine=_Engine()), stride=1)
+    box = np.array([100.0, 100.0, 130.0, 130.0])   # 30 px: below analyze_image()'s 50 px floor
+    kps = np.array([[100, 100], [129, 100], [115, 115], [100, 129], [129, 129]], np.float32)
+    flat = np.full((240, 320, 3), 128, np.uint8)
+    sharp = flat.copy()
+    sharp[100:130, 100:130] = (np.indices((30, 30)).sum(axis=0) % 2 * 255)[..., None]
+    track = Track(1, box, 0, 0)
+    for idx, frame in enumerate([flat, sharp, flat]):
+        vv._update_best(track, frame, idx, box, kps)
+    assert track.best_frame == 1
+    assert track.best_quality.score > 0
+    assert track.best_crop.shape == (112, 112, 3)
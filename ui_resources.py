@@ -0,0 +1,84 @@
+"""
+Process-wide resources shared by every dashboard page.
+
+Streamlit keys st.cache_resource by the defining function, so the getters
+live here rather than in app.py: the main page and pages/ then share one
+verifier (one set of models), one audit writer and one job pool.
+init_session() is the per-browser-session setup every page runs first,
+so the session id is the same whichever page a user opens first.
+"""
+import os
+import secrets
+from datetime import datetime
+
+import streamlit as st
+
+import recovery
+from audit_store import AuditStore
+from history import VerificationHistory
+from jobs import JobManager
+from resources import ThreadBudget
+from verify_v6 import InsightEngine, UltimateVerifier
+
+JOB_WORKERS = 1          # verifications run one at a time; each already uses every core
+BATCH_WORKERS = 1        # ZIP batches queue behind each other; each has its own probe pool
+MAX_PROBE_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))   # per ZIP batch
+CLEANUP_INTERVAL = 3600  # seconds between sweeps of expired recovery files
+
+
+@st.cache_resource
+def get_verifier():
+    # Every job and batch-probe thread shares this one engine, so the thread
+    # budget is per session: ORT and OpenCV get the cores, BLAS gets one.
+    budget = ThreadBudget(JOB_WORKERS + BATCH_WORKERS * MAX_PROBE_WORKERS, sessions=1)
+    budget.apply()
+    # Long-lived dashboard process: let idle geometry be unloaded.
+    return UltimateVerifier(InsightEngine(sess_options=budget.session_options()), memory_budget=True)
+
+
+@st.cache_resource
+def get_audit_store():
+    return AuditStore()
+
+
+@st.cache_resource
+def get_job_manager():
+    return JobManager(JOB_WORKERS)
+
+
+@st.cache_resource
+def get_batch_manager():
+    return JobManager(BATCH_WORKERS)
+
+
+@st.cache_resource(ttl=CLEANUP_INTERVAL)
+def cleanup_recovery() -> bool:
+    """Sweep expired recovery files at most once per CLEANUP_INTERVAL per process, not on every rerun."""
+    recovery.cleanup_old_sessions()
+    return True
+
+
+def init_session() -> None:
+    """Session id, resume token, history and operator for this browser session."""
+    cleanup_recovery()
+    if "session_id" not in st.session_state:
+        # First run of this browser session. Resume only the session whose token
+        # is in the URL (?session=..., kept across reloads); a bare URL is a new user.
+        token = st.query_params.get("session")
+        recovered = recovery.restore_session_state(token)
+        st.session_state.session_id = recovered.get("session_id") or datetime.now().strftime("%Y%m%d_%H%M%S")
+        if not recovered:
+            token = secrets.token_urlsafe(12)
+            recovery.save_session_state(token, {"session_id": st.session_state.session_id})
+        st.session_state.resume_token = token
+        st.session_state.history = VerificationHistory(st.session_state.session_id)
+        if not st.session_state.history.total:
+            # Older state files carried the whole history inline.
+            for rec in recovered.get("verification_history", []):
+                st.session_state.history.add(rec)
+    # Pages switch with a fresh URL; keep the token in it so a reload resumes.
+    st.query_params["session"] = st.session_state.resume_token
+    if "history" not in st.session_state:
+        st.session_state.history = VerificationHistory(st.session_state.session_id)
+    if "operator" not in st.session_state:
+        st.session_state.operator = os.environ.get("USER", "")
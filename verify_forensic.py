@@ -1,8 +1,6 @@
 #!/usr/bin/env python3
 import sys
-import time
-from occlusion_engine import OcclusionEngine, cosine_sim
-from verify_v6 import UltimateVerifier
+from verify_v6 import Config, UltimateVerifier
 
 def main():
     if len(sys.argv) < 3:
@@ -12,16 +10,12 @@ def main():
     img1, img2 = sys.argv[1], sys.argv[2]
 
     # 1) Normal full‑face verification (your existing core)
+    # 2) Occlusion‑focused upper‑face score from the same detections
     verifier = UltimateVerifier()
-    core_result = verifier.verify(img1, img2)
+    core_result = verifier.verify(img1, img2, upper_face=True)
 
-    # 2) Occlusion‑focused upper‑face verification
-    occ_engine = OcclusionEngine()
-    t0 = time.time()
-    e1 = occ_engine.embed_upper_face(img1)
-    e2 = occ_engine.embed_upper_face(img2)
-    occ_sim = cosine_sim(e1, e2)
-    occ_time = time.time() - t0
+    occ_sim = core_result.upper_similarity or 0.0
+    occ_time = core_result.timings.get("upper_face", 0.0)
 
     print("\n================= FORENSIC COMBINED REPORT =================")
     print(f"Core similarity        : {core_result.similarity:.3f}")
@@ -32,11 +26,11 @@ def main():
     print("------------------------------------------------------------")
 
     # Simple rigid combination rules
-    if core_result.verdict.startswith("SAME") and occ_sim >= 0.55:
+    if core_result.verdict.startswith("SAME") and occ_sim >= Config.UPPER_SUPPORT_SAME:
         combined = "STRONG_SUPPORT_SAME"
-    elif core_result.verdict == "UNCERTAIN" and occ_sim >= 0.55:
+    elif core_result.verdict == "UNCERTAIN" and occ_sim >= Config.UPPER_SUPPORT_SAME:
         combined = "LIKELY_SAME_NEEDS_REVIEW"
-    elif core_result.verdict == "DIFFERENT" and occ_sim < 0.40:
+    elif core_result.verdict == "DIFFERENT" and occ_sim < Config.UPPER_SUPPORT_DIFFERENT:
         combined = "STRONG_SUPPORT_DIFFERENT"
     else:
         combined = "INCONCLUSIVE_FORENSIC"
@@ -8,14 +8,22 @@ import os
 import sys
 import time
 import json
+import zlib
+import struct
 import logging 
-from dataclasses import dataclass
-from typing import Optional, Tuple
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
 import mediapipe as mp
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
 
 from lz_validators import validate_image_file   
 
@@ -40,8 +48,49 @@ class Config:
     CONTRAST_WEIGHT = 0.20
     RESOLUTION_WEIGHT = 0.20
 
+    MODEL_NAME = "buffalo_l"
     DET_SIZE = (640, 640)
     MIN_DETECTION_CONFIDENCE = 0.5
+    USE_GEOMETRY = True
+    LAZY_GEOMETRY = True       # run FaceMesh only when it can change the verdict
+
+    VIDEO_STRIDE = 5
+    VIDEO_MIN_TRACK_HITS = 1
+    VIDEO_EMBED_BATCH = 32
+    TRACK_IOU_THRESHOLD = 0.3
+    TRACK_MAX_MISSED = 3
+
+    FUSION_MIN_WEIGHT = 1.0
+
+    # verify_forensic.py upper-face support bands. These are the original
+    # cuts; they have not been re-calibrated for the blanked aligned crop
+    # (run evaluate.py with the upper-face config before moving them).
+    UPPER_SUPPORT_SAME = 0.55
+    UPPER_SUPPORT_DIFFERENT = 0.40
+
+    VERIFY_TIMEOUT = None   # seconds per verify() call; None = unbounded
+    PARALLEL_STAGES = False # run the two images' stages concurrently in verify()
+    STAGE_WORKERS = 4       # two per-image chains plus two geometry tasks
+
+    WATCH_WORKERS = 2
+    WATCH_QUEUE_SIZE = 16
+    WATCH_POLL_INTERVAL = 1.0
+    WATCH_MAX_LATENCY = 10.0   # seconds from detection to alert before a warning
+
+    DEDUP_MAX_DISTANCE = 4     # dHash bits; <= 7 (see dedup.py)
+    DEDUP_CACHE_SIZE = 4096    # per-image features / hits kept for reuse
+
+    MEMORY_BUDGET = False      # unload idle models (see resources.ModelEvictor)
+    MODEL_IDLE_SECONDS = 300
+    MIN_AVAILABLE_MB = 512     # below this MemAvailable, evict regardless of idle time
+    EVICT_CHECK_INTERVAL = 10.0
+
+    TILED_DETECTION = False    # detect on overlapping tiles for large images
+    TILE_SIZE = 640            # square tile edge; matches DET_SIZE so tiles are not rescaled
+    TILE_OVERLAP = 0.25        # fraction of TILE_SIZE shared by neighbouring tiles
+    TILE_MIN_SIDE = 1600       # only tile images whose long side exceeds this
+    TILE_WORKERS = 4
+    TILE_NMS_IOU = 0.4
 
     JSON_OUTPUT = False
     VERBOSE = True
@@ -56,23 +105,81 @@ logger = LogManager.get_logger(__name__)
 
 import random  # <-- required for jitter
 
-def _retry(op_name, fn, tries=3, base_delay=0.25):
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """Absolute time budget for one call; timeout=None means unbounded."""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.at = None if timeout is None else time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        if self.at is None:
+            return float("inf")
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# Deterministic failures: retrying the same input cannot succeed.
+NON_TRANSIENT_ERRORS = (
+    ValueError, TypeError, AttributeError, KeyError, IndexError,
+    FileNotFoundError, MemoryError, cv2.error,
+)
+
+
+def _retry(op_name, fn, tries=3, base_delay=0.25, deadline: Optional[Deadline] = None):
     last = None
     for attempt in range(1, tries + 1):
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(f"{op_name}: time budget exhausted")
         try:
             return fn()
         except Exception as e:
             last = e
+            delay = base_delay * (2 ** (attempt - 1)) + random.uniform(0, 0.05)
+            final = (
+                attempt == tries
+                or isinstance(e, NON_TRANSIENT_ERRORS)
+                or (deadline is not None and deadline.remaining() <= delay)
+            )
+            # Full traceback only once, on the final attempt.
             logger.warning(
-                f"{op_name} failed (attempt {attempt}/{tries})",
+                f"{op_name} failed (attempt {attempt}/{tries}): {type(e).__name__}: {e}",
                 extra={"op": op_name, "attempt": attempt, "tries": tries},
-                exc_info=True,
+                exc_info=final,
             )
-            if attempt < tries:
-                time.sleep(base_delay * (2 ** (attempt - 1)) + random.uniform(0,
-0.05))
+            if final:
+                break
+            time.sleep(delay)
     raise last
 
+class StageTimer:
+    """Accumulates wall-clock seconds per named pipeline stage."""
+
+    # Process-wide stage observer (profiling.Profiler) with enter(name) -> token
+    # and exit(name, token); None when not profiling.
+    observer = None
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        obs = StageTimer.observer
+        token = obs.enter(name) if obs is not None else None
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - t
+            if obs is not None:
+                obs.exit(name, token)
+
 # =============================================================================
 # Phase 1: Dependency Check (Fail fast, no algorithm change)
 # =============================================================================
@@ -114,6 +221,120 @@ class VerificationResult:
     q1: ImageQuality
     q2: ImageQuality
     error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)   # stage -> seconds
+    upper_similarity: Optional[float] = None
+    geometry_skipped: bool = False    # similarity alone settled the verdict; geometry_sim is neutral
+
+
+@dataclass
+class ImageFeatures:
+    """Per-image output of the verification pipeline (quality, embedding, geometry)."""
+    path: str
+    quality: ImageQuality
+    embedding: Optional[np.ndarray] = None
+    geometry: Optional[np.ndarray] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    geometry_elapsed: float = 0.0    # share of `elapsed` spent in FaceMesh
+    face_box: Optional[Tuple[int, int, int, int]] = None   # detected face the embedding came from
+
+
+# Template file layout (little-endian), version 1:
+#   header   magic "LZTP", version u8, flags u8 (bit 0: geometry present),
+#            dim u16, created f64, blur/brightness/contrast/score f64,
+#            width/height u32, model-name length u8
+#   body     model name (utf-8), dim x f32 unit embedding,
+#            [4 x f64 geometry]
+#   trailer  CRC-32 of everything before it, u32
+_TEMPLATE_MAGIC = b"LZTP"
+_TEMPLATE_VERSION = 1
+_TEMPLATE_HEADER = struct.Struct("<4sBBHd4d2IB")
+_TEMPLATE_HAS_GEOMETRY = 0x01
+GEOMETRY_DIM = 4
+
+
+@dataclass
+class Template:
+    """
+    An enrolled face: everything verify() needs from the reference image,
+    so later comparisons decode and analyze the probe only.
+    """
+    embedding: np.ndarray             # float32, unit norm
+    quality: ImageQuality
+    geometry: Optional[np.ndarray]    # Geometry.extract vector, None if unavailable
+    model: str                        # recognition model pack; embeddings only compare within one
+    created: float = field(default_factory=time.time)
+
+    def to_bytes(self) -> bytes:
+        emb = np.asarray(self.embedding, dtype="<f4").ravel()
+        model = self.model.encode("utf-8")
+        flags = _TEMPLATE_HAS_GEOMETRY if self.geometry is not None else 0
+        q = self.quality
+        body = _TEMPLATE_HEADER.pack(
+            _TEMPLATE_MAGIC, _TEMPLATE_VERSION, flags, len(emb), self.created,
+            q.blur, q.brightness, q.contrast, q.score, q.resolution[0], q.resolution[1], len(model),
+        ) + model + emb.tobytes()
+        if self.geometry is not None:
+            body += np.asarray(self.geometry, dtype="<f8").tobytes()
+        return body + struct.pack("<I", zlib.crc32(body))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Template":
+        if len(data) < _TEMPLATE_HEADER.size + 4 or data[:4] != _TEMPLATE_MAGIC:
+            raise ValueError("Not a face template")
+        body, (crc,) = data[:-4], struct.unpack("<I", data[-4:])
+        if zlib.crc32(body) != crc:
+            raise ValueError("Template checksum mismatch (corrupt file)")
+        (_, version, flags, dim, created, blur, brightness, contrast, score,
+         width, height, name_len) = _TEMPLATE_HEADER.unpack_from(body)
+        if version != _TEMPLATE_VERSION:
+            raise ValueError(f"Unsupported template version {version}")
+        off = _TEMPLATE_HEADER.size
+        model = body[off:off + name_len].decode("utf-8")
+        off += name_len
+        emb = np.frombuffer(body, dtype="<f4", count=dim, offset=off).astype(np.float32)
+        off += dim * 4
+        geo = None
+        if flags & _TEMPLATE_HAS_GEOMETRY:
+            geo = np.frombuffer(body, dtype="<f8", count=GEOMETRY_DIM, offset=off).astype(np.float64)
+            off += GEOMETRY_DIM * 8
+        if off != len(body):
+            raise ValueError("Template length mismatch")
+        quality = ImageQuality(blur, brightness, contrast, (width, height), score)
+        return cls(emb, quality, geo, model, created)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "Template":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+@dataclass
+class FaceMatch:
+    index: int
+    box: Tuple[int, int, int, int]
+    det_score: float
+    quality: float          # this face's crop; shown per face, not used by decide()
+    similarity: float
+    reference: int
+    verdict: str
+    confidence: float
+
+
+@dataclass
+class MultiFaceResult:
+    faces: List[FaceMatch]
+    best_index: int
+    best_box: Optional[Tuple[int, int, int, int]]
+    best_score: float
+    verdict: str
+    confidence: float
+    execution_time: float
+    error: Optional[str] = None
 
 
 # =============================================================================
@@ -132,6 +353,16 @@ class ImageQualityAnalyzer:
             if img is None:
                 return ImageQuality(0, 0, 0, (0, 0), 0, False, "Unreadable image")
 
+            return ImageQualityAnalyzer.analyze_image(img)
+
+        except Exception as e:
+            logger.error("Quality analysis failed", exc_info=True)
+            return ImageQuality(0, 0, 0, (0, 0), 0, False, str(e))
+
+    @staticmethod
+    def analyze_image(img: np.ndarray) -> ImageQuality:
+        """Same scoring as analyze() on an already decoded BGR image (frames, crops)."""
+        try:
             if img.shape[0] < 50 or img.shape[1] < 50:
                 return ImageQuality(0, 0, 0, img.shape[:2][::-1], 0, False, "Image too small")
 
@@ -174,36 +405,61 @@ class ImageQualityAnalyzer:
 
 class Geometry:
     _mesh = None
+    _lock = threading.RLock()   # FaceMesh is not thread-safe; also fences eviction
+    _last_used = 0.0
+    loads = 0
+    load_seconds = 0.0
 
     @classmethod
     def get_mesh(cls):
         if cls._mesh is None:
+            t = time.perf_counter()
             cls._mesh = mp.solutions.face_mesh.FaceMesh(
                 static_image_mode=True,
                 max_num_faces=1,
                 refine_landmarks=True,
                 min_detection_confidence=Config.MIN_DETECTION_CONFIDENCE,
             )
+            cls.load_seconds = time.perf_counter() - t
+            cls.loads += 1
+            if cls.loads > 1:
+                logger.info(f"Geometry mesh reloaded in {cls.load_seconds:.3f}s",
+                            extra={"model": "geometry", "reload_seconds": round(cls.load_seconds, 4)})
+        cls._last_used = time.monotonic()
         return cls._mesh
 
     @classmethod
     def cleanup(cls):
-        if cls._mesh:
-            cls._mesh.close()
-            cls._mesh = None
+        with cls._lock:
+            if cls._mesh:
+                cls._mesh.close()
+                cls._mesh = None
+
+    @classmethod
+    def loaded(cls) -> bool:
+        return cls._mesh is not None
+
+    @classmethod
+    def idle_for(cls) -> float:
+        return time.monotonic() - cls._last_used
 
     @staticmethod
-    def extract(path: str) -> Optional[np.ndarray]:
-        try:
-            img = cv2.imread(path)
-            if img is None:
-                return None
+    def extract(path: str, deadline: Optional[Deadline] = None) -> Optional[np.ndarray]:
+        img = cv2.imread(path)
+        if img is None:
+            return None
+        return Geometry.extract_image(img, deadline)
 
+    @staticmethod
+    def extract_image(img: np.ndarray, deadline: Optional[Deadline] = None) -> Optional[np.ndarray]:
+        """Geometry vector from an already decoded BGR image."""
+        try:
             h, w, _ = img.shape
             rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-            mesh = Geometry.get_mesh()
-            res = _retry("mediapipe.mesh.process", lambda: mesh.process(rgb), tries=2)
+            with Geometry._lock:
+                mesh = Geometry.get_mesh()
+                res = _retry("mediapipe.mesh.process", lambda: mesh.process(rgb), tries=2, deadline=deadline)
 
             if not res.multi_face_landmarks:
                 return None
@@ -225,6 +481,8 @@ class Geometry:
 
             return np.array([eye_dist, ratio, wh, symmetry])
 
+        except DeadlineExceeded:
+            raise
         except Exception:
             logger.error("Geometry extraction failed", exc_info=True)
             return None
@@ -242,23 +500,201 @@ def geometry_similarity(g1, g2) -> float:
 # InsightFace Engine
 # =============================================================================
 
+def nms(dets: np.ndarray, iou: float) -> List[int]:
+    """Greedy non-maximum suppression over N x 5 (x1, y1, x2, y2, score); indices by score."""
+    x1, y1, x2, y2, scores = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3], dets[:, 4]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        iw = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        ih = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = iw * ih
+        order = rest[inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9) <= iou]
+    return keep
+
+
 class InsightEngine:
-    def __init__(self):
+    def __init__(self, model_name: Optional[str] = None, allowed_modules: Optional[List[str]] = None,
+                 sess_options=None):
         logger.info("Initializing InsightFace engine")
-        self.app = FaceAnalysis(name="buffalo_l", providers=["CPUExecutionProvider"])
+        self.model_name = model_name or Config.MODEL_NAME
+        self._pool = None                 # tile workers, created on first tiled image
+        self._pool_lock = threading.Lock()
+        self.app = FaceAnalysis(name=self.model_name, providers=["CPUExecutionProvider"],
+                                allowed_modules=allowed_modules)
+        if sess_options is not None:
+            # insightface's model_zoo does not forward sess_options to ORT, so
+            # rebuild each session from the same file with the given threading.
+            import onnxruntime
+            for model in self.app.models.values():
+                model.session = onnxruntime.InferenceSession(
+                    model.model_file, sess_options=sess_options,
+                    providers=model.session.get_providers(),
+                )
         # Optional: det_thresh can be tuned, but left unchanged here.
         _retry("insightface.prepare", lambda: self.app.prepare(ctx_id=0, 
         det_size=Config.DET_SIZE), tries=3)
 
     def embed(self, path: str):
+        found = self.detect_face(path)
+        if found is None:
+            return None
+        return found[1].embedding
+
+    def detect_face(self, path: str, deadline: Optional[Deadline] = None,
+                    timer: Optional[StageTimer] = None, label: str = "tiled_detect"):
+        """(decoded image, first face with embedding and keypoints) or None."""
         img = cv2.imread(path)
         if img is None:
             return None
+        return self.detect_face_image(img, deadline, timer, label)
+
+    def detect_face_image(self, img: np.ndarray, deadline: Optional[Deadline] = None,
+                          timer: Optional[StageTimer] = None, label: str = "tiled_detect"):
+        """
+        Large images go through detect_tiled(); its latency is recorded under
+        `label` in `timer`, so callers can report it per image.
+        """
+        if not self.use_tiles(img):
+            faces = _retry("insightface.get", lambda: self.app.get(img), tries=2, deadline=deadline)
+            if not faces:
+                return None
+            return img, faces[0]
 
-        faces = _retry("insightface.get", lambda: self.app.get(img), tries=2)
-        if not faces:
+        with (timer or StageTimer()).stage(label):
+            dets, kpss = self.detect_tiled(img, deadline)
+        if not len(dets):
             return None
-        return faces[0].embedding
+        # Highest score first, as FaceAnalysis.get orders them; recognition
+        # aligns from the full-resolution image, not from a tile.
+        face = Face(bbox=dets[0, :4], kps=kpss[0], det_score=float(dets[0, 4]))
+        self.app.models["recognition"].get(img, face)
+        return img, face
+
+    def embed_all(self, img: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Every face in one pass: (N x D unit embeddings, N x 5 boxes with score)."""
+        dets, kpss = self.detect(img)
+        keep = dets[:, 4] >= Config.MIN_DETECTION_CONFIDENCE
+        dets, kpss = dets[keep], kpss[keep]
+        if not len(dets):
+            return np.zeros((0, 0), np.float32), dets
+        E = np.asarray(self.embed_aligned(self.align(img, k) for k in kpss), dtype=np.float32)
+        E /= np.maximum(np.linalg.norm(E, axis=1, keepdims=True), 1e-12)
+        return E, dets
+
+    def detect(self, img: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Detector only: (N x 5 boxes with score, N x 5 x 2 keypoints)."""
+        if self.use_tiles(img):
+            return self.detect_tiled(img)
+        return _retry(
+            "insightface.detect",
+            lambda: self.app.det_model.detect(img, max_num=0, metric="default"),
+            tries=2,
+        )
+
+    # -------------------------------------------------------------------------
+    # Tiled detection
+    # -------------------------------------------------------------------------
+    # The detector downscales every input to DET_SIZE, so in a 4000 px frame a
+    # 40 px face shrinks to 6 px and is lost. Tiling at detector resolution
+    # keeps small faces at native size. A face cut by an interior tile edge is
+    # dropped from that tile (the overlap shows it whole in a neighbour), and
+    # one extra full-frame pass catches faces larger than the overlap.
+
+    @staticmethod
+    def use_tiles(img: np.ndarray) -> bool:
+        return Config.TILED_DETECTION and max(img.shape[:2]) > Config.TILE_MIN_SIDE
+
+    @staticmethod
+    def tile_grid(h: int, w: int, size: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+        """(x0, y0, x1, y1) tiles covering the image; edge tiles are shifted inwards, not shrunk."""
+        step = max(1, int(size * (1 - overlap)))
+
+        def starts(n):
+            if n <= size:
+                return [0]
+            s = list(range(0, n - size, step))
+            return s + [n - size]
+
+        return [(x, y, min(x + size, w), min(y + size, h)) for y in starts(h) for x in starts(w)]
+
+    def _tile_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=Config.TILE_WORKERS, thread_name_prefix="tile-detect")
+            return self._pool
+
+    def _detect_tile(self, img: np.ndarray, box: Optional[Tuple[int, int, int, int]],
+                     deadline: Optional[Deadline] = None):
+        """Detector on one tile, or on the whole frame when `box` is None."""
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded("tiled detection: time budget exhausted")
+        if box is None:
+            return self.app.det_model.detect(img, max_num=0, metric="default")
+        x0, y0, x1, y1 = box
+        h, w = img.shape[:2]
+        dets, kpss = self.app.det_model.detect(img[y0:y1, x0:x1], max_num=0, metric="default")
+        if not len(dets):
+            return dets, kpss
+        # Drop faces touching a tile edge that is not also an image edge.
+        m = 2.0
+        cut = np.zeros(len(dets), bool)
+        if x0 > 0:
+            cut |= dets[:, 0] <= m
+        if y0 > 0:
+            cut |= dets[:, 1] <= m
+        if x1 < w:
+            cut |= dets[:, 2] >= x1 - x0 - m
+        if y1 < h:
+            cut |= dets[:, 3] >= y1 - y0 - m
+        dets, kpss = dets[~cut].copy(), kpss[~cut].copy()
+        dets[:, :4] += (x0, y0, x0, y0)
+        kpss += (x0, y0)
+        return dets, kpss
+
+    def detect_tiled(self, img: np.ndarray, deadline: Optional[Deadline] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        detect() over overlapping tiles plus one full-frame pass, merged by NMS.
+        Each tile checks `deadline` before it runs; once it expires, tiles not
+        yet started are cancelled and DeadlineExceeded is raised.
+        """
+        t = time.perf_counter()
+        h, w = img.shape[:2]
+        tiles = self.tile_grid(h, w, Config.TILE_SIZE, Config.TILE_OVERLAP)
+        pool = self._tile_pool()
+        futures = [pool.submit(self._detect_tile, img, box, deadline) for box in [None] + tiles]
+        try:
+            parts = [f.result(timeout=None if deadline is None or deadline.at is None else deadline.remaining())
+                     for f in futures]
+        except FutureTimeout:
+            raise DeadlineExceeded("tiled detection: time budget exhausted")
+        finally:
+            for f in futures:
+                f.cancel()
+
+        dets = np.concatenate([d for d, _ in parts]).astype(np.float32, copy=False)
+        kpss = np.concatenate([k.reshape(-1, 5, 2) for _, k in parts]).astype(np.float32, copy=False)
+        keep = nms(dets, Config.TILE_NMS_IOU)
+        dets, kpss = dets[keep], kpss[keep]
+        logger.debug(
+            "Tiled detection",
+            extra={"size": f"{w}x{h}", "tiles": len(tiles), "faces": len(dets),
+                   "seconds": round(time.perf_counter() - t, 4)},
+        )
+        return dets, kpss
+
+    def align(self, img: np.ndarray, kps: np.ndarray) -> np.ndarray:
+        """112x112 ArcFace-aligned crop from five-point keypoints."""
+        return face_align.norm_crop(img, landmark=kps, image_size=112)
+
+    def embed_aligned(self, crops) -> np.ndarray:
+        """Recognition only, batched over aligned crops; returns N x D."""
+        rec = self.app.models["recognition"]
+        return _retry("insightface.rec", lambda: rec.get_feat(list(crops)), tries=2)
 
 
 # =============================================================================
@@ -273,59 +709,386 @@ def cosine_sim(a, b) -> float:
         return 0.0
     return float(np.dot(a, b) / (na * nb))
 
+
+def decide(sim: float, geo: float, quality: float) -> Tuple[str, float]:
+    """Adaptive-threshold decision shared by verify() and the offline tools."""
+    th = Config.BASE_THRESHOLD
+    if quality < Config.LOW_QUALITY_THRESHOLD:
+        th -= Config.QUALITY_ADJUSTMENT
+    if geo > Config.HIGH_GEOMETRY_THRESHOLD:
+        th += Config.GEOMETRY_ADJUSTMENT
+
+    if sim > th + Config.HIGH_CONF_DELTA:
+        verdict, conf = "SAME_HIGH", min(95, 70 + sim * 30)
+    elif sim > th:
+        verdict, conf = "SAME_MEDIUM", min(85, 60 + sim * 25)
+    elif sim > th - Config.UNCERTAIN_DELTA:
+        verdict, conf = "UNCERTAIN", 50
+    else:
+        verdict, conf = "DIFFERENT", min(90, 70 - sim * 40)
+    return verdict, conf
+
+
+def geometry_can_change(sim: float, quality: float) -> bool:
+    """
+    Whether geometry could move decide()'s output for this similarity.
+    Geometry only raises the threshold by GEOMETRY_ADJUSTMENT, so decide at
+    both extremes: if they agree, FaceMesh need not run.
+    """
+    return decide(sim, 0.0, quality) != decide(sim, 100.0, quality)
+
+
 class UltimateVerifier:
 
-    def __init__(self):
+    def __init__(self, engine: Optional[InsightEngine] = None, memory_budget: Optional[bool] = None):
         logger.info("ULTIMATE FACE VERIFICATION v6.2")
-        self.engine = InsightEngine()
-
-    def verify(self, img1: str, img2: str) -> VerificationResult:
+        self.engine = engine or InsightEngine()
+        self._occlusion = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        # Memory-budget mode: rarely used models are unloaded when idle or
+        # under memory pressure and reloaded on next use. The core engine
+        # stays resident; the upper-face engine shares it (nothing to free).
+        self.evictor = None
+        if Config.MEMORY_BUDGET if memory_budget is None else memory_budget:
+            from resources import ModelEvictor
+            self.evictor = ModelEvictor(Config.MODEL_IDLE_SECONDS, Config.MIN_AVAILABLE_MB,
+                                        Config.EVICT_CHECK_INTERVAL)
+            self.evictor.register("geometry", Geometry.loaded, Geometry.idle_for, Geometry.cleanup,
+                                  lambda: Geometry.load_seconds)
+            self.evictor.start()
+
+    @property
+    def occlusion(self):
+        """Upper-face engine sharing this verifier's models (created on first use)."""
+        if self._occlusion is None:
+            from occlusion_engine import OcclusionEngine
+            self._occlusion = OcclusionEngine(engine=self.engine)
+        return self._occlusion
+
+    def verify(
+        self,
+        img1: str,
+        img2: str,
+        upper_face: bool = False,
+        timeout: Optional[float] = None,
+        parallel: Optional[bool] = None,
+    ) -> VerificationResult:
+        """
+        upper_face=True also scores the occlusion (upper-face) embedding,
+        reusing the faces found by the core pass: one extra recognition
+        forward per image, no second detection.
+
+        timeout (seconds, default Config.VERIFY_TIMEOUT) bounds the whole
+        call: the remaining budget is checked between stages and handed to
+        each stage's retries. When it runs out a TIMEOUT result is returned.
+
+        parallel (default Config.PARALLEL_STAGES) runs the two images'
+        stages concurrently; see _verify_parallel().
+        """
         t0 = time.time()
+        timer = StageTimer()
+        deadline = Deadline(timeout if timeout is not None else Config.VERIFY_TIMEOUT)
+        run = self._verify_parallel if (Config.PARALLEL_STAGES if parallel is None else parallel) else self._verify
+        try:
+            return run(img1, img2, upper_face, t0, timer, deadline)
+        except DeadlineExceeded as e:
+            return self._timeout(str(e), t0, dict(timer.timings), deadline)
+
+    def _verify(self, img1, img2, upper_face, t0, timer, deadline) -> VerificationResult:
 
         # ---------------------------------------------------------------------
         # Phase 2: Input validation (defensive only; algorithm unchanged)
         # ---------------------------------------------------------------------
-        ok1, msg1 = validate_image_file(img1)
-        ok2, msg2 = validate_image_file(img2)
+        with timer.stage("validate"):
+            ok1, msg1 = validate_image_file(img1)
+            ok2, msg2 = validate_image_file(img2)
         if not ok1 or not ok2:
             q1 = ImageQualityAnalyzer.analyze(img1)
             q2 = ImageQualityAnalyzer.analyze(img2)
             msg = f"Image invalid: img1={msg1}, img2={msg2}"
-            return self._error(msg, t0, q1, q2)
+            return self._error(msg, t0, q1, q2, timer.timings)
         # ---------------------------------------------------------------------
 
-        q1 = ImageQualityAnalyzer.analyze(img1)
-        q2 = ImageQualityAnalyzer.analyze(img2)
+        if deadline.expired():
+            return self._timeout("budget exhausted before 'quality'", t0, timer.timings, deadline)
+        with timer.stage("quality"):
+            q1 = ImageQualityAnalyzer.analyze(img1)
+            q2 = ImageQualityAnalyzer.analyze(img2)
 
         if not q1.valid or not q2.valid:
-            return self._error("Quality failure", t0, q1, q2)
+            return self._error("Quality failure", t0, q1, q2, timer.timings)
+
+        if deadline.expired():
+            return self._timeout("budget exhausted before 'embed'", t0, timer.timings, deadline, q1, q2)
+        with timer.stage("embed"):
+            d1 = self.engine.detect_face(img1, deadline, timer, "tiled_detect_img1")
+            d2 = self.engine.detect_face(img2, deadline, timer, "tiled_detect_img2")
+        if d1 is None or d2 is None:
+            return self._error("Face not detected", t0, q1, q2, timer.timings)
+        e1, e2 = d1[1].embedding, d2[1].embedding
+
+        upper = None
+        if upper_face and not deadline.expired():
+            with timer.stage("upper_face"):
+                try:
+                    u = self.occlusion.embed_aligned_upper([(d1[0], d1[1].kps), (d2[0], d2[1].kps)])
+                    upper = float(np.dot(u[0], u[1]))
+                except Exception:
+                    # Supplementary signal only; never fail the core verdict on it.
+                    logger.warning("Upper-face embedding failed", exc_info=True)
+
+        sim = cosine_sim(e1, e2)
+        quality = (q1.score + q2.score) / 2
+        skip = Config.USE_GEOMETRY and Config.LAZY_GEOMETRY and not geometry_can_change(sim, quality)
 
-        e1 = self.engine.embed(img1)
-        e2 = self.engine.embed(img2)
-        if e1 is None or e2 is None:
-            return self._error("Face not detected", t0, q1, q2)
+        g1 = g2 = None
+        if Config.USE_GEOMETRY and not skip:
+            if deadline.expired():
+                return self._timeout("budget exhausted before 'geometry'", t0, timer.timings, deadline, q1, q2)
+            with timer.stage("geometry"):
+                g1 = Geometry.extract(img1, deadline)
+                g2 = Geometry.extract(img2, deadline)
 
-        g1 = Geometry.extract(img1)
-        g2 = Geometry.extract(img2)
+        with timer.stage("decision"):
+            geo = geometry_similarity(g1, g2)
+            verdict, conf = decide(sim, geo, quality)
+
+        return VerificationResult(
+            verdict=verdict,
+            confidence=round(conf, 1),
+            similarity=sim,
+            geometry_sim=geo,
+            quality_avg=quality,
+            execution_time=time.time() - t0,
+            q1=q1,
+            q2=q2,
+            error=None,
+            timings=timer.timings,
+            upper_similarity=upper,
+            geometry_skipped=skip,
+        )
+
+    def _stage_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=Config.STAGE_WORKERS, thread_name_prefix="verify-stage")
+            return self._pool
+
+    @staticmethod
+    def _await(fut, deadline: Deadline, what: str):
+        try:
+            return fut.result(timeout=None if deadline.at is None else deadline.remaining())
+        except DeadlineExceeded:
+            raise
+        except FutureTimeout:
+            raise DeadlineExceeded(f"{what}: time budget exhausted")
+
+    def _verify_parallel(self, img1, img2, upper_face, t0, timer, deadline) -> VerificationResult:
+        """
+        _verify() as a small task graph. Per image, on the stage pool:
+
+            decode -> quality -> embed
+                   `-> geometry
+
+        OpenCV and ONNX Runtime release the GIL, so the two chains overlap
+        and wall time approaches the slower chain. Geometry starts as soon
+        as its image is decoded (the FaceMesh lock serializes the two
+        passes, but they overlap detection). With lazy geometry it is
+        speculative: when similarity settles the verdict, geometry that has
+        not started is cancelled and running work is not waited for.
+        Running work is not free, though: it keeps its pool worker and the
+        FaceMesh lock until it finishes, so the next call's geometry can
+        queue behind it. STAGE_WORKERS leaves room for both chains of the
+        next call beside two such stragglers.
+        Timings are per image (quality_img1, embed_img2, ...).
+        """
+        with timer.stage("validate"):
+            ok1, msg1 = validate_image_file(img1)
+            ok2, msg2 = validate_image_file(img2)
+        if not ok1 or not ok2:
+            q1 = ImageQualityAnalyzer.analyze(img1)
+            q2 = ImageQualityAnalyzer.analyze(img2)
+            msg = f"Image invalid: img1={msg1}, img2={msg2}"
+            return self._error(msg, t0, q1, q2, dict(timer.timings))
+
+        pool = self._stage_pool()
+        geo_futs = {}
+
+        def chain(i, path):
+            with timer.stage(f"decode_img{i}"):
+                img = cv2.imread(path)
+            if img is None:
+                return None, ImageQuality(0, 0, 0, (0, 0), 0, False, "Unreadable image"), None
+            if Config.USE_GEOMETRY:
+                geo_futs[i] = pool.submit(self._timed_geometry, timer, i, img, deadline)
+            with timer.stage(f"quality_img{i}"):
+                q = ImageQualityAnalyzer.analyze_image(img)
+            if not q.valid or deadline.expired():
+                return img, q, None
+            with timer.stage(f"embed_img{i}"):
+                found = self.engine.detect_face_image(img, deadline, timer, f"tiled_detect_img{i}")
+            return img, q, found
+
+        chains = [pool.submit(chain, 1, img1), pool.submit(chain, 2, img2)]
+        try:
+            (_, q1, d1), (_, q2, d2) = [self._await(f, deadline, "per-image stages") for f in chains]
+        except Exception:
+            for f in geo_futs.values():
+                f.cancel()
+            raise
+
+        if not q1.valid or not q2.valid:
+            return self._error("Quality failure", t0, q1, q2, dict(timer.timings))
+        if deadline.expired():
+            return self._timeout("budget exhausted during 'embed'", t0, dict(timer.timings), deadline, q1, q2)
+        if d1 is None or d2 is None:
+            return self._error("Face not detected", t0, q1, q2, dict(timer.timings))
+        e1, e2 = d1[1].embedding, d2[1].embedding
 
         sim = cosine_sim(e1, e2)
-        geo = geometry_similarity(g1, g2)
         quality = (q1.score + q2.score) / 2
-
-        th = Config.BASE_THRESHOLD
-        if quality < Config.LOW_QUALITY_THRESHOLD:
-            th -= Config.QUALITY_ADJUSTMENT
-        if geo > Config.HIGH_GEOMETRY_THRESHOLD:
-            th += Config.GEOMETRY_ADJUSTMENT
-
-        if sim > th + Config.HIGH_CONF_DELTA:
-            verdict, conf = "SAME_HIGH", min(95, 70 + sim * 30)
-        elif sim > th:
-            verdict, conf = "SAME_MEDIUM", min(85, 60 + sim * 25)
-        elif sim > th - Config.UNCERTAIN_DELTA:
-            verdict, conf = "UNCERTAIN", 50
+        skip = Config.USE_GEOMETRY and Config.LAZY_GEOMETRY and not geometry_can_change(sim, quality)
+
+        upper = None
+        if upper_face and not deadline.expired():
+            with timer.stage("upper_face"):
+                try:
+                    u = self.occlusion.embed_aligned_upper([(d1[0], d1[1].kps), (d2[0], d2[1].kps)])
+                    upper = float(np.dot(u[0], u[1]))
+                except Exception:
+                    logger.warning("Upper-face embedding failed", exc_info=True)
+
+        g1 = g2 = None
+        if Config.USE_GEOMETRY and not skip:
+            with timer.stage("geometry_wait"):
+                g1 = self._await(geo_futs[1], deadline, "geometry")
+                g2 = self._await(geo_futs[2], deadline, "geometry")
         else:
-            verdict, conf = "DIFFERENT", min(90, 70 - sim * 40)
+            for f in geo_futs.values():
+                f.cancel()
+
+        with timer.stage("decision"):
+            geo = geometry_similarity(g1, g2)
+            verdict, conf = decide(sim, geo, quality)
+
+        return VerificationResult(
+            verdict=verdict,
+            confidence=round(conf, 1),
+            similarity=sim,
+            geometry_sim=geo,
+            quality_avg=quality,
+            execution_time=time.time() - t0,
+            q1=q1,
+            q2=q2,
+            error=None,
+            timings=dict(timer.timings),   # geometry may still be adding its entry
+            upper_similarity=upper,
+            geometry_skipped=skip,
+        )
+
+    @staticmethod
+    def _timed_geometry(timer: StageTimer, i: int, img: np.ndarray, deadline: Deadline):
+        with timer.stage(f"geometry_img{i}"):
+            return Geometry.extract_image(img, deadline)
+
+    def extract(self, path: str) -> ImageFeatures:
+        """Run the per-image half of verify() so features can be cached and paired later."""
+        t0 = time.time()
+        ok, msg = validate_image_file(path)
+        if not ok:
+            q = ImageQualityAnalyzer.analyze(path)
+            return ImageFeatures(path, q, error=f"Image invalid: {msg}", elapsed=time.time() - t0)
+        return self.extract_image(cv2.imread(path), path, t0)
+
+    def extract_image(self, img: np.ndarray, name: str = "<array>", t0: Optional[float] = None) -> ImageFeatures:
+        """extract() on an already decoded and validated BGR image (uploads, archive members)."""
+        t0 = t0 or time.time()
+        timer = StageTimer()
+        with timer.stage("quality"):
+            q = ImageQualityAnalyzer.analyze_image(img)
+        if not q.valid:
+            return ImageFeatures(name, q, error="Quality failure", elapsed=time.time() - t0)
+
+        with timer.stage("embed"):
+            found = self.engine.detect_face_image(img, timer=timer)
+        if found is None:
+            return ImageFeatures(name, q, error="Face not detected", elapsed=time.time() - t0)
+
+        # Eager: features are cached per image and paired later, so whether
+        # geometry matters is not known yet.
+        with timer.stage("geometry"):
+            geo = Geometry.extract_image(img) if Config.USE_GEOMETRY else None
+        return ImageFeatures(name, q, found[1].embedding, geo, None, time.time() - t0,
+                             timer.timings["geometry"], tuple(int(v) for v in found[1].bbox[:4]))
+
+    # -------------------------------------------------------------------------
+    # Enrolled templates
+    # -------------------------------------------------------------------------
+
+    def enroll(self, image) -> Template:
+        """
+        Template from a reference image (path or decoded BGR array). Geometry
+        is always extracted: whether a later comparison needs it is unknown.
+        Raises ValueError when the image cannot be enrolled.
+        """
+        feats = self.extract_image(image) if isinstance(image, np.ndarray) else self.extract(image)
+        if feats.error:
+            raise ValueError(f"Cannot enroll {feats.path}: {feats.error}")
+        emb = np.asarray(feats.embedding, dtype=np.float32)
+        emb /= max(float(np.linalg.norm(emb)), 1e-12)
+        return Template(emb, feats.quality, feats.geometry, self.engine.model_name)
+
+    def verify_template(self, template: Template, probe: str,
+                        timeout: Optional[float] = None) -> VerificationResult:
+        """verify() against an enrolled template: one image of work instead of two."""
+        t0 = time.time()
+        timer = StageTimer()
+        deadline = Deadline(timeout if timeout is not None else Config.VERIFY_TIMEOUT)
+        try:
+            return self._verify_template(template, probe, t0, timer, deadline)
+        except DeadlineExceeded as e:
+            return self._timeout(str(e), t0, timer.timings, deadline, template.quality)
+
+    def _verify_template(self, template, probe, t0, timer, deadline) -> VerificationResult:
+        q1 = template.quality
+        if template.model != self.engine.model_name:
+            return self._error(f"Template model {template.model} does not match engine {self.engine.model_name}",
+                               t0, q1, ImageQualityAnalyzer.analyze(probe))
+        with timer.stage("validate"):
+            ok, msg = validate_image_file(probe)
+        if not ok:
+            return self._error(f"Image invalid: probe={msg}", t0, q1, ImageQualityAnalyzer.analyze(probe),
+                               timer.timings)
+
+        img = cv2.imread(probe)
+        with timer.stage("quality"):
+            q2 = ImageQualityAnalyzer.analyze_image(img)
+        if not q2.valid:
+            return self._error("Quality failure", t0, q1, q2, timer.timings)
+
+        if deadline.expired():
+            return self._timeout("budget exhausted before 'embed'", t0, timer.timings, deadline, q1, q2)
+        with timer.stage("embed"):
+            found = self.engine.detect_face_image(img, deadline, timer, "tiled_detect_img2")
+        if found is None:
+            return self._error("Face not detected", t0, q1, q2, timer.timings)
+
+        sim = cosine_sim(template.embedding, found[1].embedding)
+        quality = (q1.score + q2.score) / 2
+        skip = Config.USE_GEOMETRY and Config.LAZY_GEOMETRY and not geometry_can_change(sim, quality)
+
+        g2 = None
+        if Config.USE_GEOMETRY and not skip and template.geometry is not None:
+            if deadline.expired():
+                return self._timeout("budget exhausted before 'geometry'", t0, timer.timings, deadline, q1, q2)
+            with timer.stage("geometry"):
+                g2 = Geometry.extract_image(img, deadline)
+
+        with timer.stage("decision"):
+            geo = geometry_similarity(template.geometry, g2)
+            verdict, conf = decide(sim, geo, quality)
 
         return VerificationResult(
             verdict=verdict,
@@ -337,9 +1100,105 @@ class UltimateVerifier:
             q1=q1,
             q2=q2,
             error=None,
+            timings=timer.timings,
+            geometry_skipped=skip,
         )
 
-    def _error(self, msg, t0, q1, q2):
+    def verify_features(self, f1: ImageFeatures, f2: ImageFeatures) -> VerificationResult:
+        """
+        The decision half of verify() on features from extract(), so one
+        image's features can serve every pair it appears in. execution_time
+        counts the extraction time carried by both features.
+        """
+        t0 = time.time() - f1.elapsed - f2.elapsed
+        timings = {"extract": f1.elapsed + f2.elapsed}
+        if f1.error or f2.error:
+            return self._error(f1.error or f2.error, t0, f1.quality, f2.quality, timings)
+
+        sim = cosine_sim(f1.embedding, f2.embedding)
+        geo = geometry_similarity(f1.geometry, f2.geometry)
+        quality = (f1.quality.score + f2.quality.score) / 2
+        verdict, conf = decide(sim, geo, quality)
+        return VerificationResult(
+            verdict=verdict,
+            confidence=round(conf, 1),
+            similarity=sim,
+            geometry_sim=geo,
+            quality_avg=quality,
+            execution_time=time.time() - t0,
+            q1=f1.quality,
+            q2=f2.quality,
+            error=None,
+            timings=timings,
+        )
+
+    def search_faces(self, references: Sequence[str], scene: str) -> MultiFaceResult:
+        """Embed every face in `scene` once and score all of them against all references."""
+        t0 = time.time()
+        for path in list(references) + [scene]:
+            ok, msg = validate_image_file(path)
+            if not ok:
+                return self._multi_error(f"Image invalid: {path}={msg}", t0)
+
+        ref_embs, ref_q = [], []
+        for path in references:
+            e = self.engine.embed(path)
+            if e is None:
+                return self._multi_error(f"Face not detected: {path}", t0)
+            ref_embs.append(e)
+            ref_q.append(ImageQualityAnalyzer.analyze(path).score)
+        R = np.asarray(ref_embs, dtype=np.float32)
+        R /= np.maximum(np.linalg.norm(R, axis=1, keepdims=True), 1e-12)
+
+        img = cv2.imread(scene)
+        F, dets = self.engine.embed_all(img)
+        if not len(dets):
+            return self._multi_error("Face not detected", t0)
+        # decide() is calibrated on whole-image quality, as verify() passes;
+        # a small face crop scores low on resolution alone.
+        scene_q = ImageQualityAnalyzer.analyze_image(img).score
+
+        S = F @ R.T
+        best_ref = S.argmax(axis=1)
+        best_sim = S[np.arange(len(F)), best_ref]
+
+        h, w = img.shape[:2]
+        faces = []
+        for i, (det, r, sim) in enumerate(zip(dets, best_ref, best_sim)):
+            x1, y1 = max(0, int(det[0])), max(0, int(det[1]))
+            x2, y2 = min(w, int(det[2])), min(h, int(det[3]))
+            q = ImageQualityAnalyzer.analyze_image(img[y1:y2, x1:x2]).score if x2 > x1 and y2 > y1 else 0.0
+            verdict, conf = decide(float(sim), 50.0, (ref_q[r] + scene_q) / 2)
+            faces.append(FaceMatch(i, (x1, y1, x2, y2), float(det[4]), q, float(sim), int(r),
+                                   verdict, round(conf, 1)))
+
+        best = faces[int(best_sim.argmax())]
+        return MultiFaceResult(faces, best.index, best.box, best.similarity,
+                               best.verdict, best.confidence, time.time() - t0)
+
+    def _multi_error(self, msg, t0):
+        return MultiFaceResult([], -1, None, 0.0, "ERROR", 0, time.time() - t0, msg)
+
+    def _timeout(self, msg, t0, timings, deadline: Deadline, q1=None, q2=None):
+        logger.warning(
+            f"Verification timed out: {msg}",
+            extra={"timeout": deadline.timeout, "timings": {k: round(v, 4) for k, v in timings.items()}},
+        )
+        empty = ImageQuality(0, 0, 0, (0, 0), 0, False, "Not analyzed (timeout)")
+        return VerificationResult(
+            verdict="TIMEOUT",
+            confidence=0,
+            similarity=0,
+            geometry_sim=0,
+            quality_avg=0,
+            execution_time=time.time() - t0,
+            q1=q1 or empty,
+            q2=q2 or empty,
+            error=f"Timeout after {deadline.timeout}s: {msg}",
+            timings=timings,
+        )
+
+    def _error(self, msg, t0, q1, q2, timings=None):
         return VerificationResult(
             verdict="ERROR",
             confidence=0,
@@ -350,10 +1209,15 @@ class UltimateVerifier:
             q1=q1,
             q2=q2,
             error=msg,
+            timings=timings or {},
         )
 
     def __del__(self):
         try:
+            if getattr(self, "evictor", None) is not None:
+                self.evictor.stop()
+            if getattr(self, "_pool", None) is not None:
+                self._pool.shutdown(wait=False)
             Geometry.cleanup()
         except Exception:
             pass
@@ -374,7 +1238,12 @@ def print_formatted(result: VerificationResult):
         print(f"Image 1 Quality      : {result.q1.score}/100")
         print(f"Image 2 Quality      : {result.q2.score}/100")
         print(f"Embedding Similarity : {result.similarity:.3f}")
-        print(f"Geometry Similarity  : {result.geometry_sim:.1f}%")
+        if result.geometry_skipped:
+            print("Geometry Similarity  : skipped (cannot change verdict)")
+        else:
+            print(f"Geometry Similarity  : {result.geometry_sim:.1f}%")
+        if result.upper_similarity is not None:
+            print(f"Upper-face Similarity: {result.upper_similarity:.3f}")
         print("-" * 80)
         print(f"VERDICT              : {result.verdict}")
         print(f"CONFIDENCE           : {result.confidence:.1f}%")
@@ -383,8 +1252,8 @@ def print_formatted(result: VerificationResult):
     print("=" * 80 + "\n")
 
 
-def print_json(result: VerificationResult):
-    output = {
+def result_to_dict(result: VerificationResult) -> dict:
+    return {
         "verdict": result.verdict,
         "confidence": result.confidence,
         "similarity": round(result.similarity, 3),
@@ -393,43 +1262,286 @@ def print_json(result: VerificationResult):
         "execution_time": round(result.execution_time, 2),
         "image1_quality": result.q1.score,
         "image2_quality": result.q2.score,
+        "upper_face_similarity": None if result.upper_similarity is None else round(result.upper_similarity, 3),
+        "geometry_skipped": result.geometry_skipped,
+        "timings": {k: round(v, 4) for k, v in result.timings.items()},
         "error": result.error,
     }
-    print(json.dumps(output, indent=2))
+
+
+def print_json(result: VerificationResult):
+    print(json.dumps(result_to_dict(result), indent=2))
+
+
+def print_video(result, as_json: bool = False):
+    if as_json:
+        output = {
+            "reference": result.reference,
+            "video": result.video,
+            "fps": round(result.fps, 2),
+            "frames_read": result.frames_read,
+            "frames_detected": result.frames_detected,
+            "execution_time": round(result.execution_time, 2),
+            "tracks": [
+                {**t.__dict__, "similarity": round(t.similarity, 3)} for t in result.tracks
+            ],
+            "error": result.error,
+        }
+        print(json.dumps(output, indent=2))
+        return
+
+    print("\n" + "=" * 80)
+    print("ULTIMATE FACE VERIFICATION v6.2 (VIDEO)")
+    print("=" * 80)
+    if result.error:
+        print(f"❌ ERROR: {result.error}")
+    else:
+        print(f"Frames read / detected : {result.frames_read} / {result.frames_detected}")
+        print(f"Tracks                 : {len(result.tracks)}")
+        print("-" * 80)
+        for t in sorted(result.tracks, key=lambda t: -t.similarity):
+            print(
+                f"#{t.track_id:<4} {t.start_time:>8.2f}s-{t.end_time:<8.2f}s "
+                f"sim={t.similarity:.3f} q={t.quality:5.1f} {t.verdict:<12} {t.confidence:.1f}%"
+            )
+    print(f"TIME                   : {result.execution_time:.2f}s")
+    print("=" * 80 + "\n")
+
+
+def print_template_match(match, ref, probe, as_json: bool = False):
+    if as_json:
+        output = {
+            "verdict": match.verdict,
+            "confidence": match.confidence,
+            "fused_similarity": round(match.fused_score, 3),
+            "max_similarity": round(match.max_score, 3),
+            "best_pair": list(match.best_pair),
+            "used_fallback": match.used_fallback,
+            "reference_images": ref.size,
+            "probe_images": probe.size,
+            "reference_quality": round(ref.quality, 1),
+            "probe_quality": round(probe.quality, 1),
+            "rejected": [list(r) for r in ref.rejected + probe.rejected],
+            "error": match.error,
+        }
+        print(json.dumps(output, indent=2))
+        return
+
+    print("\n" + "=" * 80)
+    print("ULTIMATE FACE VERIFICATION v6.2 (TEMPLATE FUSION)")
+    print("=" * 80)
+    for path, reason in ref.rejected + probe.rejected:
+        print(f"⚠️  skipped {path}: {reason}")
+    if match.error:
+        print(f"❌ ERROR: {match.error}")
+    else:
+        print(f"Reference images     : {ref.size} (quality {ref.quality:.1f})")
+        print(f"Probe images         : {probe.size} (quality {probe.quality:.1f})")
+        print(f"Fused Similarity     : {match.fused_score:.3f}")
+        print(f"Best Pair Similarity : {match.max_score:.3f}")
+        print("-" * 80)
+        print(f"VERDICT              : {match.verdict}{' (max-score fallback)' if match.used_fallback else ''}")
+        print(f"CONFIDENCE           : {match.confidence:.1f}%")
+    print("=" * 80 + "\n")
+
+
+def print_multi_face(result: MultiFaceResult, as_json: bool = False):
+    if as_json:
+        output = {
+            "verdict": result.verdict,
+            "confidence": result.confidence,
+            "best_face": result.best_index,
+            "best_box": list(result.best_box) if result.best_box else None,
+            "best_similarity": round(result.best_score, 3),
+            "faces": [
+                {**f.__dict__, "box": list(f.box), "similarity": round(f.similarity, 3),
+                 "det_score": round(f.det_score, 3)}
+                for f in result.faces
+            ],
+            "execution_time": round(result.execution_time, 2),
+            "error": result.error,
+        }
+        print(json.dumps(output, indent=2))
+        return
+
+    print("\n" + "=" * 80)
+    print("ULTIMATE FACE VERIFICATION v6.2 (GROUP SEARCH)")
+    print("=" * 80)
+    if result.error:
+        print(f"❌ ERROR: {result.error}")
+    else:
+        print(f"Faces found          : {len(result.faces)}")
+        for f in sorted(result.faces, key=lambda f: -f.similarity):
+            mark = "➜" if f.index == result.best_index else " "
+            print(f"{mark} face {f.index:<3} box={f.box} ref={f.reference} "
+                  f"sim={f.similarity:.3f} q={f.quality:5.1f} {f.verdict}")
+        print("-" * 80)
+        print(f"BEST FACE            : {result.best_index} at {result.best_box}")
+        print(f"VERDICT              : {result.verdict}")
+        print(f"CONFIDENCE           : {result.confidence:.1f}%")
+    print(f"TIME                 : {result.execution_time:.2f}s")
+    print("=" * 80 + "\n")
 
 
 # =============================================================================
 # Main
 # =============================================================================
 
-def main():
-    if len(sys.argv) < 3:
-        print("Usage: python3 verify_v6.py img1 img2 [--json] [--quiet]")
+class _CliParser(argparse.ArgumentParser):
+    """Usage errors exit 1: exit code 2 already means DIFFERENT."""
+
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        print(f"error: {message}", file=sys.stderr)
         sys.exit(1)
 
-    if "--json" in sys.argv:
+
+def main():
+    parser = _CliParser(
+        usage="python3 verify_v6.py img1 img2 [--json] [--quiet] [--video [--stride N]] [--profile [MODE]] [--out PATH]\n"
+              "       python3 verify_v6.py ref1 [ref2 ...] --fuse --probe probe1 [--probe probe2 ...]\n"
+              "       python3 verify_v6.py ref1 [ref2 ...] group.jpg --all-faces\n"
+              "       python3 verify_v6.py suspect.jpg --enroll suspect.tpl\n"
+              "       python3 verify_v6.py probe.jpg --template suspect.tpl"
+    )
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--video", action="store_true",
+                        help="img2 is a video file; match every face track against img1")
+    parser.add_argument("--stride", type=int, default=Config.VIDEO_STRIDE,
+                        help="run detection every N frames in --video mode")
+    parser.add_argument("--fuse", action="store_true",
+                        help="fuse all positional images into one reference template")
+    parser.add_argument("--probe", action="append", default=[],
+                        help="probe image for --fuse (repeat to fuse several probes)")
+    parser.add_argument("--all-faces", action="store_true",
+                        help="last image is a group photo; score every face in it against the others")
+    parser.add_argument("--upper-face", action="store_true",
+                        help="also score the upper-face (occlusion) embedding")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="time budget in seconds for the verification")
+    parser.add_argument("--audit", action="store_true",
+                        help="append the pair result to the audit store (audit.db)")
+    parser.add_argument("--operator", default=os.environ.get("USER"),
+                        help="operator name recorded with --audit")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=("sample", "cprofile"),
+                        help="profile the run: per-stage wall/CPU/alloc plus collapsed stacks")
+    parser.add_argument("--out", metavar="PATH",
+                        help="write the JSON result to PATH; --profile files are written next to it")
+    parser.add_argument("--enroll", metavar="TEMPLATE",
+                        help="enroll the single image and write its template to TEMPLATE")
+    parser.add_argument("--template", metavar="TEMPLATE",
+                        help="verify the single probe image against an enrolled TEMPLATE")
+    parser.add_argument("--parallel", action="store_true",
+                        help="run the two images' decode/quality/detection/geometry stages concurrently")
+    parser.add_argument("--tiled", action="store_true",
+                        help="detect on overlapping tiles for large images (small, distant faces)")
+    parser.add_argument("--tile-size", type=int, default=Config.TILE_SIZE)
+    parser.add_argument("--tile-overlap", type=float, default=Config.TILE_OVERLAP,
+                        help="fraction of the tile shared with its neighbours (0-0.9)")
+    args = parser.parse_args()
+    if args.enroll or args.template:
+        if args.enroll and args.template:
+            parser.error("--enroll and --template are exclusive")
+        if len(args.images) != 1:
+            parser.error("--enroll / --template take exactly one image")
+    elif args.all_faces:
+        if len(args.images) < 2:
+            parser.error("--all-faces needs at least one reference and one group image")
+    elif args.fuse:
+        if not args.probe:
+            parser.error("--fuse needs at least one --probe")
+    elif len(args.images) != 2:
+        parser.error("expected exactly two images: img1 img2")
+    if not 0 <= args.tile_overlap < 0.9:
+        parser.error("--tile-overlap must be in [0, 0.9)")
+
+    if args.parallel:
+        Config.PARALLEL_STAGES = True
+    if args.tiled:
+        Config.TILED_DETECTION = True
+        Config.TILE_SIZE = args.tile_size
+        Config.TILE_OVERLAP = args.tile_overlap
+
+    if args.json:
         Config.JSON_OUTPUT = True
-    if "--quiet" in sys.argv:
+    if args.quiet:
         Config.VERBOSE = False
         logger.setLevel(logging.WARNING)
 
-    try:
-        verifier = UltimateVerifier()
-        result = verifier.verify(sys.argv[1], sys.argv[2])
-
-        if Config.JSON_OUTPUT:
-            print_json(result)
-        elif Config.VERBOSE:
-            print_formatted(result)
-        else:
-            print(f"{result.verdict} | {result.confidence:.1f}%")
+    profiler = nullcontext()
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(args.profile, timer=StageTimer)
 
-        if result.error:
-            sys.exit(1)
-        elif result.verdict.startswith("SAME"):
-            sys.exit(0)
-        else:
-            sys.exit(2)
+    try:
+        with profiler:
+            verifier = UltimateVerifier()
+
+            if args.enroll:
+                template = verifier.enroll(args.images[0])
+                template.save(args.enroll)
+                print(json.dumps({"template": args.enroll, "model": template.model,
+                                  "quality": template.quality.score, "geometry": template.geometry is not None,
+                                  "bytes": os.path.getsize(args.enroll)}))
+                sys.exit(0)
+
+            if args.all_faces:
+                mresult = verifier.search_faces(args.images[:-1], args.images[-1])
+                print_multi_face(mresult, as_json=Config.JSON_OUTPUT)
+                if mresult.error:
+                    sys.exit(1)
+                sys.exit(0 if mresult.verdict.startswith("SAME") else 2)
+
+            if args.fuse:
+                from fusion import build_template, compare_templates
+                ref = build_template(verifier, args.images, identity="reference")
+                probe = build_template(verifier, args.probe, identity="probe")
+                match = compare_templates(ref, probe)
+                print_template_match(match, ref, probe, as_json=Config.JSON_OUTPUT)
+                if match.error:
+                    sys.exit(1)
+                sys.exit(0 if match.verdict.startswith("SAME") else 2)
+
+            if args.video:
+                from video_engine import VideoVerifier
+                vresult = VideoVerifier(verifier, stride=args.stride).verify_video(*args.images)
+                print_video(vresult, as_json=Config.JSON_OUTPUT)
+                if vresult.error:
+                    sys.exit(1)
+                sys.exit(0 if any(t.verdict.startswith("SAME") for t in vresult.tracks) else 2)
+
+            if args.template:
+                result = verifier.verify_template(Template.load(args.template), args.images[0], timeout=args.timeout)
+            else:
+                result = verifier.verify(*args.images, upper_face=args.upper_face, timeout=args.timeout)
+
+            if args.audit:
+                from audit_store import AuditStore, sha256_file
+                refs = [args.template] + args.images if args.template else args.images
+                store = AuditStore()
+                store.record(result, *(sha256_file(p) for p in refs),
+                             operator=args.operator, source="cli")
+                store.close()
+
+            if args.out:
+                with open(args.out, "w", encoding="utf-8") as f:
+                    json.dump(result_to_dict(result), f, indent=2)
+
+            if Config.JSON_OUTPUT:
+                print_json(result)
+            elif Config.VERBOSE:
+                print_formatted(result)
+            else:
+                print(f"{result.verdict} | {result.confidence:.1f}%")
+
+            if result.error:
+                sys.exit(1)
+            elif result.verdict.startswith("SAME"):
+                sys.exit(0)
+            else:
+                sys.exit(2)
 
     except KeyboardInterrupt:
         logger.info("Interrupted by user")
@@ -437,6 +1549,10 @@ def main():
     except Exception as e:
         logger.critical(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        if args.profile:
+            profiler.write(args.out or time.strftime("profile_%Y%m%d_%H%M%S.json"))
+            profiler.print_table()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,309 @@
+"""
+Video file mode for UltimateVerifier.
+
+Frames are streamed from a local file through a generator; the detector runs
+only every Config.VIDEO_STRIDE frames, detections are linked into tracks by
+box IoU, and each track is embedded once, from its best-quality frame
+(ImageQualityAnalyzer on the face crop). Per-track results are matched
+against one reference image with the same adaptive decision as verify().
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from lz_validators import validate_image_file, validate_video_file
+from verify_v6 import (
+    Config,
+    ImageQuality,
+    ImageQualityAnalyzer,
+    UltimateVerifier,
+    cosine_sim,
+    decide,
+    logger,
+)
+
+
+# =============================================================================
+# Data Classes
+# =============================================================================
+
+@dataclass
+class Track:
+    track_id: int
+    box: np.ndarray
+    first_frame: int
+    last_frame: int
+    hits: int = 1
+    missed: int = 0
+    best_frame: int = -1
+    best_box: Optional[np.ndarray] = None
+    best_quality: Optional[ImageQuality] = None   # aligned crop; picks the best frame
+    best_frame_quality: float = 0.0                # whole best frame; what decide() is calibrated on
+    best_crop: Optional[np.ndarray] = None   # 112x112 aligned, uint8
+
+
+@dataclass
+class TrackMatch:
+    track_id: int
+    first_frame: int
+    last_frame: int
+    start_time: float
+    end_time: float
+    hits: int
+    best_frame: int
+    best_box: List[int]
+    quality: float
+    similarity: float
+    verdict: str
+    confidence: float
+
+
+@dataclass
+class VideoResult:
+    reference: str
+    video: str
+    fps: float
+    frames_read: int
+    frames_detected: int
+    execution_time: float
+    tracks: List[TrackMatch] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+# =============================================================================
+# Frame source
+# =============================================================================
+
+class FrameReader:
+    """Iterate (frame_index, seconds, BGR frame) over every `stride`-th frame.
+
+    Skipped frames are only grabbed, never decoded; `frames_read` counts
+    every frame pulled from the stream, grabbed or decoded.
+    """
+
+    def __init__(self, path: str, stride: int = 1):
+        self.path = path
+        self.stride = max(1, int(stride))
+        self.frames_read = 0
+
+    def __iter__(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open video: {self.path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        idx = 0
+        try:
+            while True:
+                if idx % self.stride:
+                    if not cap.grab():
+                        break
+                    frame = None
+                else:
+                    ok, frame = cap.read()
+                    if not ok:
+                        break
+                self.frames_read = idx + 1
+                if frame is not None:
+                    yield idx, idx / fps, frame
+                idx += 1
+        finally:
+            cap.release()
+
+
+def iter_frames(path: str, stride: int = 1) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """Yield (frame_index, seconds, BGR frame) for every `stride`-th frame."""
+    return iter(FrameReader(path, stride))
+
+
+def video_fps(path: str) -> float:
+    cap = cv2.VideoCapture(path)
+    try:
+        return cap.get(cv2.CAP_PROP_FPS) or 25.0
+    finally:
+        cap.release()
+
+
+# =============================================================================
+# Tracking
+# =============================================================================
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of x1,y1,x2,y2 boxes (len(a) x len(b))."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-6)
+
+
+class IoUTracker:
+    """Greedy IoU association between consecutive detection passes."""
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 3):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.active: List[Track] = []
+        self._next_id = 1
+
+    def update(self, frame_idx: int, boxes: np.ndarray) -> Tuple[List[Tuple[Track, int]], List[Track]]:
+        """Returns ([(track, detection_index)], tracks that just expired)."""
+        prev = np.array([t.box for t in self.active]).reshape(-1, 4)
+        ious = iou_matrix(prev, boxes)
+
+        assigned, used_t, used_d = [], set(), set()
+        for flat in np.argsort(-ious, axis=None):
+            ti, di = divmod(int(flat), ious.shape[1])
+            if ious[ti, di] < self.iou_threshold:
+                break
+            if ti in used_t or di in used_d:
+                continue
+            t = self.active[ti]
+            t.box, t.last_frame, t.hits, t.missed = boxes[di], frame_idx, t.hits + 1, 0
+            assigned.append((t, di))
+            used_t.add(ti)
+            used_d.add(di)
+
+        expired, keep = [], []
+        for ti, t in enumerate(self.active):
+            if ti not in used_t:
+                t.missed += 1
+            (expired if t.missed > self.max_missed else keep).append(t)
+
+        for di in range(len(boxes)):
+            if di in used_d:
+                continue
+            t = Track(self._next_id, boxes[di], frame_idx, frame_idx)
+            self._next_id += 1
+            keep.append(t)
+            assigned.append((t, di))
+
+        self.active = keep
+        return assigned, expired
+
+    def flush(self) -> List[Track]:
+        done, self.active = self.active, []
+        return done
+
+
+# =============================================================================
+# Video Verifier
+# =============================================================================
+
+class VideoVerifier:
+
+    def __init__(self, verifier: UltimateVerifier, stride: Optional[int] = None):
+        self.verifier = verifier
+        self.engine = verifier.engine
+        self.stride = stride or Config.VIDEO_STRIDE
+
+    def _update_best(self, track: Track, frame: np.ndarray, idx: int, box: np.ndarray, kps: np.ndarray):
+        h, w = frame.shape[:2]
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(w, int(box[2])), min(h, int(box[3]))
+        if x2 <= x1 or y2 <= y1:
+            return
+        # Score the aligned crop, not the raw box: analyze_image() gives 0 to
+        # anything under 50 px, which would tie every frame of a small face.
+        # A small face upsampled to 112x112 scores lower on sharpness anyway.
+        crop = self.engine.align(frame, kps)
+        q = ImageQualityAnalyzer.analyze_image(crop)
+        if track.best_quality is None or q.score > track.best_quality.score:
+            track.best_quality = q
+            track.best_frame_quality = ImageQualityAnalyzer.analyze_image(frame).score
+            track.best_frame = idx
+            track.best_box = np.array([x1, y1, x2, y2])
+            track.best_crop = crop
+
+    def _embed_tracks(self, tracks: List[Track]) -> List[Tuple[Track, np.ndarray]]:
+        tracks = [t for t in tracks if t.best_crop is not None and t.hits >= Config.VIDEO_MIN_TRACK_HITS]
+        out = []
+        for i in range(0, len(tracks), Config.VIDEO_EMBED_BATCH):
+            chunk = tracks[i:i + Config.VIDEO_EMBED_BATCH]
+            feats = self.engine.embed_aligned(t.best_crop for t in chunk)
+            for t, e in zip(chunk, feats):
+                t.best_crop = None
+                out.append((t, e))
+        return out
+
+    def verify_video(self, reference: str, video: str) -> VideoResult:
+        t0 = time.time()
+        result = VideoResult(reference, video, 0.0, 0, 0, 0.0)
+
+        ok, msg = validate_image_file(reference)
+        if not ok:
+            return self._error(result, f"Reference invalid: {msg}", t0)
+        ok, msg = validate_video_file(video)
+        if not ok:
+            return self._error(result, f"Video invalid: {msg}", t0)
+
+        ref_q = ImageQualityAnalyzer.analyze(reference)
+        ref_emb = self.engine.embed(reference)
+        if ref_emb is None:
+            return self._error(result, "Face not detected in reference", t0)
+
+        result.fps = video_fps(video)
+        tracker = IoUTracker(Config.TRACK_IOU_THRESHOLD, Config.TRACK_MAX_MISSED)
+        pending: List[Track] = []
+        embedded: List[Tuple[Track, np.ndarray]] = []
+
+        frames = FrameReader(video, self.stride)
+        for idx, _, frame in frames:
+            result.frames_detected += 1
+            dets, kpss = self.engine.detect(frame)
+            keep = dets[:, 4] >= Config.MIN_DETECTION_CONFIDENCE
+            dets, kpss = dets[keep], kpss[keep]
+
+            assigned, expired = tracker.update(idx, dets[:, :4])
+            for track, di in assigned:
+                self._update_best(track, frame, idx, dets[di, :4], kpss[di])
+
+            pending.extend(expired)
+            if len(pending) >= Config.VIDEO_EMBED_BATCH:
+                embedded.extend(self._embed_tracks(pending))
+                pending = []
+
+        result.frames_read = frames.frames_read
+        embedded.extend(self._embed_tracks(pending + tracker.flush()))
+
+        for t, emb in sorted(embedded, key=lambda te: te[0].track_id):
+            sim = cosine_sim(ref_emb, emb)
+            verdict, conf = decide(sim, 50.0, (ref_q.score + t.best_frame_quality) / 2)
+            result.tracks.append(TrackMatch(
+                track_id=t.track_id,
+                first_frame=t.first_frame,
+                last_frame=t.last_frame,
+                start_time=round(t.first_frame / result.fps, 2),
+                end_time=round(t.last_frame / result.fps, 2),
+                hits=t.hits,
+                best_frame=t.best_frame,
+                best_box=[int(v) for v in t.best_box],
+                quality=t.best_quality.score,
+                similarity=sim,
+                verdict=verdict,
+                confidence=round(conf, 1),
+            ))
+
+        result.execution_time = time.time() - t0
+        logger.info(
+            "Video verification finished",
+            extra={
+                "frames_read": result.frames_read,
+                "frames_detected": result.frames_detected,
+                "tracks": len(result.tracks),
+                "execution_time": round(result.execution_time, 2),
+            },
+        )
+        return result
+
+    def _error(self, result: VideoResult, msg: str, t0: float) -> VideoResult:
+        result.error = msg
+        result.execution_time = time.time() - t0
+        return result
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingestion with continuous watchlist matching.
+
+A poller scans the intake directory, waits until each new file's size and
+mtime are stable, and hands it to a small worker pool through a bounded
+queue. When the queue is full the poller blocks, so files simply stay on
+disk until there is capacity (back-pressure instead of unbounded memory).
+Workers validate with lz_validators, embed every face in one detector
+pass and score all faces against all watchlist templates with one matrix
+product. Hits are appended to a JSONL alert stream with their end-to-end
+latency. Processed files are journaled, so a restart does not re-alert.
+
+With --dedup, recently processed files are indexed by perceptual hash
+(dedup.py). A near-duplicate reuses its representative's hits instead of
+re-running detection and embedding, but only when every face region the
+representative had still matches in the new file (so a burst frame with a
+different person is processed in full); its alerts carry "duplicate_of".
+
+    python3 watcher.py --dir intake/ --watchlist watchlist.json --alerts alerts.jsonl
+
+watchlist.json: {"identity": ["ref1.jpg", "ref2.jpg"], ...} (paths relative
+to the JSON file). Each identity becomes a fused template (fusion.py).
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from dedup import DuplicateIndex, dhash_file, face_hashes, faces_match
+from fusion import FusedTemplate, build_template
+from lz_validators import ALLOWED_EXTS, validate_image_file
+from recovery import JobJournal
+from resources import ThreadBudget
+from verify_v6 import Config, ImageQualityAnalyzer, InsightEngine, UltimateVerifier, decide, logger
+
+
+def load_watchlist(verifier: UltimateVerifier, path: str) -> Dict[str, FusedTemplate]:
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    watchlist = {}
+    for identity, images in spec.items():
+        if isinstance(images, str):
+            images = [images]
+        paths = [p if os.path.isabs(p) else os.path.join(base, p) for p in images]
+        t = build_template(verifier, paths, identity=identity)
+        if t.fused is None:
+            logger.warning(f"Watchlist entry '{identity}' has no usable images; skipped")
+            continue
+        watchlist[identity] = t
+    return watchlist
+
+
+class WatchFolder:
+
+    def __init__(
+        self,
+        verifier: UltimateVerifier,
+        directory: str,
+        watchlist: Dict[str, FusedTemplate],
+        alerts_path: str,
+        workers: int = Config.WATCH_WORKERS,
+        queue_size: int = Config.WATCH_QUEUE_SIZE,
+        poll_interval: float = Config.WATCH_POLL_INTERVAL,
+        dedup: bool = False,
+    ):
+        self.verifier = verifier
+        self.directory = Path(directory)
+        self.alerts_path = alerts_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+
+        self.names = list(watchlist)
+        self.templates = np.stack([watchlist[n].fused for n in self.names]) if watchlist else np.zeros((0, 512), np.float32)
+        self.template_quality = np.array([watchlist[n].quality for n in self.names])
+
+        self.q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self._pending: Dict[str, Tuple[int, float]] = {}
+        self._queued = set()
+        self._lock = threading.Lock()
+        job = hashlib.sha1(str(self.directory.resolve()).encode()).hexdigest()[:16]
+        self.journal = JobJournal(f"watch-{job}")
+        self.dedup = DuplicateIndex(capacity=Config.DEDUP_CACHE_SIZE) if dedup else None
+        self._dedup_hits: Dict[str, Tuple[List[dict], list, list]] = {}   # rep -> hits, face boxes, crop hashes
+        self.stats = {"processed": 0, "hits": 0, "invalid": 0, "late": 0, "inferences_avoided": 0}
+
+    # -------------------------------------------------------------------------
+    # Discovery
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _unit(path: str, size: int, mtime: float) -> str:
+        return f"{path}:{size}:{int(mtime)}"
+
+    def scan(self) -> List[str]:
+        """New files whose size and mtime did not change since the previous scan."""
+        ready = []
+        seen = set()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or Path(entry.name).suffix.lower() not in ALLOWED_EXTS:
+                    continue
+                st = entry.stat()
+                sig = (st.st_size, st.st_mtime)
+                seen.add(entry.path)
+                if entry.path in self._queued:
+                    continue
+                with self._lock:
+                    if self._unit(entry.path, *sig) in self.journal:
+                        continue
+                if self._pending.get(entry.path) == sig:
+                    del self._pending[entry.path]
+                    ready.append(entry.path)
+                else:
+                    self._pending[entry.path] = sig
+        for p in list(self._pending):
+            if p not in seen:
+                del self._pending[p]
+        return sorted(ready, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+
+    def _poll_loop(self) -> None:
+        while not self.stop_event.is_set():
+            for path in self.scan():
+                self._queued.add(path)
+                while not self.stop_event.is_set():
+                    try:
+                        self.q.put((path, time.time()), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue   # back-pressure: hold discovery until a worker frees a slot
+            self.stop_event.wait(self.poll_interval)
+
+    # -------------------------------------------------------------------------
+    # Processing
+    # -------------------------------------------------------------------------
+
+    def process(self, path: str, detected_at: float) -> List[dict]:
+        return self._analyze(path)[0]
+
+    def _analyze(self, path: str):
+        """(hits, decoded image or None, detected face boxes)."""
+        ok, msg = validate_image_file(path)
+        if not ok:
+            with self._lock:
+                self.stats["invalid"] += 1
+            logger.warning(f"Watch: rejected {path}: {msg}")
+            return [], None, []
+
+        img = cv2.imread(path)
+        F, dets = self.verifier.engine.embed_all(img)
+        boxes = [d[:4] for d in dets]
+        if not len(dets) or not len(self.names):
+            return [], img, boxes
+
+        q = ImageQualityAnalyzer.analyze_image(img).score
+        S = F @ self.templates.T                      # faces x identities
+        hits = []
+        for j, name in enumerate(self.names):
+            i = int(S[:, j].argmax())
+            sim = float(S[i, j])
+            verdict, conf = decide(sim, 50.0, (q + self.template_quality[j]) / 2)
+            if verdict.startswith("SAME"):
+                hits.append({
+                    "identity": name,
+                    "similarity": round(sim, 4),
+                    "verdict": verdict,
+                    "confidence": round(conf, 1),
+                    "face_box": [int(v) for v in dets[i, :4]],
+                })
+        return hits, img, boxes
+
+    def _process_dedup(self, path: str, detected_at: float) -> List[dict]:
+        if self.dedup is None:
+            return self.process(path, detected_at)
+        h = dhash_file(path)
+        if h is not None:
+            with self._lock:
+                rep = self.dedup.find(h)
+                entry = self._dedup_hits.get(rep) if rep is not None else None
+            if entry is not None:
+                hits, boxes, hashes = entry
+                img = cv2.imread(path)
+                if img is not None and faces_match(img, boxes, hashes):
+                    with self._lock:
+                        self.stats["inferences_avoided"] += 1
+                    return [{**hit, "duplicate_of": rep} for hit in hits]
+
+        hits, img, boxes = self._analyze(path)
+        if h is not None and img is not None:
+            hashes = face_hashes(img, boxes)
+            with self._lock:
+                self.dedup.add(path, h)
+                self._dedup_hits[path] = (hits, boxes, hashes)
+                # The index evicts its oldest entry beyond capacity; keep the hits in step.
+                if len(self._dedup_hits) > len(self.dedup):
+                    for old in [k for k in self._dedup_hits if k not in self.dedup]:
+                        del self._dedup_hits[old]
+        return hits
+
+    def _emit(self, path: str, detected_at: float, hits: List[dict]) -> None:
+        now = time.time()
+        latency = now - detected_at
+        late = latency > Config.WATCH_MAX_LATENCY
+        if late:
+            with self._lock:
+                self.stats["late"] += 1
+            logger.warning(
+                f"Watch: {path} took {latency:.2f}s (> {Config.WATCH_MAX_LATENCY}s)",
+                extra={"file": path, "latency": round(latency, 3), "queue_depth": self.q.qsize()},
+            )
+        if not hits:
+            return
+        with self._lock, open(self.alerts_path, "a", encoding="utf-8") as f:
+            for h in hits:
+                f.write(json.dumps({
+                    "ts": now,
+                    "file": path,
+                    **h,
+                    "detected_at": detected_at,
+                    "latency": round(latency, 3),
+                    "late": late,
+                }) + "\n")
+            self.stats["hits"] += len(hits)
+
+    def _worker_loop(self) -> None:
+        while True:
+            try:
+                item = self.q.get(timeout=0.5)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    return
+                continue
+            path, detected_at = item
+            try:
+                st = os.stat(path)
+                hits = self._process_dedup(path, detected_at)
+                self._emit(path, detected_at, hits)
+                with self._lock:
+                    self.journal.mark_done(self._unit(path, st.st_size, st.st_mtime), len(hits))
+                    self.stats["processed"] += 1
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logger.error(f"Watch: processing failed for {path}", exc_info=True)
+            finally:
+                self._queued.discard(path)
+                self.q.task_done()
+
+    def run(self) -> None:
+        threads = [threading.Thread(target=self._worker_loop, name=f"watch-worker-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        logger.info(
+            f"Watching {self.directory} against {len(self.names)} watchlist identities",
+            extra={"workers": self.workers, "queue_size": self.q.maxsize},
+        )
+        try:
+            self._poll_loop()
+        finally:
+            self.stop_event.set()
+            for t in threads:
+                t.join()
+            with self._lock:
+                self.journal.close()
+            logger.info("Watcher stopped", extra=dict(self.stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a folder and match new images against a watchlist")
+    parser.add_argument("--dir", required=True, help="intake directory to watch")
+    parser.add_argument("--watchlist", required=True, help="JSON {identity: [reference images]}")
+    parser.add_argument("--alerts", default="alerts.jsonl", help="JSONL alert stream")
+    parser.add_argument("--workers", type=int, default=Config.WATCH_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=Config.WATCH_QUEUE_SIZE)
+    parser.add_argument("--poll", type=float, default=Config.WATCH_POLL_INTERVAL, help="seconds between scans")
+    parser.add_argument("--dedup", action="store_true",
+                        help="reuse hits for near-duplicate files whose faces are confirmed unchanged")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        print(f"Not a directory: {args.dir}")
+        sys.exit(1)
+
+    # Worker threads share one engine, so the budget is per session, not per thread.
+    budget = ThreadBudget(args.workers, sessions=1)
+    budget.apply()
+    verifier = UltimateVerifier(InsightEngine(sess_options=budget.session_options()))
+    watchlist = load_watchlist(verifier, args.watchlist)
+    if not watchlist:
+        print("Watchlist is empty")
+        sys.exit(1)
+
+    watcher = WatchFolder(verifier, args.dir, watchlist, args.alerts,
+                          args.workers, args.queue_size, args.poll, dedup=args.dedup)
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop_event.set())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop_event.set()
+
+
+if __name__ == "__main__":
+    main()